@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Compara el cálculo de características con llamadas separadas a librosa (una STFT por
+característica) frente al análisis compartido de audio_analysis.analyze_signal.
+
+Uso:
+    python benchmarks/bench_feature_pipeline.py [--durations 1 5 30] [--repeat 5]
+"""
+from pathlib import Path
+import argparse
+import sys
+import time
+
+import numpy as np
+import librosa
+
+# Añadir el directorio src al path de Python
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root / 'src'))
+
+from audio_analysis import analyze_signal
+
+SAMPLE_RATE = 22050
+
+def synthetic_voice(duration, sr=SAMPLE_RATE, seed=0):
+    """Señal armónica con ruido que imita una voz"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+    f0 = 140 + 20 * np.sin(2 * np.pi * 3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    y = sum(np.sin(k * phase) / k for k in range(1, 8))
+    return librosa.util.normalize((y + 0.05 * rng.normal(size=len(t))).astype(np.float32))
+
+def separate_calls(y, sr):
+    """Pipeline anterior: cada característica vuelve a calcular la STFT"""
+    return (
+        librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13),
+        librosa.feature.melspectrogram(y=y, sr=sr),
+        librosa.feature.spectral_centroid(y=y, sr=sr)[0],
+        librosa.feature.zero_crossing_rate(y)[0]
+    )
+
+def shared_analysis(y, sr):
+    """Pipeline actual: una única STFT compartida"""
+    return analyze_signal(y, sr, n_mfcc=13)
+
+def best_time(func, *args, repeat=5):
+    func(*args)  # Calentamiento (filtros mel, ventanas, etc.)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--durations', type=float, nargs='+', default=[1, 5, 30])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'duración (s)':>12} {'separado (ms)':>14} {'compartido (ms)':>16} {'aceleración':>12}")
+    for duration in args.durations:
+        y = synthetic_voice(duration)
+        legacy = best_time(separate_calls, y, SAMPLE_RATE, repeat=args.repeat)
+        shared = best_time(shared_analysis, y, SAMPLE_RATE, repeat=args.repeat)
+        print(f"{duration:>12g} {legacy * 1000:>14.2f} {shared * 1000:>16.2f} {legacy / shared:>11.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Compara la derivación de claves original (bucle con np.roll por elemento) con la
+derivación vectorizada de key_derivation, para una clave y para lotes de claves.
+
+Uso:
+    python benchmarks/bench_key_derivation.py [--length 167] [--batch 1000] [--repeat 20]
+"""
+from pathlib import Path
+import argparse
+import sys
+import time
+
+import numpy as np
+
+# Añadir el directorio src al path de Python
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root / 'src'))
+
+from key_derivation import derive_key, derive_key_reference, derive_keys
+
+def best_time(func, *args, repeat=20):
+    func(*args)  # Calentamiento (incluye construir la matriz de mezcla)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # 13 MFCC + 128 mel + 24 bandas FFT + centroide + ZCR
+    parser.add_argument('--length', type=int, default=167)
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    quantized = rng.integers(0, 256, args.length, dtype=np.uint8)
+    batch = rng.integers(0, 256, (args.batch, args.length), dtype=np.uint8)
+
+    reference = best_time(derive_key_reference, quantized, repeat=args.repeat)
+    vectorized = best_time(derive_key, quantized, repeat=args.repeat)
+    print(f"Una clave ({args.length} valores):")
+    print(f"  original:     {reference * 1e6:10.1f} us")
+    print(f"  vectorizada:  {vectorized * 1e6:10.1f} us  ({reference / vectorized:.1f}x)")
+
+    batch_time = best_time(derive_keys, batch, repeat=max(1, args.repeat // 4))
+    print(f"Lote de {args.batch} claves:")
+    print(f"  original (estimado): {reference * args.batch * 1000:10.1f} ms")
+    print(f"  vectorizada:         {batch_time * 1000:10.1f} ms  ({reference * args.batch / batch_time:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks de las rutas críticas: extracción de características, comparación,
+verificación de voz, derivación de claves, cifrado/descifrado de archivos y visualización.
+
+Todas las entradas son sintéticas (voz armónica con ruido y archivos de bytes aleatorios)
+y se generan en un directorio temporal, por lo que la suite funciona sin conexión y no
+modifica los datos del proyecto. Los resultados se emiten en JSON.
+
+Uso:
+    python benchmarks/run_benchmarks.py [--durations 1 5 30] [--sizes 64KB 1MB 64MB 1GB]
+                                        [--repeat 5] [--only encrypt_file decrypt_range]
+                                        [--output resultados.json]
+"""
+from pathlib import Path
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Añadir el directorio src al path de Python
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root / 'src'))
+
+from audio_ingest import AudioBuffer
+from encryption import Encrypter
+from feature_cache import FeatureCache
+from visualization import VoiceVisualizer
+from voice_processing import VoiceKeySystem
+
+SAMPLE_RATE = 22050
+BENCHMARKS = [
+    'extract_voice_features',
+    'compare_features',
+    'verify_voice',
+    'verify_voice_streaming',
+    'verify_many',
+    'prepare_encryption_key',
+    'encrypt_file',
+    'decrypt_file',
+    'decrypt_range',
+    'create_visualizations'
+]
+SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+def parse_size(text):
+    """Convierte '64KB', '1MB' o '2GB' a bytes"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?B)\s*', text.upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f"Tamaño no válido: {text} (ejemplos: 512KB, 1MB, 1GB)")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+def synthetic_voice(duration, sr=SAMPLE_RATE, seed=0):
+    """Señal armónica con ruido que imita una voz"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+    f0 = 140 + 20 * np.sin(2 * np.pi * 3 * t) + 5 * seed
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    y = sum(np.sin(k * phase) / k for k in range(1, 8))
+    y = y + 0.05 * rng.normal(size=len(t))
+    return (0.9 * y / np.max(np.abs(y))).astype(np.float32)
+
+def write_voice(path, duration, seed=0):
+    import soundfile as sf
+    sf.write(str(path), synthetic_voice(duration, seed=seed), SAMPLE_RATE)
+    return path
+
+def write_random_file(path, size, block_size=16 * 1024 * 1024):
+    """Archivo de bytes aleatorios (incompresibles) escrito por bloques"""
+    rng = np.random.default_rng(size)
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            n = min(block_size, remaining)
+            f.write(rng.integers(0, 256, n, dtype=np.uint8).tobytes())
+            remaining -= n
+    return path
+
+def measure(func, repeat, setup=None, warmup=True):
+    """
+    Ejecuta func repeat veces y devuelve estadísticas de tiempo en segundos.
+
+    setup se ejecuta antes de cada repetición y no se cronometra (p. ej. vaciar cachés).
+    """
+    if warmup:
+        if setup:
+            setup()
+        func()
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {
+        'repeat': repeat,
+        'min_s': min(times),
+        'median_s': statistics.median(times),
+        'mean_s': statistics.fmean(times),
+        'max_s': max(times)
+    }
+
+def make_voice_system(work_dir, references):
+    """VoiceKeySystem que escribe en work_dir y usa referencias sintéticas"""
+    system = VoiceKeySystem(feature_cache=FeatureCache())
+    system.output_dir = work_dir / 'output'
+    system.users_dir = work_dir / 'authorized_users'
+    system.auth_user_dir = system.users_dir / system.user_id
+    for directory in [system.output_dir, system.auth_user_dir]:
+        directory.mkdir(parents=True, exist_ok=True)
+    system.references = references
+    system._speaker_index = None
+    return system
+
+def bench_voice(work_dir, durations, repeat, selected):
+    results = []
+    # Referencias: variaciones de la misma voz sintética
+    ref_system = VoiceKeySystem(feature_cache=FeatureCache())
+    references = []
+    for seed in range(3):
+        ref_file = write_voice(work_dir / f'ref_{seed}.wav', 3, seed=seed)
+        references.append(ref_system.extract_voice_features(ref_file))
+
+    for duration in durations:
+        audio_file = write_voice(work_dir / f'voice_{duration:g}s.wav', duration)
+        system = make_voice_system(work_dir, references)
+        cache = system.feature_cache
+        features = system.extract_voice_features(audio_file)
+        base = {'duration_s': duration}
+
+        if 'extract_voice_features' in selected:
+            stats = measure(lambda: system.extract_voice_features(audio_file), repeat, setup=cache.clear)
+            results.append({'benchmark': 'extract_voice_features', 'variant': 'cold', **base, **stats})
+            stats = measure(lambda: system.extract_voice_features(audio_file), repeat)
+            results.append({'benchmark': 'extract_voice_features', 'variant': 'cached', **base, **stats})
+
+        if 'compare_features' in selected:
+            stats = measure(lambda: system.compare_features(references[0], features), repeat * 20)
+            results.append({'benchmark': 'compare_features', 'variant': 'single', **base, **stats})
+            stats = measure(lambda: system.score_features(features), repeat * 20)
+            results.append({'benchmark': 'compare_features', 'variant': 'all_references',
+                            'references': len(references), **base, **stats})
+
+        if 'verify_voice' in selected:
+            stats = measure(lambda: system.verify_voice(audio_file), repeat, setup=cache.clear)
+            results.append({'benchmark': 'verify_voice', 'variant': 'cold', **base, **stats})
+
+        if 'verify_voice_streaming' in selected:
+            stats = measure(lambda: system.verify_voice_streaming(audio_file), repeat)
+            results.append({'benchmark': 'verify_voice_streaming', 'variant': 'early_stop', **base, **stats})
+
+        if 'verify_many' in selected:
+            clips = [write_voice(work_dir / f'bulk_{duration:g}s_{i}.wav', duration, seed=i) for i in range(8)]
+            for variant, use_processes in (('processes', True), ('threads', False)):
+                stats = measure(lambda: system.verify_many(clips, use_processes=use_processes),
+                                repeat, setup=cache.clear, warmup=False)
+                results.append({'benchmark': 'verify_many', 'variant': variant, 'clips': len(clips),
+                                'clips_per_second': len(clips) / stats['min_s'], **base, **stats})
+
+        if 'prepare_encryption_key' in selected:
+            stats = measure(lambda: system.prepare_encryption_key(features), repeat * 20)
+            results.append({'benchmark': 'prepare_encryption_key', 'variant': 'single', **base, **stats})
+
+        if 'create_visualizations' in selected:
+            for variant, options in (('full', {}), ('fast', {'fast_mode': True, 'dpi': 120})):
+                visualizer = VoiceVisualizer(work_dir / 'vis', use_cache=False, **options)
+                # Cada repetición decodifica el audio de nuevo, como una petición del bot
+                stats = measure(lambda: visualizer.create_visualizations(AudioBuffer(audio_file)),
+                                repeat, warmup=False)
+                results.append({'benchmark': 'create_visualizations', 'variant': variant, **base, **stats})
+    return results
+
+def bench_encryption(work_dir, sizes, repeat, selected):
+    results = []
+    # container_serial usa un solo hilo; la diferencia con container mide el escalado con los núcleos
+    encrypters = (('default', Encrypter()), ('container', Encrypter(container=True)),
+                  ('container_serial', Encrypter(container=True, workers=1)),
+                  # Los archivos aleatorios no se comprimen: mide el coste del sondeo de compresibilidad
+                  ('container_compress', Encrypter(container=True, compress=True)))
+    key = os.urandom(32)
+    for size in sizes:
+        plain_file = write_random_file(work_dir / f'data_{size}.bin', size)
+
+        # Con archivos grandes las repeticiones se reducen para que la suite siga siendo práctica
+        size_repeat = repeat if size < 256 * 1024 ** 2 else 1
+
+        for variant, encrypter in encrypters:
+            encrypted_file = None
+
+            def encrypt():
+                nonlocal encrypted_file
+                encrypted_file = encrypter.encrypt_file(str(plain_file), key)
+
+            encrypt()
+            if 'encrypt_file' in selected:
+                stats = measure(encrypt, size_repeat, warmup=False)
+                results.append({'benchmark': 'encrypt_file', 'variant': variant, 'size_bytes': size,
+                                'mb_per_second': size / 1024 ** 2 / stats['min_s'], **stats})
+
+            if 'decrypt_file' in selected:
+                # El archivo descifrado reemplaza al original (mismo nombre sin .enc)
+                stats = measure(lambda: encrypter.decrypt_file(encrypted_file, key), size_repeat, warmup=False)
+                results.append({'benchmark': 'decrypt_file', 'variant': variant, 'size_bytes': size,
+                                'mb_per_second': size / 1024 ** 2 / stats['min_s'], **stats})
+
+            if 'decrypt_range' in selected:
+                # Primeros 64 KiB y 64 KiB en mitad del archivo
+                for position, offset in (('start', 0), ('middle', size // 2)):
+                    stats = measure(lambda: encrypter.decrypt_range(encrypted_file, key, offset, 64 * 1024), repeat)
+                    results.append({'benchmark': 'decrypt_range', 'variant': f'{variant}_{position}',
+                                    'size_bytes': size, 'range_bytes': 64 * 1024, **stats})
+
+            Path(encrypted_file).unlink()
+        plain_file.unlink()
+    return results
+
+def environment():
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--durations', type=float, nargs='+', default=[1, 5, 30],
+                        help="Duraciones del audio sintético en segundos")
+    parser.add_argument('--sizes', type=parse_size, nargs='+', default=[parse_size(s) for s in ('64KB', '1MB', '64MB')],
+                        help="Tamaños de archivo para cifrado (p. ej. 64KB 1MB 1GB)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--output', help="Archivo JSON de salida (por defecto, salida estándar)")
+    parser.add_argument('--work-dir', help="Directorio para los archivos temporales (por defecto, uno del sistema)")
+    args = parser.parse_args()
+
+    selected = set(args.only)
+    work_dir = Path(tempfile.mkdtemp(prefix='cifrado_voz_bench_', dir=args.work_dir))
+    results = []
+    try:
+        # Los mensajes de los módulos del proyecto van a stderr para no mezclarse con el JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            if selected & {'extract_voice_features', 'compare_features', 'verify_voice', 'verify_voice_streaming',
+                           'verify_many', 'prepare_encryption_key', 'create_visualizations'}:
+                results += bench_voice(work_dir, args.durations, args.repeat, selected)
+            if selected & {'encrypt_file', 'decrypt_file', 'decrypt_range'}:
+                results += bench_encryption(work_dir, args.sizes, args.repeat, selected)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = json.dumps({'environment': environment(), 'results': results}, indent=2)
+    if args.output:
+        Path(args.output).write_text(report)
+    else:
+        print(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Informe del coste de arranque: cuánto tarda en importarse cada módulo del proyecto y
+qué paquetes externos aportan ese tiempo.
+
+Cada módulo se importa en un intérprete nuevo con `python -X importtime`, de modo que
+las mediciones no se contaminan con módulos ya cargados por otras importaciones.
+
+Uso:
+    python benchmarks/startup_report.py [--modules bot_interface encryption ...] [--top 10] [--json]
+"""
+from pathlib import Path
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+project_root = Path(__file__).parent.parent
+SRC_DIR = project_root / 'src'
+
+DEFAULT_MODULES = [
+    'encryption',
+    'voice_processing',
+    'visualization',
+    'encryption_handler',
+    'decryption_handler',
+    'bot_interface'
+]
+
+def measure_import(module):
+    """
+    Importa module en un proceso nuevo y devuelve el tiempo propio y acumulado (µs)
+    de cada módulo que se cargó, según la salida de -X importtime.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(SRC_DIR), os.environ.get('PYTHONPATH')])))
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SRC_DIR, env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {module}:\n{completed.stderr.strip().splitlines()[-1]}")
+
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append({
+            'module': name.strip(),
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us)
+        })
+    return entries
+
+def summarize(module, entries, top):
+    """Agrupa el tiempo propio por paquete de primer nivel"""
+    total_us = next((e['cumulative_us'] for e in reversed(entries) if e['module'] == module), 0)
+    packages = {}
+    for entry in entries:
+        package = entry['module'].split('.')[0]
+        packages[package] = packages.get(package, 0) + entry['self_us']
+    heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        'module': module,
+        'total_ms': total_us / 1000,
+        'modules_loaded': len(entries),
+        'packages': [{'package': name, 'self_ms': us / 1000} for name, us in heaviest]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES)
+    parser.add_argument('--top', type=int, default=8, help="Paquetes más costosos a mostrar por módulo")
+    parser.add_argument('--json', action='store_true', help="Emitir el informe en JSON")
+    args = parser.parse_args()
+
+    report = [summarize(module, measure_import(module), args.top) for module in args.modules]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for item in report:
+        print(f"{item['module']}: {item['total_ms']:.1f} ms ({item['modules_loaded']} módulos cargados)")
+        for package in item['packages']:
+            print(f"    {package['package']:<28} {package['self_ms']:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import numpy as np
+
+def analyze_signal(y, sr, n_mfcc=13, n_fft=2048, hop_length=512, magnitude=None):
+    """
+    Calcula la STFT una sola vez y deriva de ella todas las representaciones espectrales.
+
+    Usa los mismos parámetros por defecto que las funciones de librosa.feature, por lo que
+    los resultados coinciden con llamar a mfcc, melspectrogram y spectral_centroid sobre y
+    por separado, sin re-enmarcar ni volver a transformar la señal en cada llamada.
+
+    Args:
+        y: Señal de audio (mono)
+        sr: Frecuencia de muestreo
+        n_mfcc: Número de coeficientes MFCC
+        n_fft: Tamaño de la ventana de la STFT
+        hop_length: Salto entre ventanas
+        magnitude: |STFT| de y ya calculada con n_fft y hop_length (p. ej. por un AudioBuffer)
+
+    Returns:
+        Dict con:
+            - magnitude: espectrograma de magnitud |STFT|
+            - power: espectro de potencia |STFT|^2
+            - mel: espectrograma mel (potencia)
+            - mfcc: coeficientes MFCC por ventana
+            - spectral_centroid: centroide espectral por ventana
+            - zero_crossing_rate: tasa de cruces por cero por ventana
+    """
+    import librosa
+
+    if magnitude is None:
+        magnitude = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length))
+    power = magnitude ** 2
+
+    mel = librosa.feature.melspectrogram(S=power, sr=sr, n_fft=n_fft, hop_length=hop_length)
+    # librosa.feature.mfcc(y=...) calcula internamente power_to_db(melspectrogram(y=...))
+    mfcc = librosa.feature.mfcc(S=librosa.power_to_db(mel), sr=sr, n_mfcc=n_mfcc)
+    spectral_centroid = librosa.feature.spectral_centroid(S=magnitude, sr=sr, n_fft=n_fft, hop_length=hop_length)[0]
+
+    # La tasa de cruces por cero es una medida temporal y no depende de la STFT
+    zero_crossing_rate = librosa.feature.zero_crossing_rate(y, frame_length=n_fft, hop_length=hop_length)[0]
+
+    return {
+        'magnitude': magnitude,
+        'power': power,
+        'mel': mel,
+        'mfcc': mfcc,
+        'spectral_centroid': spectral_centroid,
+        'zero_crossing_rate': zero_crossing_rate
+    }
@@ -0,0 +1,120 @@
+import hashlib
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from instrumentation import timed
+
+class AudioBuffer:
+    """
+    Audio decodificado una sola vez y compartido por todas las etapas de una petición.
+
+    El archivo se decodifica a su frecuencia de muestreo original la primera vez que se
+    necesita; cada frecuencia que pide un consumidor (22050 Hz para las características,
+    44100 Hz para las visualizaciones) se obtiene remuestreando esa señal y se guarda para
+    los siguientes. Los espectrogramas calculados también quedan disponibles para las
+    etapas posteriores.
+
+    El remuestreo usa el mismo método que librosa.load(sr=...), por lo que las señales
+    coinciden con las que se obtenían cargando el archivo en cada consumidor.
+
+    Si se indica un StageTimer, la decodificación, el remuestreo y las STFT se miden como
+    etapas 'decode', 'resample' y 'stft' dentro de la etapa que las provoque.
+    """
+
+    def __init__(self, audio_file, res_type='soxr_hq', timer=None):
+        self.path = Path(audio_file)
+        self.res_type = res_type
+        self.timer = timer
+        self._lock = threading.RLock()
+        self._content_hash = None
+        self._native = None
+        self._native_sr = None
+        self._resampled = {}
+        self._spectrograms = {}
+
+    def __str__(self):
+        return str(self.path)
+
+    def __fspath__(self):
+        return str(self.path)
+
+    @property
+    def content_hash(self):
+        """Hash SHA-256 del archivo, compartido por las cachés de características y gráficos"""
+        with self._lock:
+            if self._content_hash is None:
+                digest = hashlib.sha256()
+                with open(self.path, 'rb') as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(block)
+                self._content_hash = digest.hexdigest()
+            return self._content_hash
+
+    @property
+    def native_sr(self):
+        """Frecuencia de muestreo original del archivo"""
+        self._decode()
+        return self._native_sr
+
+    @property
+    def is_decoded(self):
+        return self._native is not None
+
+    def _decode(self):
+        with self._lock:
+            if self._native is None:
+                # librosa se importa al usarse para no retrasar el arranque del bot
+                import librosa
+                with timed(self.timer, 'decode'):
+                    self._native, self._native_sr = librosa.load(str(self.path), sr=None)
+            return self._native
+
+    def samples(self, sr=None, normalize=False):
+        """
+        Señal mono a la frecuencia sr (por defecto, la original).
+
+        Los arrays devueltos se comparten entre consumidores y no deben modificarse.
+        """
+        with self._lock:
+            native = self._decode()
+            sr = sr or self._native_sr
+            key = (sr, normalize)
+            if key not in self._resampled:
+                if normalize:
+                    import librosa
+                    y = librosa.util.normalize(self.samples(sr))
+                elif sr == self._native_sr:
+                    y = native
+                else:
+                    import librosa
+                    with timed(self.timer, 'resample'):
+                        y = librosa.resample(native, orig_sr=self._native_sr, target_sr=sr, res_type=self.res_type)
+                y.flags.writeable = False
+                self._resampled[key] = y
+            return self._resampled[key]
+
+    def spectrogram(self, sr=None, n_fft=2048, hop_length=512, normalize=False):
+        """Magnitud de la STFT de samples(sr, normalize), calculada una sola vez"""
+        with self._lock:
+            sr = sr or self.native_sr
+            key = (sr, n_fft, hop_length, normalize)
+            if key not in self._spectrograms:
+                import librosa
+                y = self.samples(sr, normalize)
+                with timed(self.timer, 'stft'):
+                    magnitude = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length))
+                magnitude.flags.writeable = False
+                self._spectrograms[key] = magnitude
+            return self._spectrograms[key]
+
+    @property
+    def spectrograms(self):
+        """Espectrogramas ya calculados, indexados por (sr, n_fft, hop_length, normalize)"""
+        with self._lock:
+            return dict(self._spectrograms)
+
+def as_audio_buffer(audio):
+    """Devuelve audio si ya es un AudioBuffer o crea uno a partir de una ruta"""
+    return audio if isinstance(audio, AudioBuffer) else AudioBuffer(audio)
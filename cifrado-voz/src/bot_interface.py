@@ -3,14 +3,21 @@ import logging
 import os
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, ConversationHandler
-from encryption_handler import EncryptionHandler
-from decryption_handler import DecryptionHandler
+from encryption_handler import encrypt_file_bot_handler, get_encryption_handler, record_request_metrics
+from decryption_handler import decrypt_file_bot_handler, get_decryption_handler
+from metrics import get_registry
+from task_executor import TaskExecutor
 
 
+# Nivel de log configurable con LOG_LEVEL (DEBUG, INFO, WARNING, ...); por defecto INFO
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').strip().upper()
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.DEBUG
+    level=getattr(logging, LOG_LEVEL, logging.INFO)
 )
+# httpx registra cada petición de polling a Telegram a nivel INFO
+if logging.getLogger().getEffectiveLevel() > logging.DEBUG:
+    logging.getLogger('httpx').setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 # Token del bot
@@ -42,13 +49,15 @@ def limpiar_archivos():
     else:
         print("No se encontraron archivos en la carpeta to_encrypt")
 
-    # Eliminar archivo específico en AUDIO_DIR
-    audio_file_path = os.path.join(AUDIO_DIR, 'user_input.wav')
-    if os.path.exists(audio_file_path):
-        os.remove(audio_file_path)
-        print("Archivo eliminado en audio_samples: user_input.wav")
+    # Eliminar los audios de entrada en AUDIO_DIR (user_input.wav y los de cada chat)
+    audios_entrada = [archivo for archivo in os.listdir(AUDIO_DIR)
+                      if archivo.startswith('user_input') and archivo.endswith('.wav')]
+    if audios_entrada:
+        for archivo in audios_entrada:
+            os.remove(os.path.join(AUDIO_DIR, archivo))
+            print(f"Archivo eliminado en audio_samples: {archivo}")
     else:
-        print("Archivo user_input.wav no encontrado en audio_samples")
+        print("No se encontraron audios de entrada en audio_samples")
 
     # Eliminar archivos en PROCESSED_DIR, excluyendo carpetas
     if os.listdir(PROCESSED_DIR):
@@ -70,10 +79,6 @@ def limpiar_archivos():
     else:
         print("No se encontraron archivos en la carpeta output")
 
-# Ejecutar limpieza de archivos antes de iniciar el bot
-limpiar_archivos()
-print("Limpieza de archivos completada. Presiona Enter para iniciar el bot.")
-input()
 # Estados para el manejador de conversación
 MOSTRAR_MENU = 1
 ESPERANDO_AUDIO = 2
@@ -81,9 +86,60 @@ ESPERANDO_SELECCION_DESCIFRAR = 3
 ESPERANDO_ARCHIVO = 5
 ESPERANDO_SELECCION_ENCRIPTAR = 6
 
-# Instancia de EncryptionHandler y DecryptionHandler
-encryption_handler = EncryptionHandler()
-decryption_handler = DecryptionHandler()
+# Instancia de EncryptionHandler y DecryptionHandler (compartidas con los wrappers del bot)
+encryption_handler = get_encryption_handler()
+decryption_handler = get_decryption_handler()
+
+# Pool donde se ejecuta el trabajo pesado (voz, gráficos y AES) para no bloquear el bucle
+# de eventos. Se configura con BOT_EXECUTOR=thread|process y BOT_MAX_WORKERS
+executor = TaskExecutor.from_env()
+
+# Profundidad de la cola: tareas enviadas al pool que aún no han terminado
+get_registry().gauge('executor_pending_tasks', "Tareas enviadas al pool que aún no han terminado",
+                     callback=lambda: executor.pending)
+
+def registrar_metricas_peticion(operacion, resultado):
+    """
+    Con un pool de procesos, las métricas que registran los handlers quedan en cada
+    worker; el resultado (con sus 'timings') se registra también en este proceso,
+    que es el que exporta las métricas.
+    """
+    if executor.mode == 'process':
+        record_request_metrics(operacion, resultado)
+
+def iniciar_exportador_metricas():
+    """
+    Inicia la exportación de métricas en formato Prometheus según el entorno:
+    METRICS_PORT sirve http://127.0.0.1:<puerto>/metrics (METRICS_HOST cambia la interfaz)
+    y METRICS_FILE escribe el archivo cada METRICS_INTERVAL segundos (15 por defecto).
+    
+    Returns:
+        Función que detiene los exportadores iniciados
+    """
+    registry = get_registry()
+    detener = []
+    port = os.environ.get('METRICS_PORT')
+    if port:
+        server = registry.start_http_server(int(port), os.environ.get('METRICS_HOST', '127.0.0.1'))
+        logger.info(f"Métricas disponibles en http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+        detener.append(server.shutdown)
+    metrics_file = os.environ.get('METRICS_FILE')
+    if metrics_file:
+        stop = registry.start_file_exporter(metrics_file, float(os.environ.get('METRICS_INTERVAL', '15')))
+        logger.info(f"Métricas escritas periódicamente en {metrics_file}")
+        detener.append(stop.set)
+
+    def detener_exportadores():
+        for detener_exportador in detener:
+            detener_exportador()
+    return detener_exportadores
+
+def ruta_audio_usuario(update: Update) -> str:
+    """
+    Audio de voz de cada chat. Las peticiones de chats distintos pueden ejecutarse a la vez
+    en el pool, así que cada una debe verificar el audio de su propio chat.
+    """
+    return os.path.join(AUDIO_DIR, f"user_input_{update.effective_chat.id}.wav")
 
 # Función para solicitar al usuario que envíe un archivo
 async def agregar_archivo(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -169,8 +225,9 @@ async def procesar_seleccion_encriptar(update: Update, context: ContextTypes.DEF
         # Verifica si el índice seleccionado es válido (dentro del rango de archivos disponibles)
         if 0 <= seleccion < len(archivos_para_encriptar):
             archivo_seleccionado = archivos_para_encriptar[seleccion]
-            # Llama al handler de encriptación para procesar el archivo seleccionado
-            resultado = encryption_handler.process_file_encryption(archivo_seleccionado)
+            # Llama al handler de encriptación en el pool para no bloquear a otros usuarios
+            resultado = await executor.run(encrypt_file_bot_handler, archivo_seleccionado, ruta_audio_usuario(update))
+            registrar_metricas_peticion('encrypt', resultado)
             
             # Si la encriptación fue exitosa
             if resultado['success']:
@@ -208,15 +265,15 @@ async def recibir_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Si el mensaje contiene un archivo de audio
     if audio:
-        # Define la ruta donde se guardará el archivo de audio recibido
-        file_path = os.path.join(AUDIO_DIR, "user_input.wav")
+        # Define la ruta donde se guardará el archivo de audio recibido (una por chat)
+        file_path = ruta_audio_usuario(update)
         
         # Obtiene el archivo de Telegram y lo guarda en la ruta especificada
         telegram_audio = await audio.get_file()
         await telegram_audio.download_to_drive(file_path)
         
         # Informa al usuario que el audio ha sido recibido y guardado
-        await update.message.reply_text("Audio recibido y guardado como 'user_input.wav'.")
+        await update.message.reply_text(f"Audio recibido y guardado como '{os.path.basename(file_path)}'.")
         # Luego muestra el menú principal al usuario
         return await mostrar_menu(update, context)
     else:
@@ -226,16 +283,17 @@ async def recibir_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def eliminar_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Define la ruta del archivo de audio que se desea eliminar
-    file_path = os.path.join(AUDIO_DIR, "user_input.wav")
+    file_path = ruta_audio_usuario(update)
+    nombre = os.path.basename(file_path)
     
     # Si el archivo existe, se elimina
     if os.path.exists(file_path):
         os.remove(file_path)
         # Informa al usuario que el archivo ha sido eliminado
-        await update.message.reply_text("El archivo 'user_input.wav' ha sido eliminado.")
+        await update.message.reply_text(f"El archivo '{nombre}' ha sido eliminado.")
     else:
         # Si el archivo no existe, informa al usuario
-        await update.message.reply_text("El archivo 'user_input.wav' no existe.")
+        await update.message.reply_text(f"El archivo '{nombre}' no existe.")
     
     # Luego muestra el menú principal al usuario
     return await mostrar_menu(update, context)
@@ -271,8 +329,9 @@ async def procesar_descifrado(update: Update, context: ContextTypes.DEFAULT_TYPE
         # Verifica si el índice seleccionado es válido (dentro del rango de archivos disponibles)
         if 0 <= seleccion < len(archivos_para_descifrar):
             archivo_seleccionado = archivos_para_descifrar[seleccion]
-            # Llama al handler de descifrado para procesar el archivo seleccionado
-            resultado = decryption_handler.process_file_decryption(archivo_seleccionado)
+            # Llama al handler de descifrado en el pool para no bloquear a otros usuarios
+            resultado = await executor.run(decrypt_file_bot_handler, archivo_seleccionado, ruta_audio_usuario(update))
+            registrar_metricas_peticion('decrypt', resultado)
             
             # Si el descifrado fue exitoso
             if resultado['success']:
@@ -288,8 +347,11 @@ async def procesar_descifrado(update: Update, context: ContextTypes.DEFAULT_TYPE
                 
                 # Si hay una visualización asociada, la envía al usuario como una foto
                 if 'visualization' in resultado:
-                    with open(resultado['visualization'], 'rb') as img:
-                        await update.message.reply_photo(photo=img)
+                    try:
+                        with open(resultado['visualization'], 'rb') as img:
+                            await update.message.reply_photo(photo=img)
+                    except OSError as e:
+                        logger.warning(f"No se pudo enviar la visualización: {e}")
             else:
                 # Si hubo un error en el proceso de descifrado, informa al usuario
                 await update.message.reply_text(f"❌ Error: {resultado['message']}")
@@ -307,8 +369,10 @@ async def procesar_descifrado(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 
 async def mostrar_graficos(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # Busca todos los archivos .png en la carpeta de salida (OUTPUT_DIR)
-    archivos_png = [f for f in os.listdir(OUTPUT_DIR) if f.endswith('.png')]
+    # Busca los archivos .png de este chat en la carpeta de salida (OUTPUT_DIR); las imágenes
+    # llevan el nombre del audio del chat, así que no se envían las de otros usuarios
+    audio_chat = os.path.splitext(os.path.basename(ruta_audio_usuario(update)))[0]
+    archivos_png = [f for f in os.listdir(OUTPUT_DIR) if f.endswith(f'_{audio_chat}.png')]
     
     # Si hay archivos .png en la carpeta
     if archivos_png:
@@ -343,7 +407,14 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Ha ocurrido un error en el sistema.")
 
 def run_bot():
-    # Inicializa la aplicación del bot usando el token de Telegram
+    # Ejecutar limpieza de archivos antes de iniciar el bot
+    limpiar_archivos()
+    print("Limpieza de archivos completada. Presiona Enter para iniciar el bot.")
+    input()
+
+    # Inicializa la aplicación del bot usando el token de Telegram. ConversationHandler exige
+    # procesar las actualizaciones en orden; las selecciones de cifrado y descifrado (las
+    # operaciones largas) se registran con block=False para no detener a otros chats
     application = Application.builder().token(TOKEN).build()
 
     # Define el controlador de conversación para gestionar el flujo y estados del bot
@@ -365,11 +436,13 @@ def run_bot():
             # Estado en el que el bot espera un archivo del usuario
             ESPERANDO_ARCHIVO: [MessageHandler(filters.ALL, recibir_archivo)],
             # Estado en el que el bot espera un texto para la selección de cifrado
-            ESPERANDO_SELECCION_ENCRIPTAR: [MessageHandler(filters.TEXT & ~filters.COMMAND, procesar_seleccion_encriptar)],
+            ESPERANDO_SELECCION_ENCRIPTAR: [MessageHandler(filters.TEXT & ~filters.COMMAND, procesar_seleccion_encriptar,
+                                                           block=False)],
             # Estado en el que el bot espera recibir un mensaje de voz
             ESPERANDO_AUDIO: [MessageHandler(filters.VOICE, recibir_audio)],
             # Estado en el que el bot espera una selección de descifrado del usuario
-            ESPERANDO_SELECCION_DESCIFRAR: [MessageHandler(filters.TEXT & ~filters.COMMAND, procesar_descifrado)],
+            ESPERANDO_SELECCION_DESCIFRAR: [MessageHandler(filters.TEXT & ~filters.COMMAND, procesar_descifrado,
+                                                           block=False)],
         },
         
         
@@ -384,8 +457,14 @@ def run_bot():
     # Manejador de errores para capturar y gestionar errores en el bot
     application.add_error_handler(error_handler)
 
+    detener_metricas = iniciar_exportador_metricas()
+
     # Inicia el bot en modo polling (escucha continua de mensajes)
-    application.run_polling()
+    try:
+        application.run_polling()
+    finally:
+        executor.shutdown()
+        detener_metricas()
 
 if __name__ == "__main__":
     run_bot()
@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 from pathlib import Path
+import os
 import sys
-import shutil
+import threading
+import uuid
 
 # Añadir el directorio src al path de Python
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root / 'src'))
 
-from encryption_handler import EncryptionHandler
+from audio_ingest import AudioBuffer
+from encryption import worker_cpu_time
+from instrumentation import StageTimer
+from encryption_handler import EncryptionHandler, FILE_BYTES, record_request_metrics
 
 class DecryptionHandler(EncryptionHandler):
     def __init__(self):
@@ -15,16 +20,27 @@ class DecryptionHandler(EncryptionHandler):
         self.decrypted_dir = self.data_dir / 'decrypted'
         self.decrypted_dir.mkdir(parents=True, exist_ok=True)
 
-    def process_file_decryption(self, file_name: str = None) -> dict:
+    def process_file_decryption(self, file_name: str = None, input_file: str = None) -> dict:
         """
         Procesa la desencriptación de un archivo.
         
         Args:
             file_name: Nombre del archivo a desencriptar
+            input_file: Audio de voz a verificar (por defecto, audio_samples/user_input.wav)
             
         Returns:
-            Dict con información sobre el proceso
+            Dict con información sobre el proceso, incluido el desglose
+            de tiempos por etapa en 'timings'
         """
+        timer = StageTimer()
+        result = self._process_file_decryption(file_name, timer, input_file)
+        result['timings'] = timer.as_dict()
+        record_request_metrics('decrypt', result)
+        self.logger.info(f"Tiempos de process_file_decryption: {timer.summary()}")
+        return result
+
+    def _process_file_decryption(self, file_name: str, timer: StageTimer, input_file: str = None) -> dict:
+        """Implementación de process_file_decryption, midiendo cada etapa con timer"""
         try:
             # 1. Encontrar archivo a desencriptar
             if file_name:
@@ -46,7 +62,7 @@ class DecryptionHandler(EncryptionHandler):
             self.logger.info(f"Desencriptando archivo: {file_to_decrypt}")
 
             # 2. Verificar audio
-            input_file = self.audio_samples_dir / "user_input.wav"
+            input_file = Path(input_file) if input_file else self.audio_samples_dir / "user_input.wav"
             if not input_file.exists():
                 return {
                     'success': False,
@@ -54,8 +70,11 @@ class DecryptionHandler(EncryptionHandler):
                 }
 
             # 3. Verificar voz y generar visualización
-            result = self.voice_system.verify_voice(input_file)
-            vis_path = self.visualizer.create_visualizations(str(input_file))
+            # El audio se decodifica una vez y se comparte entre la verificación y los gráficos
+            audio = AudioBuffer(input_file, timer=timer)
+            result = self.voice_system.verify_voice(audio, timer=timer)
+            with timer.stage('visualization'):
+                vis_path = self.visualizer.create_visualizations(audio, name=input_file.stem)
 
             if not result['matches']:
                 return {
@@ -75,19 +94,26 @@ class DecryptionHandler(EncryptionHandler):
 
             key = result['encryption_data']['key_bytes']
             
-            # Desencriptar y mover a carpeta de desencriptados
-            decrypted_file = self.encrypter.decrypt_file(str(file_to_decrypt), key)
+            # Desencriptar en una ruta temporal propia de la petición, para que dos peticiones
+            # sobre el mismo archivo no escriban a la vez en output/ ni en decrypted/
+            decrypted_path = self.decrypted_dir / file_to_decrypt.name.replace('.enc', '')
+            tmp_path = self.decrypted_dir / f".{uuid.uuid4().hex}.{decrypted_path.name}"
+            with timer.stage('decryption'):
+                workers_cpu = worker_cpu_time()
+                decrypted_file = self.encrypter.decrypt_file(str(file_to_decrypt), key,
+                                                             output_file=tmp_path)
+                timer.add_cpu(worker_cpu_time() - workers_cpu)
             if not decrypted_file:
+                tmp_path.unlink(missing_ok=True)
                 return {
                     'success': False,
                     'message': "Error durante la desencriptación"
                 }
 
             # Mover archivo desencriptado a su carpeta
-            decrypted_path = self.decrypted_dir / Path(decrypted_file).name
-            if decrypted_path.exists():
-                decrypted_path.unlink()
-            shutil.move(decrypted_file, decrypted_path)
+            FILE_BYTES.inc(tmp_path.stat().st_size, operation='decrypt')
+            with timer.stage('file_moves'):
+                os.replace(tmp_path, decrypted_path)
 
             return {
                 'success': True,
@@ -112,6 +138,37 @@ class DecryptionHandler(EncryptionHandler):
             self.logger.error(f"Error listando archivos encriptados: {str(e)}")
             return []
 
+_handler = None
+_handler_lock = threading.Lock()
+
+def get_decryption_handler() -> DecryptionHandler:
+    """
+    Devuelve el DecryptionHandler compartido del proceso, creándolo la primera vez.
+    
+    En un pool de procesos cada worker crea y reutiliza su propia instancia.
+    """
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            _handler = DecryptionHandler()
+        return _handler
+
+def decrypt_file_bot_handler(file_name: str = None, input_file: str = None) -> dict:
+    """
+    Función wrapper para ser llamada desde el bot de Telegram.
+    
+    Al estar definida a nivel de módulo puede ejecutarse tanto en un pool de hilos
+    como en un pool de procesos.
+    
+    Args:
+        file_name: Nombre del archivo a desencriptar
+        input_file: Audio de voz del chat que hace la petición (opcional)
+        
+    Returns:
+        Diccionario con el resultado del proceso
+    """
+    return get_decryption_handler().process_file_decryption(file_name, input_file)
+
 def test_decryption_direct():
     """
     Prueba directa de la funcionalidad de desencriptación
@@ -1,11 +1,235 @@
 import numpy as np
-from scipy.fft import fft
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import hmac
+import mmap
 import os
+import struct
+import threading
+import time
+import zlib
+
+# Tamaño por defecto de los bloques leídos/escritos en modo streaming (1 MiB)
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# Tamaño de texto cifrado a partir del cual se descifra con mmap (64 MiB)
+DEFAULT_MMAP_THRESHOLD = 64 * 1024 * 1024
+
+# Contenedor .enc versionado: cabecera seguida de bloques AES-GCM autenticados de forma
+# independiente. Los archivos del formato anterior (IV + texto cifrado CFB) se siguen leyendo.
+CONTAINER_MAGIC = b'SVFC'
+CONTAINER_VERSION = 1
+# Magic, versión, flags, reservado, tamaño de bloque, prefijo del nonce, valor de
+# comprobación de la clave y tamaño del contenido cifrado
+_HEADER = struct.Struct('>4sBBHI8s8sQ')
+HEADER_SIZE = _HEADER.size
+TAG_SIZE = 16
+# Flags de la cabecera: el contenido se comprimió con zlib antes de cifrarse
+FLAG_ZLIB = 0x01
+
+# Firmas (en el desplazamiento indicado) de formatos que ya están comprimidos
+COMPRESSED_SIGNATURES = (
+    (0, b'%PDF'), (0, b'\x89PNG'), (0, b'\xff\xd8\xff'), (0, b'GIF8'), (8, b'WEBP'),
+    (0, b'PK\x03\x04'), (0, b'\x1f\x8b'), (0, b'BZh'), (0, b'\xfd7zXZ\x00'), (0, b'(\xb5/\xfd'),
+    (0, b"7z\xbc\xaf'\x1c"), (0, b'Rar!'), (0, b'ID3'), (0, b'OggS'), (0, b'fLaC'), (4, b'ftyp'),
+    (0, CONTAINER_MAGIC)
+)
+
+def key_check_value(key):
+    """Valor de comprobación de la clave: permite rechazar una clave incorrecta antes de descifrar"""
+    return hmac.new(key, CONTAINER_MAGIC + b' key check', hashlib.sha256).digest()[:8]
+
+class ContainerHeader:
+    """
+    Cabecera del contenedor .enc.
+
+    El bloque i ocupa chunk_size bytes cifrados (el último puede ser menor) seguidos de su
+    etiqueta GCM, por lo que su posición se calcula sin leer el resto del archivo. El nonce
+    de cada bloque es el prefijo aleatorio de la cabecera seguido del índice del bloque, lo
+    que impide reordenar bloques. Los datos autenticados de cada bloque incluyen la
+    cabecera (salvo el tamaño, que se escribe al final) y una marca de último bloque, de
+    modo que un archivo truncado o con la cabecera modificada no se descifra.
+    """
+
+    def __init__(self, chunk_size, nonce_prefix, key_check, payload_size=0, flags=0, version=CONTAINER_VERSION):
+        if not 0 < chunk_size < 2 ** 32:
+            raise ValueError("Tamaño de bloque no válido en el contenedor")
+        self.version = version
+        self.flags = flags
+        self.chunk_size = chunk_size
+        self.nonce_prefix = nonce_prefix
+        self.key_check = key_check
+        self.payload_size = payload_size
+
+    @classmethod
+    def new(cls, key, chunk_size, flags=0):
+        return cls(chunk_size, get_random_bytes(8), key_check_value(key), flags=flags)
+
+    @classmethod
+    def unpack(cls, data):
+        magic, version, flags, _, chunk_size, nonce_prefix, key_check, payload_size = _HEADER.unpack(data)
+        if magic != CONTAINER_MAGIC:
+            raise ValueError("El archivo no es un contenedor .enc")
+        if version != CONTAINER_VERSION:
+            raise ValueError(f"Versión de contenedor no soportada: {version}")
+        if flags & ~FLAG_ZLIB:
+            raise ValueError(f"Flags de contenedor no soportados: {flags:#x}")
+        return cls(chunk_size, nonce_prefix, key_check, payload_size, flags, version)
+
+    def pack(self):
+        return _HEADER.pack(CONTAINER_MAGIC, self.version, self.flags, 0, self.chunk_size,
+                            self.nonce_prefix, self.key_check, self.payload_size)
+
+    @property
+    def chunk_count(self):
+        # Siempre hay al menos un bloque, para que un contenido vacío también esté autenticado
+        return max(1, -(-self.payload_size // self.chunk_size))
+
+    @property
+    def file_size(self):
+        return HEADER_SIZE + self.payload_size + self.chunk_count * TAG_SIZE
+
+    def chunk_offset(self, index):
+        return HEADER_SIZE + index * (self.chunk_size + TAG_SIZE)
+
+    def chunk_length(self, index):
+        """Bytes de contenido del bloque index"""
+        return min(self.chunk_size, self.payload_size - index * self.chunk_size)
+
+    def sealed_size(self, index):
+        """Bytes del bloque index en el archivo (texto cifrado y etiqueta)"""
+        return self.chunk_length(index) + TAG_SIZE
+
+    def nonce(self, index):
+        return self.nonce_prefix + struct.pack('>I', index)
+
+    def associated_data(self, final):
+        return self.pack()[:HEADER_SIZE - 8] + (b'\x01' if final else b'\x00')
+
+    def check_key(self, key):
+        if not hmac.compare_digest(self.key_check, key_check_value(key)):
+            raise ValueError("La clave no corresponde al archivo cifrado")
+
+def is_compressible(file, sample_size=64 * 1024, min_saving=0.1):
+    """
+    Sondeo rápido de compresibilidad antes de cifrar.
+
+    Descarta por su firma los formatos ya comprimidos (PDF, imágenes, ZIP/Office, audio,
+    vídeo...) y, para el resto, comprime con zlib en el nivel más rápido una muestra del
+    inicio y otra de la mitad del archivo.
+
+    Returns:
+        True si la muestra se reduce al menos en min_saving (fracción del tamaño)
+    """
+    size = os.path.getsize(file)
+    if not size:
+        return False
+    with open(file, 'rb') as f:
+        sample = f.read(sample_size)
+        if any(sample[offset:offset + len(signature)] == signature for offset, signature in COMPRESSED_SIGNATURES):
+            return False
+        if size > 2 * sample_size:
+            f.seek(size // 2)
+            sample += f.read(sample_size)
+    return len(zlib.compress(sample, 1)) <= (1 - min_saving) * len(sample)
+
+def read_container_header(encrypted_file):
+    """Cabecera del contenedor, o None si el archivo usa el formato anterior (IV + CFB)"""
+    with open(encrypted_file, 'rb') as f:
+        data = f.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE or not data.startswith(CONTAINER_MAGIC):
+        return None
+    return ContainerHeader.unpack(data)
+
+def seal_chunk(key, header, index, data, final):
+    """Cifra y autentica el bloque index; devuelve el texto cifrado seguido de la etiqueta"""
+    # El texto cifrado se escribe directamente en el buffer de salida, sin concatenar
+    sealed = bytearray(len(data) + TAG_SIZE)
+    cipher = AES.new(key, AES.MODE_GCM, nonce=header.nonce(index))
+    cipher.update(header.associated_data(final))
+    _, tag = cipher.encrypt_and_digest(data, output=memoryview(sealed)[:len(data)])
+    sealed[len(data):] = tag
+    return sealed
+
+def open_chunk(key, header, index, sealed):
+    """Verifica y descifra el bloque index (lanza ValueError si fue modificado)"""
+    plaintext = bytearray(len(sealed) - TAG_SIZE)
+    sealed = memoryview(sealed)
+    cipher = AES.new(key, AES.MODE_GCM, nonce=header.nonce(index))
+    cipher.update(header.associated_data(index == header.chunk_count - 1))
+    cipher.decrypt_and_verify(sealed[:-TAG_SIZE], sealed[-TAG_SIZE:], output=plaintext)
+    return plaintext
+
+class _PositionalReader:
+    """
+    Lecturas por posición seguras entre hilos, para que cada worker lea su propio bloque
+    en lugar de serializar la lectura en el hilo que escribe la salida
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self._lock = threading.Lock()
+
+    def read(self, offset, size):
+        if hasattr(os, 'pread'):
+            return os.pread(self._f.fileno(), size, offset)
+        # Sin pread (Windows) las lecturas comparten la posición del archivo
+        with self._lock:
+            self._f.seek(offset)
+            return self._f.read(size)
+
+# CPU consumida por los hilos de _map_ordered, acumulada en el hilo que los lanzó
+_worker_cpu = threading.local()
+
+def worker_cpu_time():
+    """
+    Segundos de CPU que los hilos del pool del contenedor han consumido por cuenta del hilo
+    actual. time.thread_time solo cuenta el hilo que llama, así que para medir la CPU de una
+    operación con varios workers hay que sumar también la diferencia de este valor.
+    """
+    return getattr(_worker_cpu, 'seconds', 0.0)
+
+def _timed_call(function, *args):
+    """Ejecuta function en un hilo del pool y devuelve también la CPU que consumió"""
+    start = time.thread_time()
+    result = function(*args)
+    return result, time.thread_time() - start
+
+def _seal_at(reader, key, header, index):
+    data = reader.read(index * header.chunk_size, header.chunk_length(index))
+    return seal_chunk(key, header, index, data, index == header.chunk_count - 1)
+
+def _open_at(reader, key, header, index):
+    return open_chunk(key, header, index, reader.read(header.chunk_offset(index), header.sealed_size(index)))
 
 class Encrypter:
 
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, mmap_threshold=DEFAULT_MMAP_THRESHOLD,
+                 container=False, workers=None, compress=False, compression_level=6):
+        """
+        Args:
+            chunk_size: Tamaño de los bloques de lectura/escritura y de los bloques del contenedor
+            mmap_threshold: Tamaño a partir del cual los archivos del formato anterior se descifran con mmap
+            container: Cifrar con el contenedor versionado (AES-GCM por bloques) en lugar de IV + CFB
+            workers: Hilos que leen y procesan los bloques del contenedor en paralelo (por defecto,
+                uno por núcleo); con 1 el archivo se procesa en el hilo que llama
+            compress: Comprimir con zlib antes de cifrar los archivos que lo permitan
+                (según is_compressible); requiere el contenedor, que lo indica en su cabecera
+            compression_level: Nivel de compresión de zlib (1 a 9)
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size debe ser mayor que cero")
+        if compress and not container:
+            raise ValueError("La compresión requiere el formato contenedor")
+        self.chunk_size = chunk_size
+        self.mmap_threshold = mmap_threshold
+        self.container = container
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.compress = compress
+        self.compression_level = compression_level
+
     def generate_key(self, fft_coefficients):
         try:
             # Calcula la magnitud de los coeficientes de Fourier
@@ -20,44 +244,280 @@ class Encrypter:
             print(f"Error al generar la clave: {e}")
             return None
 
-    def encrypt_file(self, file, key):
+    def encrypt_file(self, file, key, encrypted_file=None):
+        """
+        Args:
+            encrypted_file: Ruta del archivo cifrado (por defecto, file + '.enc')
+        """
         try:
+            encrypted_file = str(encrypted_file) if encrypted_file else file + '.enc'
+            if self.container:
+                if self.compress and is_compressible(file):
+                    return self._encrypt_compressed(file, encrypted_file, key)
+                return self._encrypt_container(file, encrypted_file, key)
+
             # Genera un vector de inicialización (IV) de 16 bytes
             iv = get_random_bytes(16)
             # Crea el cifrador AES en modo CFB con la clave y el IV
             cipher = AES.new(key, AES.MODE_CFB, iv=iv)
-            # Lee y cifra el contenido del archivo original
-            with open(file, 'rb') as f:
-                encrypted_data = cipher.encrypt(f.read())
-
-            # Guarda los datos cifrados junto con el IV en un nuevo archivo con extensión '.enc'
-            encrypted_file = file + '.enc'
-            with open(encrypted_file, 'wb') as f_enc:
-                f_enc.write(iv + encrypted_data)
+            # Guarda el IV seguido de los datos cifrados en un nuevo archivo con extensión '.enc'.
+            # CFB cifra byte a byte, por lo que cifrar por bloques produce exactamente
+            # la misma salida que cifrar el archivo completo de una sola vez.
+            with open(file, 'rb') as f, open(encrypted_file, 'wb') as f_enc:
+                f_enc.write(iv)
+                self._stream(f, f_enc, cipher.encrypt)
 
             return encrypted_file
         except Exception as e:
             print(f"Error al encriptar el archivo {file}: {e}")
             return None
 
-    def decrypt_file(self, encrypted_file, key):
+    def decrypt_file(self, encrypted_file, key, use_mmap=None, output_file=None):
+        """
+        Args:
+            output_file: Ruta del archivo descifrado (por defecto, encrypted_file sin '.enc')
+        """
         try:
-            # Lee el IV y los datos cifrados del archivo
-            with open(encrypted_file, 'rb') as f_enc:
-                iv = f_enc.read(16)
-                encrypted_data = f_enc.read()
+            # Elimina la extensión '.enc' para restaurar el nombre y extensión originales
+            original_filename = str(output_file) if output_file else encrypted_file.replace('.enc', '')
 
-            # Crea el cifrador AES en modo CFB con la misma clave e IV
-            cipher = AES.new(key, AES.MODE_CFB, iv=iv)
+            header = read_container_header(encrypted_file)
+            if header is not None:
+                self._decrypt_container(encrypted_file, original_filename, key, header)
+                return original_filename
 
-            # Elimina la extensión '.enc' para restaurar el nombre y extensión originales
-            original_filename = encrypted_file.replace('.enc', '')
+            # Por defecto, solo los archivos grandes se descifran mediante mmap
+            data_size = os.path.getsize(encrypted_file) - 16
+            if use_mmap is None:
+                use_mmap = self.mmap_threshold is not None and data_size >= self.mmap_threshold
+            if use_mmap and data_size > 0:
+                self._decrypt_mmap(encrypted_file, original_filename, key, data_size)
+                return original_filename
+
+            with open(encrypted_file, 'rb') as f_enc:
+                # Lee el IV y crea el cifrador AES en modo CFB con la misma clave
+                iv = f_enc.read(16)
+                cipher = AES.new(key, AES.MODE_CFB, iv=iv)
 
-            # Descifra los datos y los guarda en un archivo con el nombre original
-            with open(original_filename, 'wb') as f_dec:
-                f_dec.write(cipher.decrypt(encrypted_data))
+                # Descifra los datos por bloques y los guarda con el nombre original
+                with open(original_filename, 'wb') as f_dec:
+                    self._stream(f_enc, f_dec, cipher.decrypt)
 
             return original_filename
         except Exception as e:
             print(f"Error al desencriptar el archivo {encrypted_file}: {e}")
             return None
+
+    def decrypt_range(self, encrypted_file, key, offset, length):
+        """
+        Descifra solo los bytes [offset, offset + length) del archivo original.
+
+        En el contenedor se leen y verifican únicamente los bloques que contienen el rango.
+        En el formato anterior (CFB de 8 bits) el registro de desplazamiento en la posición p
+        son los 16 bytes cifrados anteriores, que en el archivo están en [p, p + 16) (el IV
+        ocupa los 16 primeros bytes), por lo que el descifrado puede empezar en cualquier
+        posición. En ambos casos el coste es proporcional al tamaño del rango.
+
+        Returns:
+            Los bytes descifrados (menos de length si el rango pasa del final del archivo)
+            o None si hubo un error
+        """
+        try:
+            if offset < 0 or length < 0:
+                raise ValueError("offset y length no pueden ser negativos")
+
+            header = read_container_header(encrypted_file)
+            if header is not None and header.flags & FLAG_ZLIB:
+                return self._decompressed_range(encrypted_file, key, header, offset, length)
+            if header is not None:
+                return self._decrypt_container_range(encrypted_file, key, header, offset, length)
+
+            data_size = os.path.getsize(encrypted_file) - 16
+            length = max(0, min(length, data_size - offset))
+            if not length:
+                return b''
+            with open(encrypted_file, 'rb') as f_enc:
+                f_enc.seek(offset)
+                data = f_enc.read(16 + length)
+            return AES.new(key, AES.MODE_CFB, iv=data[:16]).decrypt(data[16:])
+        except Exception as e:
+            print(f"Error al desencriptar el rango {offset}+{length} de {encrypted_file}: {e}")
+            return None
+
+    def _decrypt_container_range(self, encrypted_file, key, header, offset, length):
+        header.check_key(key)
+        length = max(0, min(length, header.payload_size - offset))
+        if not length:
+            return b''
+        first = offset // header.chunk_size
+        last = (offset + length - 1) // header.chunk_size
+
+        # Los bloques del rango son contiguos en el archivo: una sola lectura
+        with open(encrypted_file, 'rb') as f_enc:
+            f_enc.seek(header.chunk_offset(first))
+            data = f_enc.read(header.chunk_offset(last) + header.sealed_size(last) - header.chunk_offset(first))
+        chunks = []
+        position = 0
+        for index in range(first, last + 1):
+            size = header.sealed_size(index)
+            chunks.append((key, header, index, data[position:position + size]))
+            position += size
+        plaintext = b''.join(self._map_ordered(open_chunk, chunks, parallel=last > first))
+        start = offset - first * header.chunk_size
+        return plaintext[start:start + length]
+
+    def _decompressed_range(self, encrypted_file, key, header, offset, length):
+        """
+        Rango de un contenedor comprimido: las posiciones del archivo original no
+        corresponden a bloques concretos, así que se descomprime desde el principio y se
+        para en cuanto se tiene el rango (coste proporcional a offset + length)
+        """
+        header.check_key(key)
+        decompressor = zlib.decompressobj()
+        position = 0
+        parts = []
+        with open(encrypted_file, 'rb') as f_enc:
+            reader = _PositionalReader(f_enc)
+            for index in range(header.chunk_count):
+                if position >= offset + length:
+                    break
+                data = decompressor.decompress(_open_at(reader, key, header, index))
+                start = max(0, offset - position)
+                if start < len(data):
+                    parts.append(data[start:offset + length - position])
+                position += len(data)
+        return b''.join(parts)
+
+    def _encrypt_container(self, file, encrypted_file, key):
+        """
+        Cifra file en el contenedor versionado. Cada bloque tiene su propio nonce, así que
+        los workers leen y sellan bloques distintos a la vez; la salida se escribe en orden.
+        """
+        header = ContainerHeader.new(key, self.chunk_size)
+        header.payload_size = os.path.getsize(file)
+        with open(file, 'rb') as f, open(encrypted_file, 'wb') as f_enc:
+            f_enc.write(header.pack())
+            reader = _PositionalReader(f)
+            chunks = ((reader, key, header, index) for index in range(header.chunk_count))
+            for sealed in self._map_ordered(_seal_at, chunks, parallel=header.chunk_count > 1):
+                f_enc.write(sealed)
+        return encrypted_file
+
+    def _encrypt_compressed(self, file, encrypted_file, key):
+        """
+        Comprime file con zlib en flujo y cifra el resultado en el contenedor. El tamaño
+        comprimido solo se conoce al final, por lo que la cabecera se reescribe al terminar
+        (el tamaño no forma parte de los datos autenticados; el truncado se detecta con la
+        marca de último bloque).
+        """
+        header = ContainerHeader.new(key, self.chunk_size, flags=FLAG_ZLIB)
+        with open(file, 'rb') as f, open(encrypted_file, 'wb') as f_enc:
+            f_enc.write(header.pack())
+            payload_size = 0
+            chunks = ((key, header, index, data, final)
+                      for index, (data, final) in enumerate(self._compressed_chunks(f)))
+            for sealed in self._map_ordered(seal_chunk, chunks):
+                f_enc.write(sealed)
+                payload_size += len(sealed) - TAG_SIZE
+            header.payload_size = payload_size
+            f_enc.seek(0)
+            f_enc.write(header.pack())
+        return encrypted_file
+
+    def _compressed_chunks(self, f):
+        """Bloques de chunk_size bytes del contenido comprimido, con la marca de último bloque"""
+        compressor = zlib.compressobj(self.compression_level)
+        pending = bytearray()
+        while True:
+            data = f.read(self.chunk_size)
+            pending += compressor.compress(data) if data else compressor.flush()
+            # Un bloque solo se entrega cuando hay más datos detrás, para saber si es el último
+            while len(pending) > self.chunk_size:
+                yield bytes(pending[:self.chunk_size]), False
+                del pending[:self.chunk_size]
+            if not data:
+                yield bytes(pending), True
+                return
+
+    def _decrypt_container(self, encrypted_file, original_filename, key, header):
+        """Verifica y descifra los bloques del contenedor en paralelo, escribiéndolos en orden"""
+        header.check_key(key)
+        if os.path.getsize(encrypted_file) != header.file_size:
+            raise ValueError("El archivo cifrado está truncado o tiene datos adicionales")
+        try:
+            with open(encrypted_file, 'rb') as f_enc, open(original_filename, 'wb') as f_dec:
+                reader = _PositionalReader(f_enc)
+                chunks = ((reader, key, header, index) for index in range(header.chunk_count))
+                decompressor = zlib.decompressobj() if header.flags & FLAG_ZLIB else None
+                for plaintext in self._map_ordered(_open_at, chunks, parallel=header.chunk_count > 1):
+                    f_dec.write(decompressor.decompress(plaintext) if decompressor else plaintext)
+                if decompressor:
+                    f_dec.write(decompressor.flush())
+                    if not decompressor.eof or decompressor.unused_data:
+                        raise ValueError("El contenido comprimido está incompleto o tiene datos adicionales")
+        except Exception:
+            # No se deja un archivo descifrado a medias si algún bloque no se pudo autenticar
+            if os.path.exists(original_filename):
+                os.remove(original_filename)
+            raise
+
+    def _map_ordered(self, function, items, parallel=True):
+        """
+        Aplica function a cada tupla de items con un pool de hilos y devuelve los resultados
+        en orden. Solo hay 2 * workers bloques en vuelo, por lo que la memoria no depende del
+        tamaño del archivo; el cifrado de PyCryptodome libera el GIL, así que los hilos se
+        reparten los núcleos.
+        """
+        if self.workers <= 1 or not parallel:
+            for item in items:
+                yield function(*item)
+            return
+
+        def collect(future):
+            # El generador se consume en el hilo que llama: la CPU del worker se le atribuye a él
+            result, cpu = future.result()
+            _worker_cpu.seconds = worker_cpu_time() + cpu
+            return result
+
+        window = 2 * self.workers
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for item in items:
+                pending.append(executor.submit(_timed_call, function, *item))
+                if len(pending) >= window:
+                    yield collect(pending.popleft())
+            while pending:
+                yield collect(pending.popleft())
+
+    def _decrypt_mmap(self, encrypted_file, original_filename, key, data_size):
+        """Descifra mapeando en memoria el archivo cifrado y el de salida"""
+        with open(encrypted_file, 'rb') as f_enc, open(original_filename, 'w+b') as f_dec:
+            iv = f_enc.read(16)
+            cipher = AES.new(key, AES.MODE_CFB, iv=iv)
+
+            # Reserva el espacio del archivo de salida antes de mapearlo
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(f_dec.fileno(), 0, data_size)
+            else:
+                f_dec.truncate(data_size)
+
+            with mmap.mmap(f_enc.fileno(), 0, access=mmap.ACCESS_READ) as src, \
+                    mmap.mmap(f_dec.fileno(), data_size) as dst:
+                # Las vistas sobre los mapas evitan copias intermedias en bytes
+                with memoryview(src) as src_view, memoryview(dst) as dst_view:
+                    for start in range(0, data_size, self.chunk_size):
+                        end = min(start + self.chunk_size, data_size)
+                        cipher.decrypt(src_view[16 + start:16 + end], output=dst_view[start:end])
+                dst.flush()
+
+    def _stream(self, source, target, transform):
+        """Aplica transform a source por bloques de chunk_size y escribe en target"""
+        # Dos buffers reutilizables (entrada y salida) mantienen constante el uso de memoria
+        in_view = memoryview(bytearray(self.chunk_size))
+        out_view = memoryview(bytearray(self.chunk_size))
+        while True:
+            n = source.readinto(in_view)
+            if not n:
+                break
+            transform(in_view[:n], output=out_view[:n])
+            target.write(out_view[:n])
@@ -1,10 +1,47 @@
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import os
 import shutil
 import logging
+import threading
+import time
+import uuid
 from typing import Dict, Optional, Union
+from audio_ingest import AudioBuffer
+from instrumentation import StageTimer
 from voice_processing import VoiceKeySystem
-from encryption import Encrypter
+from encryption import Encrypter, worker_cpu_time
 from visualization import VoiceVisualizer
+from metrics import get_registry
+
+_metrics = get_registry()
+FILE_REQUESTS = _metrics.counter('file_requests_total', "Peticiones de cifrado y descifrado por resultado",
+                                 labels=('operation', 'result'))
+FILE_REQUEST_SECONDS = _metrics.histogram('file_request_seconds', "Duración total de las peticiones de archivo",
+                                          labels=('operation',))
+REQUEST_STAGE_SECONDS = _metrics.histogram('request_stage_seconds', "Duración de cada etapa de las peticiones",
+                                           labels=('operation', 'stage'))
+FILE_BYTES = _metrics.counter('file_bytes_total', "Bytes cifrados o descifrados", labels=('operation',))
+
+def record_request_metrics(operation: str, result: dict) -> None:
+    """Registra el resultado y los tiempos por etapa ('timings') de una petición"""
+    FILE_REQUESTS.inc(operation=operation, result='success' if result.get('success') else 'failure')
+    timings = result.get('timings')
+    if timings:
+        FILE_REQUEST_SECONDS.observe(timings['total_wall_ms'] / 1000, operation=operation)
+        for stage, entry in timings['stages'].items():
+            REQUEST_STAGE_SECONDS.observe(entry['wall_ms'] / 1000, operation=operation, stage=stage)
+
+def _encrypt_measured(encrypter: Encrypter, file: str, key: bytes):
+    """
+    Encripta file en un worker del lote y devuelve también la CPU que consumió (la del
+    worker y la de los hilos del contenedor), que no aparece en el StageTimer de la petición.
+    Está a nivel de módulo para poder ejecutarse en un pool de procesos.
+    """
+    start_cpu = time.thread_time()
+    start_workers = worker_cpu_time()
+    encrypted_file = encrypter.encrypt_file(file, key)
+    return encrypted_file, time.thread_time() - start_cpu + worker_cpu_time() - start_workers
 
 class EncryptionHandler:
     def __init__(self, project_root: Path = None):
@@ -21,8 +58,11 @@ class EncryptionHandler:
             directory.mkdir(parents=True, exist_ok=True)
             
         self.voice_system = VoiceKeySystem()
-        self.encrypter = Encrypter()
-        self.visualizer = VoiceVisualizer(str(self.output_dir))
+        # Los archivos nuevos usan el contenedor autenticado; los anteriores se siguen descifrando.
+        # Los documentos compresibles se comprimen antes de cifrar (menos disco y subidas más rápidas)
+        self.encrypter = Encrypter(container=True, compress=True)
+        # El visualizador se crea al usarse por primera vez
+        self._visualizer = None
         
         # Configurar logging
         logging.basicConfig(
@@ -31,12 +71,22 @@ class EncryptionHandler:
         )
         self.logger = logging.getLogger('EncryptionHandler')
 
-    def process_file_encryption(self, file_name: Optional[str] = None) -> Dict[str, Union[bool, str, float]]:
+    @property
+    def visualizer(self) -> VoiceVisualizer:
+        """Visualizador de voz, creado bajo demanda"""
+        if self._visualizer is None:
+            # Modo rápido: las imágenes que se envían por el bot no necesitan cada muestra
+            self._visualizer = VoiceVisualizer(str(self.output_dir), fast_mode=True, dpi=120)
+        return self._visualizer
+
+    def process_file_encryption(self, file_name: Optional[str] = None,
+                                input_file: Optional[str] = None) -> Dict[str, Union[bool, str, float]]:
         """
         Procesa la encriptación de un archivo específico o el primer archivo encontrado en to_encrypt.
         
         Args:
             file_name (str, optional): Nombre del archivo a encriptar. Si es None, se usa el primer archivo encontrado.
+            input_file (str, optional): Audio de voz a verificar. Si es None, se usa audio_samples/user_input.wav.
             
         Returns:
             Dict con información sobre el proceso:
@@ -45,7 +95,18 @@ class EncryptionHandler:
                 - encrypted_file: str con la ruta del archivo encriptado (si existe)
                 - similarity: float con el valor de similitud de voz (si aplica)
                 - visualization: str con la ruta de la visualización (si existe)
+                - timings: tiempo de reloj y de CPU de cada etapa (ver StageTimer.as_dict)
         """
+        timer = StageTimer()
+        result = self._process_file_encryption(file_name, timer, input_file)
+        result['timings'] = timer.as_dict()
+        record_request_metrics('encrypt', result)
+        self.logger.info(f"Tiempos de process_file_encryption: {timer.summary()}")
+        return result
+
+    def _process_file_encryption(self, file_name: Optional[str], timer: StageTimer,
+                                 input_file: Optional[str] = None) -> Dict[str, Union[bool, str, float]]:
+        """Implementación de process_file_encryption, midiendo cada etapa con timer"""
         try:
             # 1. Encontrar el archivo a encriptar
             if file_name:
@@ -56,7 +117,7 @@ class EncryptionHandler:
                         'message': f"Archivo '{file_name}' no encontrado en el directorio to_encrypt"
                     }
             else:
-                files = list(self.to_encrypt_dir.glob('*'))
+                files = [f for f in self.to_encrypt_dir.glob('*') if f.is_file()]
                 if not files:
                     return {
                         'success': False,
@@ -67,7 +128,7 @@ class EncryptionHandler:
             self.logger.info(f"Procesando archivo: {file_to_encrypt}")
 
             # 2. Verificar audio de entrada
-            input_file = self.audio_samples_dir / "user_input.wav"
+            input_file = Path(input_file) if input_file else self.audio_samples_dir / "user_input.wav"
             if not input_file.exists():
                 return {
                     'success': False,
@@ -75,8 +136,12 @@ class EncryptionHandler:
                 }
 
             # 3. Verificar voz y generar visualización
-            result = self.voice_system.verify_voice(input_file)
-            vis_path = self.visualizer.create_visualizations(str(input_file))
+            # El audio se decodifica una vez y se comparte entre la verificación y los gráficos
+            audio = AudioBuffer(input_file, timer=timer)
+            result = self.voice_system.verify_voice(audio, timer=timer)
+            with timer.stage('visualization'):
+                # La imagen lleva el nombre del audio de entrada, que es propio de cada chat
+                vis_path = self.visualizer.create_visualizations(audio, name=input_file.stem)
 
             if not result['matches']:
                 return {
@@ -95,25 +160,32 @@ class EncryptionHandler:
                 }
 
             key = result['encryption_data']['key_bytes']
-            encrypted_file = self.encrypter.encrypt_file(str(file_to_encrypt), key)
+            claimed_file = self._claim_file(file_to_encrypt)
+            if claimed_file is None:
+                return {
+                    'success': False,
+                    'message': f"El archivo '{file_to_encrypt.name}' ya está siendo procesado por otra petición",
+                    'similarity': result['max_similarity']
+                }
+
+            file_size = claimed_file.stat().st_size
+            with timer.stage('encryption'):
+                workers_cpu = worker_cpu_time()
+                encrypted_file = self.encrypter.encrypt_file(str(claimed_file), key)
+                timer.add_cpu(worker_cpu_time() - workers_cpu)
 
             if not encrypted_file:
+                self._release_file(claimed_file, file_to_encrypt)
                 return {
                     'success': False,
                     'message': "Error durante la encriptación",
                     'similarity': result['max_similarity']
                 }
 
-            # 5. Mover archivo encriptado al directorio de salida
-            encrypted_path = self.output_dir / Path(encrypted_file).name
-            if encrypted_path.exists():
-                encrypted_path.unlink()
-            shutil.move(encrypted_file, encrypted_path)
-
-            # 6. Opcionalmente, mover el archivo original a un directorio de procesados
-            processed_dir = self.to_encrypt_dir / 'processed'
-            processed_dir.mkdir(exist_ok=True)
-            shutil.move(str(file_to_encrypt), str(processed_dir / file_to_encrypt.name))
+            # 5. Mover archivo encriptado y original a sus directorios
+            FILE_BYTES.inc(file_size, operation='encrypt')
+            with timer.stage('file_moves'):
+                encrypted_path = self._store_encrypted_file(claimed_file, encrypted_file)
 
             return {
                 'success': True,
@@ -130,6 +202,219 @@ class EncryptionHandler:
                 'message': f"Error inesperado: {str(e)}"
             }
 
+    def process_batch_encryption(self, max_workers: Optional[int] = None,
+                                 use_processes: bool = False,
+                                 input_file: Optional[str] = None) -> Dict[str, Union[bool, str, float, list, dict]]:
+        """
+        Encripta todos los archivos del directorio to_encrypt verificando la voz una sola vez.
+        
+        Args:
+            max_workers: Número de workers del pool (None usa el valor por defecto del executor)
+            use_processes: Si es True usa un pool de procesos en lugar de hilos
+            input_file: Audio de voz a verificar. Si es None, se usa audio_samples/user_input.wav.
+            
+        Returns:
+            Dict con información sobre el proceso:
+                - success: bool indicando si todos los archivos se encriptaron
+                - message: str con mensaje descriptivo
+                - results: lista con el resultado de cada archivo
+                - similarity: float con el valor de similitud de voz (si aplica)
+                - visualization: str con la ruta de la visualización (si existe)
+                - throughput: dict con archivos, bytes, tiempo y velocidad del lote
+                - timings: tiempo de reloj y de CPU de cada etapa (ver StageTimer.as_dict)
+        """
+        timer = StageTimer()
+        result = self._process_batch_encryption(max_workers, use_processes, timer, input_file)
+        result['timings'] = timer.as_dict()
+        record_request_metrics('batch_encrypt', result)
+        self.logger.info(f"Tiempos de process_batch_encryption: {timer.summary()}")
+        return result
+
+    def _process_batch_encryption(self, max_workers: Optional[int], use_processes: bool, timer: StageTimer,
+                                  input_file: Optional[str] = None) -> Dict[str, Union[bool, str, float, list, dict]]:
+        """Implementación de process_batch_encryption, midiendo cada etapa con timer"""
+        try:
+            # 1. Obtener los archivos pendientes
+            files = [f for f in self.to_encrypt_dir.glob('*') if f.is_file()]
+            if not files:
+                return {
+                    'success': False,
+                    'message': "No se encontraron archivos para encriptar"
+                }
+
+            self.logger.info(f"Procesando lote de {len(files)} archivos")
+
+            # 2. Verificar audio de entrada
+            input_file = Path(input_file) if input_file else self.audio_samples_dir / "user_input.wav"
+            if not input_file.exists():
+                return {
+                    'success': False,
+                    'message': "No se encontró el archivo de audio de entrada"
+                }
+
+            # 3. Verificar voz una única vez para todo el lote
+            # El audio se decodifica una vez y se comparte entre la verificación y los gráficos
+            audio = AudioBuffer(input_file, timer=timer)
+            result = self.voice_system.verify_voice(audio, timer=timer)
+            with timer.stage('visualization'):
+                vis_path = self.visualizer.create_visualizations(audio, name=input_file.stem)
+
+            if not result['matches']:
+                return {
+                    'success': False,
+                    'message': "Voz no autorizada",
+                    'similarity': result['max_similarity'],
+                    'visualization': str(vis_path)
+                }
+
+            if 'encryption_data' not in result or not result['encryption_data']:
+                return {
+                    'success': False,
+                    'message': "Error generando datos de encriptación",
+                    'similarity': result['max_similarity']
+                }
+
+            key = result['encryption_data']['key_bytes']
+
+            # 4. Encriptar los archivos en paralelo
+            executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+            results = []
+            total_bytes = 0
+            start = time.perf_counter()
+
+            # Con varios archivos el paralelismo está en el lote: cada archivo usa un solo hilo
+            # para no multiplicar los hilos del pool por los de cada archivo
+            encrypter = self.encrypter
+            if len(files) > 1:
+                encrypter = Encrypter(self.encrypter.chunk_size, self.encrypter.mmap_threshold,
+                                      container=self.encrypter.container, workers=1,
+                                      compress=self.encrypter.compress,
+                                      compression_level=self.encrypter.compression_level)
+            # Reservar cada archivo para que otra petición no encripte ni mueva el mismo
+            claimed = {}
+            for file in files:
+                claimed_file = self._claim_file(file)
+                if claimed_file is None:
+                    results.append({
+                        'file': file.name,
+                        'success': False,
+                        'message': "El archivo ya está siendo procesado por otra petición"
+                    })
+                    continue
+                claimed[claimed_file] = file
+
+            # Encriptación en el pool y movimiento de cada archivo a medida que termina
+            with timer.stage('encryption'):
+                with executor_class(max_workers=max_workers) as executor:
+                    futures = {
+                        executor.submit(_encrypt_measured, encrypter, str(file), key): file
+                        for file in claimed
+                    }
+                    for future in as_completed(futures):
+                        file = futures[future]
+                        file_size = file.stat().st_size
+                        try:
+                            encrypted_file, cpu = future.result()
+                            timer.add_cpu(cpu)
+                        except Exception as e:
+                            encrypted_file = None
+                            self.logger.error(f"Error encriptando {file.name}: {str(e)}")
+
+                        if not encrypted_file:
+                            self._release_file(file, claimed[file])
+                            results.append({
+                                'file': file.name,
+                                'success': False,
+                                'message': "Error durante la encriptación"
+                            })
+                            continue
+
+                        # 5. Mover cada archivo a medida que termina
+                        encrypted_path = self._store_encrypted_file(file, encrypted_file)
+                        total_bytes += file_size
+                        FILE_BYTES.inc(file_size, operation='encrypt')
+                        results.append({
+                            'file': file.name,
+                            'success': True,
+                            'encrypted_file': str(encrypted_path),
+                            'bytes': file_size
+                        })
+
+            elapsed = time.perf_counter() - start
+            encrypted_count = sum(1 for r in results if r['success'])
+            throughput = {
+                'files': encrypted_count,
+                'failed': len(results) - encrypted_count,
+                'bytes': total_bytes,
+                'elapsed_seconds': elapsed,
+                'files_per_second': encrypted_count / elapsed if elapsed > 0 else 0.0,
+                'mb_per_second': total_bytes / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+            }
+            self.logger.info(
+                f"Lote completado: {encrypted_count}/{len(results)} archivos, "
+                f"{throughput['mb_per_second']:.2f} MB/s"
+            )
+
+            return {
+                'success': encrypted_count == len(results),
+                'message': f"{encrypted_count} de {len(results)} archivos encriptados",
+                'results': results,
+                'similarity': result['max_similarity'],
+                'visualization': str(vis_path),
+                'throughput': throughput
+            }
+
+        except Exception as e:
+            self.logger.error(f"Error en process_batch_encryption: {str(e)}", exc_info=True)
+            return {
+                'success': False,
+                'message': f"Error inesperado: {str(e)}"
+            }
+
+    def _claim_file(self, file: Path) -> Optional[Path]:
+        """
+        Reserva un archivo de to_encrypt para una petición moviéndolo (de forma atómica) a
+        un directorio de trabajo propio, donde también se escribe su .enc temporal. Así dos
+        peticiones que eligen el mismo archivo no comparten rutas.
+        
+        Returns:
+            Ruta del archivo reservado, o None si otra petición ya lo reservó
+        """
+        work_dir = self.to_encrypt_dir / '.working' / uuid.uuid4().hex
+        work_dir.mkdir(parents=True)
+        claimed_file = work_dir / file.name
+        try:
+            os.rename(file, claimed_file)
+        except FileNotFoundError:
+            work_dir.rmdir()
+            return None
+        return claimed_file
+
+    def _release_file(self, claimed_file: Path, original_file: Path) -> None:
+        """Devuelve a to_encrypt un archivo reservado cuya encriptación falló"""
+        os.replace(claimed_file, original_file)
+        for leftover in claimed_file.parent.iterdir():
+            leftover.unlink()
+        claimed_file.parent.rmdir()
+
+    def _store_encrypted_file(self, original_file: Path, encrypted_file: str) -> Path:
+        """
+        Mueve el archivo encriptado al directorio de salida y el original a processed.
+        
+        Returns:
+            Ruta final del archivo encriptado
+        """
+        encrypted_path = self.output_dir / Path(encrypted_file).name
+        os.replace(encrypted_file, encrypted_path)
+
+        processed_dir = self.to_encrypt_dir / 'processed'
+        processed_dir.mkdir(exist_ok=True)
+        shutil.move(str(original_file), str(processed_dir / original_file.name))
+        # Eliminar el directorio de trabajo de la petición (ver _claim_file)
+        if original_file.parent.parent.name == '.working':
+            original_file.parent.rmdir()
+        return encrypted_path
+
     def get_available_files(self) -> list[str]:
         """
         Obtiene la lista de archivos disponibles para encriptar.
@@ -163,15 +448,34 @@ class EncryptionHandler:
         except Exception as e:
             self.logger.error(f"Error durante la limpieza de archivos: {str(e)}")
 
-def encrypt_file_bot_handler(file_name: Optional[str] = None) -> Dict[str, Union[bool, str, float]]:
+_handler = None
+_handler_lock = threading.Lock()
+
+def get_encryption_handler() -> EncryptionHandler:
+    """
+    Devuelve el EncryptionHandler compartido del proceso, creándolo la primera vez.
+    
+    En un pool de procesos cada worker crea y reutiliza su propia instancia.
+    """
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            _handler = EncryptionHandler()
+        return _handler
+
+def encrypt_file_bot_handler(file_name: Optional[str] = None,
+                             input_file: Optional[str] = None) -> Dict[str, Union[bool, str, float]]:
     """
     Función wrapper para ser llamada desde el bot de Telegram.
     
+    Al estar definida a nivel de módulo puede ejecutarse tanto en un pool de hilos
+    como en un pool de procesos.
+    
     Args:
         file_name: Nombre del archivo a encriptar (opcional)
+        input_file: Audio de voz del chat que hace la petición (opcional)
         
     Returns:
         Diccionario con el resultado del proceso
     """
-    handler = EncryptionHandler()
-    return handler.process_file_encryption(file_name)
\ No newline at end of file
+    return get_encryption_handler().process_file_encryption(file_name, input_file)
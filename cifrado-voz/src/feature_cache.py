@@ -0,0 +1,178 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from metrics import get_registry
+
+class FeatureCache:
+    """
+    Caché de características de voz indexada por el contenido del audio.
+
+    Las entradas se identifican con el hash SHA-256 del archivo de audio junto con los
+    parámetros de extracción, de modo que un mismo clip no se vuelve a procesar aunque
+    cambie de nombre, y un clip nuevo guardado con el mismo nombre no reutiliza datos
+    antiguos. Tiene un nivel en memoria (LRU) y un nivel opcional en disco (.npz).
+    """
+
+    def __init__(self, max_entries=128, cache_dir=None, max_disk_entries=1024):
+        if max_entries < 0 or max_disk_entries < 0:
+            raise ValueError("Los límites de la caché no pueden ser negativos")
+
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, audio_file, params=None):
+        """Genera la clave a partir del contenido del audio y los parámetros de extracción"""
+        digest = hashlib.sha256()
+        with open(audio_file, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return self.key_from_hash(digest.hexdigest(), params)
+
+    def key_from_hash(self, content_hash, params=None):
+        """Genera la clave a partir de un hash de contenido ya calculado"""
+        params_repr = json.dumps(params or {}, sort_keys=True, default=str)
+        return hashlib.sha256(f"{content_hash}:{params_repr}".encode()).hexdigest()
+
+    def get(self, key):
+        """Devuelve una copia de las características almacenadas o None si no existen"""
+        with self._lock:
+            features = self._entries.get(key)
+            if features is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._copy(features)
+
+        features = self._load_from_disk(key)
+        with self._lock:
+            if features is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, features)
+        return self._copy(features)
+
+    def put(self, key, features):
+        """Guarda las características en memoria y, si está habilitado, en disco"""
+        features = self._copy(features)
+        with self._lock:
+            self._store(key, features)
+        self._save_to_disk(key, features)
+
+    def clear(self):
+        """Vacía el nivel en memoria y reinicia los contadores"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+    @property
+    def stats(self):
+        """Contadores de aciertos y fallos de la caché"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            }
+
+    def _store(self, key, features):
+        """Inserta en el nivel en memoria aplicando la política LRU (requiere el lock)"""
+        if self.max_entries == 0:
+            return
+        self._entries[key] = features
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load_from_disk(self, key):
+        if self.cache_dir is None:
+            return None
+        path = self.cache_dir / f"{key}.npz"
+        try:
+            with np.load(path) as data:
+                # Los escalares se guardan como arrays 0-d; se restauran como escalares numpy
+                features = {name: data[name] if data[name].ndim else data[name][()] for name in data.files}
+            path.touch()
+            return features
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error reading cached features {path}: {e}")
+            return None
+
+    def _save_to_disk(self, key, features):
+        if self.cache_dir is None or self.max_disk_entries == 0:
+            return
+        try:
+            path = self.cache_dir / f"{key}.npz"
+            tmp_path = self.cache_dir / f"{key}.tmp.npz"
+            np.savez(tmp_path, **features)
+            tmp_path.replace(path)
+            self._evict_disk()
+        except Exception as e:
+            print(f"Error saving cached features: {e}")
+
+    def _evict_disk(self):
+        """Elimina los archivos menos usados recientemente si se supera el límite"""
+        files = [f for f in self.cache_dir.glob("*.npz") if not f.name.endswith(".tmp.npz")]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=lambda f: f.stat().st_mtime)
+        for file in files[:len(files) - self.max_disk_entries]:
+            try:
+                file.unlink()
+                with self._lock:
+                    self.evictions += 1
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _copy(features):
+        return {
+            name: value.copy() if isinstance(value, np.ndarray) else value
+            for name, value in features.items()
+        }
+
+# Caché compartida por todas las instancias de VoiceKeySystem del proceso, de modo que
+# el mismo clip verificado para encriptar y luego para desencriptar se procesa una sola vez
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache():
+    """Devuelve la caché de características compartida del proceso"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = FeatureCache()
+            _register_cache_metrics(_default_cache)
+        return _default_cache
+
+def _register_cache_metrics(cache):
+    """Expone los contadores de la caché compartida en el registro de métricas"""
+    registry = get_registry()
+    registry.gauge('feature_cache_lookups', "Consultas a la caché de características por resultado",
+                   labels=('result',),
+                   callback=lambda: {(result,): cache.stats[result] for result in ('hits', 'disk_hits', 'misses')})
+    registry.gauge('feature_cache_hit_ratio', "Proporción de consultas resueltas por la caché de características",
+                   callback=lambda: cache.stats['hit_rate'])
+    registry.gauge('feature_cache_entries', "Entradas en memoria de la caché de características",
+                   callback=lambda: cache.stats['entries'])
@@ -0,0 +1,84 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+class StageTimer:
+    """
+    Mide el tiempo de reloj y de CPU de cada etapa de una petición.
+
+    Las etapas pueden anidarse: el tiempo de una etapa interna se descuenta de la etapa
+    que la contiene, de modo que cada etapa refleja solo su propio trabajo y la suma de
+    todas coincide con el tiempo medido. Una etapa que se repite acumula sus tiempos.
+
+    El tiempo de CPU es el del hilo que mide (time.thread_time). El trabajo que una etapa
+    reparte entre otros hilos o procesos (p. ej. los workers del contenedor) no aparece en
+    él: quien lo lanza debe sumarlo con add_cpu.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._stack = []
+        self._lock = threading.Lock()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.thread_time()
+        # CPU de otros hilos o procesos añadida con add_cpu
+        self._extra_cpu = 0.0
+
+    @contextmanager
+    def stage(self, name):
+        """Mide el bloque como la etapa name"""
+        # [reloj, CPU] consumidos por etapas internas, para descontarlos de esta, y la CPU
+        # de otros hilos añadida a esta etapa
+        nested = [0.0, 0.0, 0.0]
+        self._stack.append(nested)
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield self
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.thread_time() - start_cpu
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][0] += wall
+                self._stack[-1][1] += cpu
+            self._record(name, wall - nested[0], cpu - nested[1] + nested[2])
+
+    def add_cpu(self, seconds):
+        """Suma a la etapa actual (y al total) CPU consumida en otros hilos o procesos"""
+        with self._lock:
+            self._extra_cpu += seconds
+        if self._stack:
+            self._stack[-1][2] += seconds
+
+    def _record(self, name, wall, cpu):
+        with self._lock:
+            entry = self.stages.setdefault(name, {'wall_ms': 0.0, 'cpu_ms': 0.0, 'calls': 0})
+            entry['wall_ms'] += wall * 1000
+            entry['cpu_ms'] += cpu * 1000
+            entry['calls'] += 1
+
+    def as_dict(self):
+        """
+        Returns:
+            Dict con el tiempo total (total_wall_ms, total_cpu_ms) y el desglose por
+            etapa en el orden en que terminaron
+        """
+        with self._lock:
+            stages = {name: {key: round(value, 3) if key != 'calls' else value for key, value in entry.items()}
+                      for name, entry in self.stages.items()}
+        return {
+            'total_wall_ms': round((time.perf_counter() - self._start_wall) * 1000, 3),
+            'total_cpu_ms': round((time.thread_time() - self._start_cpu + self._extra_cpu) * 1000, 3),
+            'stages': stages
+        }
+
+    def summary(self):
+        """Resumen de una línea para los logs"""
+        timings = self.as_dict()
+        stages = ', '.join(f"{name}={entry['wall_ms']:.1f}ms" for name, entry in timings['stages'].items())
+        return f"total={timings['total_wall_ms']:.1f}ms ({stages})"
+
+def timed(timer, name):
+    """Contexto que mide la etapa name si hay un timer, y que no hace nada si timer es None"""
+    return timer.stage(name) if timer is not None else nullcontext()
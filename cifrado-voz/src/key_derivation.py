@@ -0,0 +1,73 @@
+from functools import lru_cache
+
+import numpy as np
+
+# Tamaño de la clave derivada en bytes
+KEY_SIZE = 32
+
+def quantize_feature_vector(feature_vector):
+    """Normaliza el vector de características a [0, 1] y lo cuantiza a 8 bits"""
+    feature_vector = np.asarray(feature_vector)
+    normalized = (feature_vector - np.min(feature_vector)) / (np.max(feature_vector) - np.min(feature_vector))
+    return (normalized * 255).astype(np.uint8)
+
+def quantize_feature_matrix(feature_matrix):
+    """Versión por filas de quantize_feature_vector para un lote de vectores"""
+    feature_matrix = np.asarray(feature_matrix)
+    minimum = np.min(feature_matrix, axis=1, keepdims=True)
+    maximum = np.max(feature_matrix, axis=1, keepdims=True)
+    normalized = (feature_matrix - minimum) / (maximum - minimum)
+    return (normalized * 255).astype(np.uint8)
+
+def derive_key_reference(quantized):
+    """
+    Algoritmo original de derivación, elemento a elemento.
+
+    Se conserva como especificación de referencia para las pruebas y los benchmarks;
+    derive_key produce exactamente el mismo resultado. La aritmética se hace con enteros
+    de Python para obtener el mismo resultado que con NumPy 1.x, donde los productos de
+    uint8 se promovían automáticamente (NumPy 2 lanza OverflowError con `uint8 * 1000`).
+    """
+    key = np.zeros(KEY_SIZE, dtype=np.uint8)
+    for i in range(len(quantized)):
+        val = (int(quantized[i]) * 1000) % 256
+        key[i % KEY_SIZE] ^= val
+        key = np.roll(key, 1 if i % 2 == 0 else -1)
+        if i > 0:
+            # Añadir dependencia entre bytes consecutivos
+            key[i % KEY_SIZE] = key[i % KEY_SIZE] ^ key[(i-1) % KEY_SIZE]
+    return key
+
+@lru_cache(maxsize=32)
+def _mixing_matrix(length):
+    """
+    Matriz booleana (KEY_SIZE, length) que describe el algoritmo original.
+
+    Todas las operaciones del algoritmo (XOR con el valor, rotaciones y XOR entre bytes
+    vecinos) son lineales sobre XOR, por lo que cada byte de la clave final es el XOR de
+    un subconjunto fijo de los valores de entrada, que depende solo de la longitud.
+    La matriz se obtiene ejecutando el algoritmo sobre esos subconjuntos una única vez.
+    """
+    coefficients = np.zeros((KEY_SIZE, length), dtype=bool)
+    for i in range(length):
+        coefficients[i % KEY_SIZE, i] ^= True
+        coefficients = np.roll(coefficients, 1 if i % 2 == 0 else -1, axis=0)
+        if i > 0:
+            coefficients[i % KEY_SIZE] ^= coefficients[(i-1) % KEY_SIZE]
+    coefficients.flags.writeable = False
+    return coefficients
+
+def _input_values(quantized):
+    return ((np.asarray(quantized, dtype=np.int64) * 1000) % 256).astype(np.uint8)
+
+def derive_key(quantized):
+    """Deriva la clave de KEY_SIZE bytes a partir de un vector cuantizado"""
+    values = _input_values(quantized)
+    mixing = _mixing_matrix(len(values))
+    return np.bitwise_xor.reduce(np.where(mixing, values, 0).astype(np.uint8), axis=1)
+
+def derive_keys(quantized_batch):
+    """Deriva una clave por fila de una matriz (n_vectores, longitud) de valores cuantizados"""
+    values = _input_values(quantized_batch)
+    mixing = _mixing_matrix(values.shape[1])
+    return np.bitwise_xor.reduce(np.where(mixing[None, :, :], values[:, None, :], 0).astype(np.uint8), axis=2)
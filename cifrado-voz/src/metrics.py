@@ -0,0 +1,273 @@
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Límites (segundos) de los histogramas de latencia, desde operaciones en caché hasta
+# peticiones completas con visualización
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    """Base de las métricas: nombre, ayuda, etiquetas y un valor por combinación de etiquetas"""
+    type_name = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"La métrica {self.name} requiere las etiquetas {self.label_names}, recibió {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _samples(self):
+        """Lista de (sufijo, valores de etiquetas, etiqueta extra, valor)"""
+        with self._lock:
+            return [('', key, None, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, key, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.label_names, key, extra)} {_format_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    """Contador monótono (p. ej. verificaciones o bytes cifrados)"""
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Un contador solo puede incrementarse")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+class Gauge(_Metric):
+    """
+    Valor que sube y baja (p. ej. tareas en cola).
+
+    Con callback, el valor se lee al exportar: callback() devuelve un número si la
+    métrica no tiene etiquetas, o un dict {tupla de etiquetas: valor} si las tiene.
+    """
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), callback=None):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        if self.callback is not None:
+            values = self._callback_values()
+            return values.get(self._key(labels), 0)
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _callback_values(self):
+        values = self.callback()
+        if not self.label_names:
+            return {(): values}
+        return {tuple(str(v) for v in key): value for key, value in values.items()}
+
+    def _samples(self):
+        if self.callback is None:
+            return super()._samples()
+        try:
+            values = self._callback_values()
+        except Exception:
+            # Una fuente que falla no debe impedir exportar el resto de métricas
+            return []
+        return [('', key, None, value) for key, value in sorted(values.items())]
+
+class Histogram(_Metric):
+    """Histograma acumulativo de latencias (en segundos)"""
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state['count'] if state else 0
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state['counts']):
+                    cumulative += count
+                    samples.append(('_bucket', key, ('le', _format_value(bound)), cumulative))
+                samples.append(('_bucket', key, ('le', '+Inf'), state['count']))
+                samples.append(('_sum', key, None, state['sum']))
+                samples.append(('_count', key, None, state['count']))
+        return samples
+
+class MetricsRegistry:
+    """
+    Registro de métricas del proceso, exportable en el formato de texto de Prometheus.
+
+    Las métricas se registran una vez por nombre; volver a pedir una métrica existente
+    devuelve la misma instancia, de modo que cada módulo puede declarar las suyas sin
+    coordinarse con los demás.
+    """
+
+    def __init__(self, prefix='cifrado_voz_'):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name, documentation, **kwargs):
+        name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, documentation, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"La métrica {name} ya existe con otro tipo")
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter, name, documentation, labels=labels)
+
+    def gauge(self, name, documentation, labels=(), callback=None):
+        gauge = self._register(Gauge, name, documentation, labels=labels)
+        if callback is not None:
+            gauge.callback = callback
+        return gauge
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labels=labels, buckets=buckets)
+
+    def get(self, name):
+        with self._lock:
+            return self._metrics.get(self.prefix + name)
+
+    def render(self):
+        """Todas las métricas en el formato de texto de Prometheus (versión 0.0.4)"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def write_to_file(self, path):
+        """Escribe las métricas de forma atómica (compatible con el textfile collector de node_exporter)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text(self.render())
+        os.replace(tmp_path, path)
+        return path
+
+    def start_http_server(self, port, host='127.0.0.1'):
+        """
+        Sirve las métricas en http://host:port/metrics desde un hilo en segundo plano.
+
+        Por defecto solo escucha en la interfaz local.
+
+        Returns:
+            El servidor, para poder detenerlo con shutdown()
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Las consultas periódicas del scraper no se registran en el log
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
+
+    def start_file_exporter(self, path, interval=15.0):
+        """
+        Escribe las métricas en path cada interval segundos desde un hilo en segundo plano.
+
+        Returns:
+            Evento que detiene el exportador al activarse (se escribe una última vez)
+        """
+        stop = threading.Event()
+
+        def export():
+            while not stop.wait(interval):
+                self._safe_write(path)
+            self._safe_write(path)
+
+        threading.Thread(target=export, name='metrics-file', daemon=True).start()
+        return stop
+
+    def _safe_write(self, path):
+        try:
+            self.write_to_file(path)
+        except Exception as e:
+            print(f"Error escribiendo métricas en {path}: {str(e)}")
+
+_registry = MetricsRegistry()
+
+def get_registry():
+    """Registro de métricas compartido por todo el proceso"""
+    return _registry
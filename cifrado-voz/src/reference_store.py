@@ -0,0 +1,197 @@
+import json
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# Características que componen una referencia de voz, en el orden de las columnas
+FEATURE_LAYOUT = (
+    ('mfcc_features', 13),
+    ('mel_features', 128),
+    ('fft_features', 24),
+    ('spectral_centroid', 1),
+    ('zero_crossing_rate', 1)
+)
+SCALAR_FEATURES = ('spectral_centroid', 'zero_crossing_rate')
+
+STORE_FILENAME = "references.npy"
+MANIFEST_FILENAME = "references_manifest.json"
+STORE_VERSION = 1
+
+class ReferenceSet:
+    """
+    Referencias de voz apiladas en una única matriz contigua de float64.
+
+    Cada fila es una referencia y cada característica ocupa un rango de columnas
+    descrito en el manifiesto, por lo que la matriz puede guardarse como un .npy
+    y cargarse (o mapearse en memoria) sin reconstruir arrays clave por clave.
+    """
+
+    def __init__(self, matrix, names=None, columns=None, metadata=None):
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        if self.matrix.ndim != 2:
+            raise ValueError("La matriz de referencias debe ser bidimensional")
+        self.columns = columns if columns is not None else self.default_columns()
+        self.names = list(names) if names is not None else [f"reference_{i}" for i in range(1, len(self.matrix) + 1)]
+        if len(self.names) != len(self.matrix):
+            raise ValueError("El número de nombres no coincide con el número de referencias")
+        # Datos adicionales que se guardan en el manifiesto (p. ej. el origen de cada referencia)
+        self.metadata = metadata if metadata is not None else {}
+        # Resultados derivados de la matriz (p. ej. filas estandarizadas para el scoring)
+        self._derived = {}
+
+    @staticmethod
+    def default_columns():
+        """Rangos de columnas [inicio, fin) de cada característica"""
+        columns = {}
+        start = 0
+        for name, width in FEATURE_LAYOUT:
+            columns[name] = (start, start + width)
+            start += width
+        return columns
+
+    @classmethod
+    def from_features(cls, features_list, names=None):
+        """Construye el conjunto a partir de una lista de diccionarios de características"""
+        columns = cls.default_columns()
+        width = max(end for _, end in columns.values())
+        matrix = np.empty((len(features_list), width), dtype=np.float64)
+        for row, features in enumerate(features_list):
+            for name, (start, end) in columns.items():
+                values = np.ravel(np.asarray(features[name], dtype=np.float64))
+                if len(values) != end - start:
+                    raise ValueError(f"La característica '{name}' tiene {len(values)} valores, se esperaban {end - start}")
+                matrix[row, start:end] = values
+        return cls(matrix, names, columns)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def feature_matrix(self, name):
+        """Vista (n_referencias, n_valores) de una característica; 1-D para las escalares"""
+        start, end = self.columns[name]
+        if name in SCALAR_FEATURES:
+            return self.matrix[:, start]
+        return self.matrix[:, start:end]
+
+    def derived(self, key, compute):
+        """Calcula una sola vez un resultado derivado de la matriz y lo reutiliza"""
+        if key not in self._derived:
+            self._derived[key] = compute()
+        return self._derived[key]
+
+    def features(self, index):
+        """Diccionario de características de una referencia (vistas sobre la matriz)"""
+        row = self.matrix[index]
+        return {
+            name: row[start] if name in SCALAR_FEATURES else row[start:end]
+            for name, (start, end) in self.columns.items()
+        }
+
+    def to_feature_list(self):
+        """Lista de diccionarios compatible con el formato JSON anterior"""
+        return [self.features(i) for i in range(len(self))]
+
+    def save(self, directory):
+        """Guarda la matriz como .npy y el manifiesto como JSON"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        # Escribir primero en archivos temporales para no dejar un almacén a medias
+        tmp_store = directory / (STORE_FILENAME + ".tmp")
+        with open(tmp_store, 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.matrix))
+
+        manifest = {
+            'version': STORE_VERSION,
+            'count': len(self),
+            'columns': {name: list(bounds) for name, bounds in self.columns.items()},
+            'names': self.names,
+            'metadata': self.metadata,
+            'created': datetime.now().isoformat()
+        }
+        tmp_manifest = directory / (MANIFEST_FILENAME + ".tmp")
+        with open(tmp_manifest, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        tmp_store.replace(directory / STORE_FILENAME)
+        tmp_manifest.replace(directory / MANIFEST_FILENAME)
+
+    @classmethod
+    def load(cls, directory, mmap_mode=None):
+        """
+        Carga el almacén binario de un directorio.
+
+        Returns:
+            ReferenceSet o None si el directorio no tiene un almacén válido
+        """
+        directory = Path(directory)
+        store_path = directory / STORE_FILENAME
+        manifest_path = directory / MANIFEST_FILENAME
+        if not store_path.exists() or not manifest_path.exists():
+            return None
+
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+            if manifest.get('version') != STORE_VERSION:
+                print(f"Unsupported reference store version in {directory}: {manifest.get('version')}")
+                return None
+
+            matrix = np.load(store_path, mmap_mode=mmap_mode)
+            if matrix.ndim != 2 or len(matrix) != manifest['count']:
+                print(f"Reference store in {directory} does not match its manifest")
+                return None
+
+            columns = {name: tuple(bounds) for name, bounds in manifest['columns'].items()}
+            return cls(matrix, manifest['names'], columns, manifest.get('metadata'))
+        except Exception as e:
+            print(f"Error loading reference store {store_path}: {e}")
+            return None
+
+def load_json_references(directory):
+    """
+    Carga las referencias del formato anterior (un reference_N.json por referencia).
+
+    Returns:
+        Tupla (lista de diccionarios de características, lista de nombres)
+    """
+    references = []
+    names = []
+    directory = Path(directory)
+    if directory.exists():
+        for filename in sorted(directory.glob("*.json")):
+            if filename.name == MANIFEST_FILENAME:
+                continue
+            try:
+                with open(filename, 'r') as f:
+                    ref_data = json.load(f)
+                    # Convertir las listas JSON de vuelta a arrays numpy
+                    for key in ref_data:
+                        if isinstance(ref_data[key], list):
+                            ref_data[key] = np.array(ref_data[key])
+                    references.append(ref_data)
+                    names.append(filename.stem)
+            except Exception as e:
+                print(f"Error loading reference {filename}: {e}")
+    return references, names
+
+def load_reference_set(directory, mmap_mode=None):
+    """
+    Carga las referencias de un directorio, del almacén binario o de los JSON anteriores.
+
+    Returns:
+        ReferenceSet o None si el directorio no tiene referencias
+    """
+    reference_set = ReferenceSet.load(directory, mmap_mode=mmap_mode)
+    if reference_set is not None:
+        return reference_set
+
+    references, names = load_json_references(directory)
+    if not references:
+        return None
+    try:
+        return ReferenceSet.from_features(references, names)
+    except Exception as e:
+        print(f"Error loading references from {directory}: {e}")
+        return None
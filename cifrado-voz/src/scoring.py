@@ -0,0 +1,92 @@
+import numpy as np
+
+# Ponderación de cada similitud parcial en la similitud total
+SIMILARITY_WEIGHTS = {
+    'mfcc': 0.4,
+    'mel': 0.3,
+    'fft': 0.2,
+    'spectral': 0.05,
+    'zcr': 0.05
+}
+
+def row_correlation(matrix, vector):
+    """
+    Coeficiente de correlación de Pearson entre cada fila de matrix y vector.
+
+    Equivale a np.corrcoef(row, vector)[0, 1] para cada fila, calculado en una sola pasada.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    vector = np.asarray(vector, dtype=np.float64)
+    if matrix.ndim != 2 or matrix.shape[1] != vector.shape[0]:
+        raise ValueError(f"Dimensiones incompatibles: {matrix.shape} y {vector.shape}")
+
+    centered_rows = matrix - matrix.mean(axis=1, keepdims=True)
+    centered_vector = vector - vector.mean()
+    numerator = centered_rows @ centered_vector
+    denominator = np.sqrt(np.einsum('ij,ij->i', centered_rows, centered_rows) * (centered_vector @ centered_vector))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Igual que np.corrcoef, recortar al intervalo [-1, 1] los errores de redondeo
+        return np.clip(numerator / denominator, -1, 1)
+
+def standardize_rows(matrix):
+    """Centra cada fila y la divide por su norma, para correlar con un solo producto matricial"""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    centered_rows = matrix - matrix.mean(axis=1, keepdims=True)
+    norms = np.sqrt(np.einsum('ij,ij->i', centered_rows, centered_rows))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Las filas constantes quedan como NaN, igual que en np.corrcoef
+        return centered_rows / norms[:, None]
+
+def standardized_correlation(standardized_rows, vector):
+    """Correlación de Pearson entre filas ya estandarizadas (standardize_rows) y vector"""
+    vector = np.asarray(vector, dtype=np.float64)
+    centered_vector = vector - vector.mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = (standardized_rows @ centered_vector) / np.sqrt(centered_vector @ centered_vector)
+        return np.clip(correlation, -1, 1)
+
+def is_match(max_similarity, avg_similarity, similarity_threshold):
+    """Criterio estricto de verificación: similitud máxima y media por encima del umbral"""
+    return bool(max_similarity > similarity_threshold and
+                avg_similarity > similarity_threshold * 0.9)
+
+def score_references(reference_set, probe):
+    """
+    Similitud ponderada entre unas características de prueba y todas las referencias.
+
+    Args:
+        reference_set: ReferenceSet con las referencias apiladas
+        probe: Dict de características de la voz a verificar
+
+    Returns:
+        Array con una similitud por referencia, con el mismo resultado que
+        VoiceKeySystem.compare_features(referencia, probe)
+    """
+    def correlation(name):
+        # Las filas estandarizadas de las referencias se calculan una sola vez por conjunto
+        rows = reference_set.derived(('standardized', name),
+                                     lambda: standardize_rows(reference_set.feature_matrix(name)))
+        if rows.shape[1] != np.shape(probe[name])[0]:
+            raise ValueError(f"Dimensiones incompatibles para '{name}': {rows.shape} y {np.shape(probe[name])}")
+        return standardized_correlation(rows, probe[name])
+
+    mfcc_sim = correlation('mfcc_features')
+    mel_sim = correlation('mel_features')
+    fft_sim = correlation('fft_features')
+
+    # Las similitudes escalares se normalizan respecto al valor de cada referencia
+    ref_centroid = reference_set.feature_matrix('spectral_centroid')
+    ref_zcr = reference_set.feature_matrix('zero_crossing_rate')
+    spectral_sim = 1 - np.abs(ref_centroid - probe['spectral_centroid']) / (ref_centroid + 1e-10)
+    zcr_sim = 1 - np.abs(ref_zcr - probe['zero_crossing_rate']) / (ref_zcr + 1e-10)
+
+    total_similarity = (
+        SIMILARITY_WEIGHTS['mfcc'] * mfcc_sim +
+        SIMILARITY_WEIGHTS['mel'] * mel_sim +
+        SIMILARITY_WEIGHTS['fft'] * fft_sim +
+        SIMILARITY_WEIGHTS['spectral'] * spectral_sim +
+        SIMILARITY_WEIGHTS['zcr'] * zcr_sim
+    )
+
+    # Las similitudes negativas o indefinidas (NaN) cuentan como 0
+    return np.where(total_similarity > 0, total_similarity, 0.0)
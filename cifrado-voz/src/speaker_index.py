@@ -0,0 +1,128 @@
+from pathlib import Path
+
+import numpy as np
+
+from reference_store import ReferenceSet, load_reference_set
+from scoring import is_match, score_references
+
+class SpeakerIndex:
+    """
+    Índice con las referencias de todos los usuarios autorizados.
+
+    Las referencias se concatenan en una única matriz contigua ordenada por usuario,
+    de modo que una identificación 1:N se resuelve con un solo scoring vectorizado y
+    una reducción por segmentos, sin recorrer los usuarios en Python.
+    """
+
+    def __init__(self, reference_sets):
+        """
+        Args:
+            reference_sets: Dict {user_id: ReferenceSet}
+        """
+        self.user_ids = sorted(user_id for user_id, refs in reference_sets.items() if refs is not None and len(refs))
+
+        columns = ReferenceSet.default_columns()
+        width = max(end for _, end in columns.values())
+        matrices = []
+        names = []
+        counts = []
+        for user_id in self.user_ids:
+            reference_set = reference_sets[user_id]
+            if reference_set.columns != columns:
+                raise ValueError(f"Las referencias de '{user_id}' tienen un formato de columnas distinto")
+            matrices.append(reference_set.matrix)
+            names.extend(f"{user_id}/{name}" for name in reference_set.names)
+            counts.append(len(reference_set))
+
+        matrix = np.concatenate(matrices) if matrices else np.empty((0, width))
+        self.references = ReferenceSet(matrix, names, columns)
+        self.counts = np.array(counts, dtype=np.int64)
+        # Fila inicial de cada usuario dentro de la matriz
+        self.offsets = np.concatenate(([0], np.cumsum(self.counts)[:-1])).astype(np.int64)
+        self._positions = {user_id: i for i, user_id in enumerate(self.user_ids)}
+        self._user_sets = {}
+
+    @classmethod
+    def load(cls, users_dir, mmap_mode=None):
+        """Construye el índice a partir de cada subdirectorio de users_dir"""
+        users_dir = Path(users_dir)
+        reference_sets = {}
+        if users_dir.exists():
+            for user_dir in sorted(d for d in users_dir.iterdir() if d.is_dir()):
+                reference_set = load_reference_set(user_dir, mmap_mode=mmap_mode)
+                if reference_set is not None:
+                    reference_sets[user_dir.name] = reference_set
+        return cls(reference_sets)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __contains__(self, user_id):
+        return user_id in self._positions
+
+    def user_scores(self, probe):
+        """
+        Similitud máxima y media de la muestra con cada usuario.
+
+        Returns:
+            Tupla (scores por referencia, máximo por usuario, media por usuario)
+        """
+        if not len(self.user_ids):
+            raise ValueError("No hay usuarios con referencias en el índice")
+        scores = score_references(self.references, probe)
+        max_scores = np.maximum.reduceat(scores, self.offsets)
+        avg_scores = np.add.reduceat(scores, self.offsets) / self.counts
+        return scores, max_scores, avg_scores
+
+    def identify(self, probe, top_k=5, similarity_threshold=0.85):
+        """
+        Identificación 1:N de la muestra entre todos los usuarios.
+
+        Returns:
+            Lista de hasta top_k candidatos ordenados por similitud máxima, cada uno con
+            user_id, max_similarity, avg_similarity y matches
+        """
+        _, max_scores, avg_scores = self.user_scores(probe)
+        top_k = min(top_k, len(self.user_ids))
+        if top_k <= 0:
+            return []
+
+        # argpartition selecciona los k mejores en tiempo lineal; solo se ordenan esos k
+        candidates = np.argpartition(-max_scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-max_scores[candidates], kind='stable')]
+        return [
+            {
+                'user_id': self.user_ids[i],
+                'max_similarity': float(max_scores[i]),
+                'avg_similarity': float(avg_scores[i]),
+                'matches': is_match(max_scores[i], avg_scores[i], similarity_threshold)
+            }
+            for i in candidates
+        ]
+
+    def verify(self, probe, user_id, similarity_threshold=0.85):
+        """
+        Verificación 1:1 de la muestra contra las referencias de un usuario.
+
+        Returns:
+            Dict con matches, max_similarity, avg_similarity y similarities
+        """
+        if user_id not in self._positions:
+            raise ValueError(f"El usuario '{user_id}' no tiene referencias")
+        if user_id not in self._user_sets:
+            # Vista sobre las filas del usuario dentro de la matriz del índice
+            position = self._positions[user_id]
+            start = self.offsets[position]
+            end = start + self.counts[position]
+            self._user_sets[user_id] = ReferenceSet(self.references.matrix[start:end],
+                                                    self.references.names[start:end], self.references.columns)
+        scores = score_references(self._user_sets[user_id], probe)
+        max_similarity = float(np.max(scores))
+        avg_similarity = float(np.mean(scores))
+        return {
+            'user_id': user_id,
+            'matches': is_match(max_similarity, avg_similarity, similarity_threshold),
+            'max_similarity': max_similarity,
+            'avg_similarity': avg_similarity,
+            'similarities': scores.tolist()
+        }
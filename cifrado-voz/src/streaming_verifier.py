@@ -0,0 +1,304 @@
+import os
+
+import numpy as np
+
+from scoring import is_match, score_references
+
+class StreamingVerifier:
+    """
+    Verificación de voz incremental: consume el audio por fragmentos, mantiene
+    estadísticas acumuladas de las características y vuelve a puntuar a medida que
+    llegan datos, deteniéndose en cuanto la decisión es suficientemente segura.
+
+    Las ventanas de la STFT se calculan con un buffer de arrastre que reproduce el
+    centrado de librosa (relleno de n_fft // 2 muestras), por lo que MFCC, mel, centroide
+    y tasa de cruces por cero coinciden con los de VoiceKeySystem.extract_voice_features
+    sobre la misma señal:
+
+    - La normalización de amplitud depende del pico de toda la señal; como mel, centroide
+      y cruces por cero no dependen de la escala (o escalan con ella), se corrigen con el
+      pico acumulado al puntuar. En los MFCC la escala solo desplaza el coeficiente c0,
+      que se corrige con el mismo pico.
+    - El recorte top_db de power_to_db depende del máximo global, por lo que se guardan
+      los espectros mel en dB de cada ventana (128 valores por ventana) y el recorte se
+      aplica al puntuar.
+    - El perfil FFT en bandas usa la FFT de la señal completa, que no puede calcularse
+      por partes; se aproxima con la media de las magnitudes de la STFT en las mismas
+      bandas de frecuencia. La similitud FFT es una correlación, por lo que solo importa
+      la forma del perfil.
+
+    Las decisiones anticipadas no generan ni verifican claves; si se necesita la clave,
+    hay que extraer las características completas del audio.
+    """
+
+    ACCEPT = 'accept'
+    REJECT = 'reject'
+
+    def __init__(self, reference_set, sample_rate=22050, n_mfcc=13, n_bands=24,
+                 similarity_threshold=0.85, min_duration=1.5, rescore_interval=0.5,
+                 margin=0.03, patience=2, n_fft=2048, hop_length=512):
+        """
+        Args:
+            reference_set: ReferenceSet con las referencias del usuario
+            sample_rate: Frecuencia de muestreo de los fragmentos que se entregan a feed
+            similarity_threshold: Umbral de similitud de verify_voice
+            min_duration: Segundos de audio mínimos antes de decidir
+            rescore_interval: Segundos de audio entre dos puntuaciones
+            margin: Distancia al umbral que se exige para decidir antes del final
+            patience: Puntuaciones consecutivas con la misma decisión para detenerse
+        """
+        import librosa
+
+        if reference_set is None or not len(reference_set):
+            raise ValueError("No hay referencias almacenadas")
+
+        self.reference_set = reference_set
+        self.sample_rate = sample_rate
+        self.n_mfcc = n_mfcc
+        self.n_bands = n_bands
+        self.similarity_threshold = similarity_threshold
+        self.min_duration = min_duration
+        self.rescore_interval = rescore_interval
+        self.margin = margin
+        self.patience = patience
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+
+        self._window = librosa.filters.get_window('hann', n_fft, fftbins=True).astype(np.float32)
+        self._mel_basis = librosa.filters.mel(sr=sample_rate, n_fft=n_fft)
+        self._frequencies = librosa.fft_frequencies(sr=sample_rate, n_fft=n_fft)
+
+        # Buffer de arrastre: muestras recibidas desde la primera que aún necesita una ventana
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = 0
+        self._received = 0
+        self._first_sample = None
+        self._peak = 0.0
+        self._next_frame = 0
+        self._finished = False
+
+        # Estadísticas acumuladas por ventana
+        self._frames = 0
+        self._mel_sum = np.zeros(self._mel_basis.shape[0])
+        self._mel_db = []
+        self._centroid_sum = 0.0
+        self._zcr_sum = 0.0
+        self._magnitude_sum = np.zeros(n_fft // 2 + 1)
+
+        self._frames_at_last_score = 0
+        self._streak = (None, 0)
+        self.decision = None
+        # True si la decisión se tomó antes de consumir todo el audio
+        self.early_stop = False
+        self.scores = None
+        self.rescores = 0
+
+    @property
+    def processed_seconds(self):
+        return self._received / self.sample_rate
+
+    @property
+    def decided(self):
+        return self.decision is not None
+
+    def feed(self, chunk):
+        """
+        Añade un fragmento de audio mono a sample_rate y vuelve a puntuar si corresponde.
+
+        Returns:
+            'accept', 'reject' o None si todavía no hay una decisión segura
+        """
+        if self._finished:
+            raise ValueError("La verificación ya terminó")
+        chunk = np.asarray(chunk, dtype=np.float32).ravel()
+        if not len(chunk):
+            return self.decision
+        if self._first_sample is None:
+            self._first_sample = chunk[0]
+        self._peak = max(self._peak, float(np.max(np.abs(chunk))))
+        self._buffer = np.concatenate((self._buffer, chunk))
+        self._received += len(chunk)
+
+        # Ventanas completas: terminan antes de la última muestra recibida
+        half = self.n_fft // 2
+        ready = (self._received - half) // self.hop_length + 1 if self._received >= half else 0
+        self._process_frames(ready)
+
+        if (self.decision is None and self.processed_seconds >= self.min_duration and
+                self._frames - self._frames_at_last_score >= self.rescore_interval * self.sample_rate / self.hop_length):
+            self._rescore()
+        return self.decision
+
+    def finish(self):
+        """
+        Procesa las últimas ventanas (con el relleno final) y devuelve el resultado.
+
+        Returns:
+            Dict con matches, decision, early_stop, max_similarity, avg_similarity,
+            similarities, processed_seconds y rescores
+        """
+        if not self._finished:
+            self._finished = True
+            if self.decision is None:
+                if self._received:
+                    # Como en librosa, hay 1 + len(y) // hop_length ventanas en total
+                    self._process_frames(self._received // self.hop_length + 1)
+                self._rescore(final=True)
+        return self.result()
+
+    def result(self):
+        if self.scores is None:
+            raise ValueError("Todavía no hay suficiente audio para puntuar")
+        max_similarity = float(np.max(self.scores))
+        avg_similarity = float(np.mean(self.scores))
+        return {
+            'matches': self.decision == self.ACCEPT,
+            'decision': self.decision,
+            'early_stop': self.early_stop,
+            'max_similarity': max_similarity,
+            'avg_similarity': avg_similarity,
+            'similarities': self.scores.tolist(),
+            'processed_seconds': self.processed_seconds,
+            'rescores': self.rescores
+        }
+
+    def features(self):
+        """Estimación actual de las características (mismo formato que extract_voice_features)"""
+        if not self._frames:
+            raise ValueError("Todavía no hay ventanas de audio procesadas")
+        from scipy.fft import dct
+
+        # Ganancia de librosa.util.normalize (pico de la señal a 1)
+        gain = 1.0 / self._peak if self._peak > 0 else 1.0
+
+        mel_db = np.concatenate(self._mel_db, axis=1) + 20 * np.log10(gain)
+        # Recorte top_db=80 de power_to_db respecto al máximo de toda la señal
+        mel_db = np.maximum(mel_db, mel_db.max() - 80.0)
+        mfcc = dct(mel_db.mean(axis=1), type=2, norm='ortho')[:self.n_mfcc]
+
+        mean_magnitude = (self._magnitude_sum / self._frames)[:self.n_fft // 2]
+        fft_profile = np.array([np.mean(band) for band in np.array_split(mean_magnitude, self.n_bands)])
+
+        return {
+            'mfcc_features': mfcc,
+            'mel_features': self._mel_sum / self._frames * gain ** 2,
+            'spectral_centroid': self._centroid_sum / self._frames,
+            'zero_crossing_rate': self._zcr_sum / self._frames,
+            'fft_features': fft_profile * gain
+        }
+
+    def verify_file(self, audio_file, chunk_seconds=0.5):
+        """
+        Lee el archivo por bloques, lo remuestrea en flujo a sample_rate y se detiene en
+        cuanto hay una decisión.
+
+        Returns:
+            Dict de finish() con además total_seconds (duración del archivo)
+        """
+        import soundfile as sf
+
+        with sf.SoundFile(os.fspath(audio_file)) as f:
+            total_seconds = f.frames / f.samplerate
+            resampler = None
+            if f.samplerate != self.sample_rate:
+                import soxr
+                resampler = soxr.ResampleStream(f.samplerate, self.sample_rate, 1, dtype='float32', quality='HQ')
+            block_size = max(1, int(chunk_seconds * f.samplerate))
+            for block in f.blocks(blocksize=block_size, dtype='float32', always_2d=True):
+                # Mezcla a mono igual que librosa.to_mono
+                chunk = block.mean(axis=1)
+                if resampler is not None:
+                    chunk = resampler.resample_chunk(chunk)
+                if self.feed(chunk) is not None:
+                    break
+            else:
+                if resampler is not None:
+                    self.feed(resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True))
+
+        result = self.finish()
+        result['total_seconds'] = total_seconds
+        return result
+
+    def _segment(self, start, end, edge):
+        """
+        Muestras [start, end) de la señal centrada: fuera de la señal se rellena con
+        ceros (STFT) o repitiendo la primera/última muestra (cruces por cero, edge=True)
+        """
+        left = max(0, -start)
+        right = max(0, end - self._received)
+        begin = max(start, 0) - self._buffer_start
+        stop = min(end, self._received) - self._buffer_start
+        samples = self._buffer[begin:stop]
+        if not (left or right):
+            return samples
+        if edge:
+            return np.concatenate((np.full(left, self._first_sample, dtype=np.float32), samples,
+                                   np.full(right, self._buffer[-1], dtype=np.float32)))
+        return np.concatenate((np.zeros(left, dtype=np.float32), samples, np.zeros(right, dtype=np.float32)))
+
+    def _process_frames(self, until):
+        """Calcula las ventanas self._next_frame .. until - 1 y acumula sus estadísticas"""
+        if until <= self._next_frame:
+            return
+        half = self.n_fft // 2
+        start = self._next_frame * self.hop_length - half
+        end = (until - 1) * self.hop_length + half
+
+        frames = np.lib.stride_tricks.sliding_window_view(
+            self._segment(start, end, edge=False), self.n_fft)[::self.hop_length]
+        magnitude = np.abs(np.fft.rfft(frames * self._window, axis=1)).T
+        power = magnitude ** 2
+
+        mel = self._mel_basis @ power
+        self._mel_sum += mel.sum(axis=1)
+        # power_to_db con ref=1 y amin=1e-10, sin el recorte top_db (se aplica al puntuar)
+        self._mel_db.append((10.0 * np.log10(np.maximum(1e-10, mel))).astype(np.float32))
+
+        # Centroide espectral como librosa: las ventanas en silencio no se normalizan
+        norms = magnitude.sum(axis=0)
+        norms = np.where(norms < np.finfo(magnitude.dtype).tiny, 1.0, norms)
+        self._centroid_sum += float(np.sum(self._frequencies @ magnitude / norms))
+
+        # Tasa de cruces por cero con el relleno por repetición de librosa
+        zcr_frames = np.lib.stride_tricks.sliding_window_view(
+            self._segment(start, end, edge=True), self.n_fft)[::self.hop_length]
+        signs = np.signbit(np.where(np.abs(zcr_frames) <= 1e-10, 0.0, zcr_frames))
+        self._zcr_sum += float(np.sum(signs[:, 1:] != signs[:, :-1]) / self.n_fft)
+
+        self._magnitude_sum += magnitude.sum(axis=1)
+        self._frames += until - self._next_frame
+        self._next_frame = until
+
+        # Descartar las muestras que ya no necesita ninguna ventana
+        keep_from = max(0, self._next_frame * self.hop_length - half)
+        if keep_from > self._buffer_start:
+            self._buffer = self._buffer[keep_from - self._buffer_start:]
+            self._buffer_start = keep_from
+
+    def _rescore(self, final=False):
+        if not self._frames:
+            return
+        self.scores = score_references(self.reference_set, self.features())
+        self.rescores += 1
+        self._frames_at_last_score = self._frames
+        max_similarity = float(np.max(self.scores))
+        avg_similarity = float(np.mean(self.scores))
+
+        if final:
+            # Al final del audio se aplica el criterio de verify_voice sin margen
+            matched = is_match(max_similarity, avg_similarity, self.similarity_threshold)
+            self.decision = self.ACCEPT if matched else self.REJECT
+            return
+
+        if is_match(max_similarity - self.margin, avg_similarity - self.margin, self.similarity_threshold):
+            candidate = self.ACCEPT
+        elif max_similarity < self.similarity_threshold - self.margin:
+            candidate = self.REJECT
+        else:
+            candidate = None
+
+        streak = self._streak[1] + 1 if candidate is not None and candidate == self._streak[0] else 1
+        self._streak = (candidate, streak)
+        if candidate is not None and streak >= self.patience:
+            self.decision = candidate
+            self.early_stop = True
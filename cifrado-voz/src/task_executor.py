@@ -0,0 +1,46 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+class TaskExecutor:
+    """
+    Ejecuta trabajo bloqueante (decodificación de audio, extracción de características,
+    gráficos y AES) fuera del bucle de eventos de asyncio.
+
+    Con mode='thread' las tareas se ejecutan en un pool de hilos del mismo proceso; con
+    mode='process' se ejecutan en procesos aparte, por lo que las funciones y sus
+    argumentos deben poder serializarse (funciones definidas a nivel de módulo).
+    """
+
+    MODES = ('thread', 'process')
+
+    def __init__(self, mode='thread', max_workers=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Modo de ejecución no válido: {mode} (opciones: {', '.join(self.MODES)})")
+        self.mode = mode
+        self.max_workers = max_workers
+        executor_class = ProcessPoolExecutor if mode == 'process' else ThreadPoolExecutor
+        self._executor = executor_class(max_workers=max_workers)
+        # Tareas enviadas que todavía no han terminado
+        self.pending = 0
+
+    @classmethod
+    def from_env(cls):
+        """Crea el executor a partir de BOT_EXECUTOR (thread/process) y BOT_MAX_WORKERS"""
+        mode = os.environ.get('BOT_EXECUTOR', 'thread').strip().lower()
+        max_workers = os.environ.get('BOT_MAX_WORKERS')
+        return cls(mode, int(max_workers) if max_workers else None)
+
+    async def run(self, func, *args, **kwargs):
+        """Ejecuta func(*args, **kwargs) en el pool y espera su resultado sin bloquear el bucle"""
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        finally:
+            self.pending -= 1
+
+    def shutdown(self, wait=True):
+        """Libera los hilos o procesos del pool"""
+        self._executor.shutdown(wait=wait)
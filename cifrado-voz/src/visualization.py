@@ -1,12 +1,65 @@
-import matplotlib.pyplot as plt
 import numpy as np
-from scipy.fft import fft
-import librosa
 from pathlib import Path
+import hashlib
 import os
+import shutil
+import threading
+
+from audio_ingest import as_audio_buffer
+from metrics import get_registry
+
+RENDER_CACHE_LOOKUPS = get_registry().counter('render_cache_lookups_total',
+                                               "Consultas a la caché de visualizaciones por resultado",
+                                               labels=('result',))
+
+# pyplot mantiene estado global, por lo que las figuras se generan de una en una
+_render_lock = threading.Lock()
+
+def _pyplot():
+    """Importa matplotlib al usarse para no retrasar el arranque del bot"""
+    import matplotlib
+    # Backend sin interfaz gráfica: las figuras solo se guardan en archivos y pueden
+    # generarse desde hilos distintos al principal (p. ej. el pool del bot)
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def pool_max(values, factor):
+    """Reduce el último eje agrupando de factor en factor y tomando el máximo de cada grupo"""
+    n_groups = int(np.ceil(values.shape[-1] / factor))
+    padding = n_groups * factor - values.shape[-1]
+    if padding:
+        pad_width = [(0, 0)] * (values.ndim - 1) + [(0, padding)]
+        values = np.pad(values, pad_width, mode='edge')
+    return values.reshape(values.shape[:-1] + (n_groups, factor)).max(axis=-1)
+
+def minmax_envelope(y, sr, n_buckets):
+    """
+    Envolvente mín/máx de la señal en n_buckets intervalos.
+
+    Returns:
+        Tupla (tiempos, mínimos, máximos) con a lo sumo n_buckets valores cada uno
+    """
+    n_buckets = max(1, min(n_buckets, len(y)))
+    bucket_size = int(np.ceil(len(y) / n_buckets))
+    n_buckets = int(np.ceil(len(y) / bucket_size))
+    padded = np.pad(y, (0, n_buckets * bucket_size - len(y)), mode='edge').reshape(n_buckets, bucket_size)
+    times = np.arange(n_buckets) * bucket_size / sr
+    return times, padded.min(axis=1), padded.max(axis=1)
 
 class VoiceVisualizer:
-    def __init__(self, output_dir=None):
+    def __init__(self, output_dir=None, fast_mode=False, dpi=300, max_points=4000,
+                 use_cache=True, max_cached_renders=32):
+        """
+        Args:
+            output_dir: Directorio donde se guardan las visualizaciones
+            fast_mode: Si es True, dibuja la forma de onda como envolvente mín/máx y
+                limita el número de puntos del espectro y columnas del espectrograma
+            dpi: Resolución de las imágenes guardadas
+            max_points: Número máximo de puntos por curva en modo rápido
+            use_cache: Reutilizar la imagen si el audio y la configuración no cambiaron
+            max_cached_renders: Número máximo de imágenes guardadas en la caché
+        """
         # Obtener la ruta base del proyecto
         self.base_dir = Path(__file__).parent.parent
         
@@ -18,6 +71,15 @@ class VoiceVisualizer:
         
         # Crear directorio si no existe
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        
+        self.fast_mode = fast_mode
+        self.dpi = dpi
+        self.max_points = max_points
+        self.use_cache = use_cache
+        self.max_cached_renders = max_cached_renders
+        # Las imágenes en caché se guardan en un subdirectorio para que no se
+        # confundan con las visualizaciones que se envían al usuario
+        self.cache_dir = self.output_dir / ".render_cache"
             
     def clean_existing_visualizations(self):
         """
@@ -31,15 +93,76 @@ class VoiceVisualizer:
             except Exception as e:
                 print(f"Error eliminando visualización {file}: {str(e)}")
 
-    def create_visualizations(self, audio_file):
+    def render_key(self, audio_file):
+        """Clave de caché: hash del contenido del audio y parámetros de renderizado"""
+        audio = as_audio_buffer(audio_file)
+        settings = f"fast={self.fast_mode};dpi={self.dpi};points={self.max_points}"
+        return hashlib.sha256(f"{audio.content_hash}:{settings}".encode()).hexdigest()
+
+    def create_visualizations(self, audio_file, name=None):
         """
         Crea y guarda las visualizaciones para un archivo de audio
+        
+        Args:
+            audio_file: Ruta del audio o AudioBuffer compartido con otras etapas
+            name: Identificador de quien pide la imagen (p. ej. el chat). Cada nombre tiene
+                su propio archivo, de modo que peticiones simultáneas no se sobrescriben ni
+                se borran las imágenes entre sí
+        
+        Returns:
+            Ruta de la imagen (analisis_voz.png o analisis_voz_<name>.png)
         """
-        # Eliminar visualizaciones existentes
-        self.clean_existing_visualizations()
+        audio = as_audio_buffer(audio_file)
+        output_path = Path(self.output_dir) / (f'analisis_voz_{name}.png' if name else 'analisis_voz.png')
+        # La imagen se escribe aparte y se reemplaza de forma atómica: quien esté enviando
+        # la anterior nunca lee un archivo a medio escribir
+        tmp_path = output_path.with_name(f'.{output_path.stem}.tmp.png')
+        with _render_lock:
+            # Si el mismo audio ya se dibujó con esta configuración, reutilizar la imagen
+            cached_path = None
+            if self.use_cache:
+                cached_path = self.cache_dir / f"{self.render_key(audio)}.png"
+                if cached_path.exists():
+                    shutil.copyfile(cached_path, tmp_path)
+                    os.replace(tmp_path, output_path)
+                    cached_path.touch()
+                    RENDER_CACHE_LOOKUPS.inc(result='hit')
+                    return str(output_path)
+                RENDER_CACHE_LOOKUPS.inc(result='miss')
+            
+            if self.fast_mode:
+                self._render_fast(audio, tmp_path)
+            else:
+                self._render_full(audio, tmp_path)
+            
+            if cached_path is not None:
+                self._store_in_cache(tmp_path, cached_path)
+            os.replace(tmp_path, output_path)
+            return str(output_path)
+
+    def _store_in_cache(self, output_path, cached_path):
+        """Copia la imagen a la caché y elimina las menos usadas si se supera el límite"""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(output_path, cached_path)
+            # La imagen recién guardada nunca se elimina, aunque su fecha coincida con otras
+            cached = sorted((f for f in self.cache_dir.glob('*.png') if f != cached_path),
+                            key=lambda f: f.stat().st_mtime)
+            for file in cached[:max(0, len(cached) + 1 - self.max_cached_renders)]:
+                file.unlink()
+        except Exception as e:
+            print(f"Error guardando visualización en caché: {str(e)}")
+
+    def _render_full(self, audio, output_path):
+        """Dibuja todas las muestras de la señal y del espectro"""
+        plt = _pyplot()
+        import librosa
+        import librosa.display
+        from scipy.fft import fft
         
-        # Cargar audio
-        y, sr = librosa.load(str(audio_file), sr=44100)
+        # Audio a 44100 Hz, decodificado una sola vez por el AudioBuffer
+        sr = 44100
+        y = audio.samples(sr)
         
         # Crear figura con subplots
         plt.figure(figsize=(15, 12))
@@ -55,7 +178,7 @@ class VoiceVisualizer:
         
         # 2. Espectrograma
         plt.subplot(3, 1, 2)
-        D = librosa.amplitude_to_db(np.abs(librosa.stft(y)), ref=np.max)
+        D = librosa.amplitude_to_db(audio.spectrogram(sr), ref=np.max)
         librosa.display.specshow(D, y_axis='log', x_axis='time', sr=sr)
         plt.colorbar(format='%+2.0f dB')
         plt.title('Espectrograma')
@@ -78,16 +201,72 @@ class VoiceVisualizer:
         plt.tight_layout()
         
         # Guardar visualización
-        output_path = str(Path(self.output_dir) / 'analisis_voz.png')
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
+        plt.savefig(str(output_path), dpi=self.dpi, bbox_inches='tight')
         plt.close()
+
+    def _render_fast(self, audio, output_path):
+        """Dibuja versiones reducidas de las curvas con un número acotado de puntos"""
+        plt = _pyplot()
+        import librosa
+        import librosa.display
+        from scipy.fft import rfft
         
-        return output_path
+        # Audio a 44100 Hz, decodificado una sola vez por el AudioBuffer
+        sr = 44100
+        y = audio.samples(sr)
+        
+        fig, axes = plt.subplots(3, 1, figsize=(15, 12))
+        
+        # 1. Forma de onda como envolvente mín/máx: conserva los picos visibles
+        times, lower, upper = minmax_envelope(y, sr, self.max_points // 2)
+        axes[0].fill_between(times, lower, upper, linewidth=0.5)
+        axes[0].set_title('Forma de Onda')
+        axes[0].set_xlabel('Tiempo (s)')
+        axes[0].set_ylabel('Amplitud')
+        axes[0].grid(True)
+        
+        # 2. Espectrograma con las ventanas agrupadas (máximo) si exceden max_points / 4 columnas
+        hop_length = 512
+        D = librosa.amplitude_to_db(audio.spectrogram(sr, hop_length=hop_length), ref=np.max)
+        factor = max(1, int(np.ceil(D.shape[1] / max(1, self.max_points // 4))))
+        if factor > 1:
+            D = pool_max(D, factor)
+        mesh = librosa.display.specshow(D, y_axis='log', x_axis='time', sr=sr,
+                                        hop_length=hop_length * factor, ax=axes[1])
+        fig.colorbar(mesh, ax=axes[1], format='%+2.0f dB')
+        axes[1].set_title('Espectrograma')
+        
+        # 3. Espectro hasta 5000 Hz reducido por máximos a max_points puntos
+        magnitudes = np.abs(rfft(y))
+        freqs = np.arange(len(magnitudes)) * sr / len(y)
+        mask = freqs <= 5000
+        freqs, magnitudes = freqs[mask], magnitudes[mask]
+        factor = max(1, int(np.ceil(len(magnitudes) / self.max_points)))
+        if factor > 1:
+            magnitudes = pool_max(magnitudes, factor)
+            freqs = freqs[::factor]
+        axes[2].semilogy(freqs, magnitudes)
+        axes[2].set_title('Espectro de Frecuencias (FFT)')
+        axes[2].set_xlabel('Frecuencia (Hz)')
+        axes[2].set_ylabel('Magnitud (log)')
+        axes[2].grid(True)
+        
+        fig.tight_layout()
+        fig.savefig(str(output_path), dpi=self.dpi, bbox_inches='tight')
+        plt.close(fig)
 
     def create_comparison_plot(self, reference_audio, test_audio):
         """
         Crea una visualización comparativa entre el audio de referencia y el de prueba
         """
+        with _render_lock:
+            return self._create_comparison_plot(reference_audio, test_audio)
+
+    def _create_comparison_plot(self, reference_audio, test_audio):
+        plt = _pyplot()
+        import librosa
+        from scipy.fft import fft
+        
         # Cargar ambos audios
         y_ref, sr = librosa.load(str(reference_audio), sr=44100)
         y_test, sr = librosa.load(str(test_audio), sr=44100)
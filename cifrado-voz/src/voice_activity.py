@@ -0,0 +1,63 @@
+import numpy as np
+
+def voiced_frames(y, frame_length=2048, hop_length=512, top_db=40.0):
+    """
+    Detecta las ventanas con voz por energía: una ventana es sonora si su RMS está a
+    menos de top_db decibelios del máximo de la señal.
+
+    Returns:
+        Array booleano con una entrada por ventana (ventanas centradas, como librosa)
+    """
+    import librosa
+    rms = librosa.feature.rms(y=y, frame_length=frame_length, hop_length=hop_length)[0]
+    return librosa.amplitude_to_db(rms, ref=np.max, top_db=None) > -top_db
+
+def trim_silence(y, sr, frame_length=2048, hop_length=512, top_db=40.0, padding=0.05):
+    """
+    Elimina silencios iniciales, finales y pausas, y concatena los tramos con voz.
+
+    Args:
+        y: Señal de audio
+        sr: Frecuencia de muestreo
+        top_db: Umbral bajo el máximo (dB) a partir del cual una ventana es silencio
+        padding: Segundos que se conservan antes y después de cada tramo con voz para no
+            recortar el inicio y el final de las palabras
+
+    Returns:
+        Tupla (señal recortada, informe) donde el informe contiene total_frames,
+        voiced_frames, dropped_frames, dropped_seconds y segments. Si no se detecta voz
+        se devuelve la señal completa.
+    """
+    total_frames = 1 + len(y) // hop_length
+    mask = voiced_frames(y, frame_length, hop_length, top_db)
+    report = {
+        'total_frames': int(total_frames),
+        'voiced_frames': int(np.count_nonzero(mask)),
+        'dropped_frames': 0,
+        'dropped_seconds': 0.0,
+        'segments': 0
+    }
+    if not mask.any():
+        report['voiced_frames'] = report['total_frames']
+        return y, report
+
+    # Tramos con voz [inicio, fin) en ventanas, ampliados con el margen y fusionados si se solapan
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    pad = int(round(padding * sr))
+    starts = np.clip(edges[0::2] * hop_length - pad, 0, len(y))
+    ends = np.clip(edges[1::2] * hop_length + pad, 0, len(y))
+    merged = []
+    for start, end in zip(starts, ends):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    trimmed = np.concatenate([y[start:end] for start, end in merged])
+    kept_frames = 1 + len(trimmed) // hop_length
+    report.update({
+        'dropped_frames': int(total_frames - kept_frames),
+        'dropped_seconds': (len(y) - len(trimmed)) / sr,
+        'segments': len(merged)
+    })
+    return trimmed, report
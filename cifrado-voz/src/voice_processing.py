@@ -1,77 +1,170 @@
 import numpy as np
-import librosa
-from scipy.signal import butter, filtfilt
-from scipy.fft import fft
-import python_speech_features
-from sklearn.preprocessing import StandardScaler
 import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
+from audio_analysis import analyze_signal
+from audio_ingest import AudioBuffer, as_audio_buffer
+from feature_cache import get_default_cache
+from instrumentation import timed
+from metrics import get_registry
+from key_derivation import derive_key, quantize_feature_vector
+from reference_store import ReferenceSet, MANIFEST_FILENAME, STORE_FILENAME, load_json_references
+from scoring import SIMILARITY_WEIGHTS, is_match, score_references
+from speaker_index import SpeakerIndex
+from streaming_verifier import StreamingVerifier
+from voice_activity import trim_silence
+
+_metrics = get_registry()
+VERIFICATIONS = _metrics.counter('voice_verifications_total', "Verificaciones de voz por operación y resultado",
+                                 labels=('operation', 'result'))
+VERIFICATION_SECONDS = _metrics.histogram('voice_verification_seconds', "Duración de verify_voice",
+                                          labels=('operation',))
+VAD_FRAMES = _metrics.counter('vad_frames_total', "Ventanas analizadas por la detección de voz")
+VAD_DROPPED_FRAMES = _metrics.counter('vad_dropped_frames_total', "Ventanas de silencio descartadas antes de extraer características")
+
+# Prefijo de los campos del informe de la detección de voz en las entradas de la caché
+_VAD_CACHE_PREFIX = 'vad_report.'
 
 class VoiceKeySystem:
-    def __init__(self):
+    def __init__(self, feature_cache=None, user_id="usuario1"):
         self.base_dir = Path(__file__).parent.parent / "data"
         self.audio_samples_dir = self.base_dir / "audio_samples"
         self.users_dir = self.base_dir / "authorized_users"
         self.output_dir = self.base_dir / "output"
-        self.auth_user_dir = self.users_dir / "usuario1"
+        # Usuario usado por verify_voice y process_reference_files
+        self.user_id = user_id
+        self.auth_user_dir = self.users_dir / user_id
         
         for directory in [self.audio_samples_dir, self.users_dir, self.output_dir, self.auth_user_dir]:
             directory.mkdir(parents=True, exist_ok=True)
         
+        # Parámetros de extracción de características
+        self.sample_rate = 22050
+        self.n_mfcc = 13
+        self.n_bands = 24
+        # Rellenar la FFT hasta una longitud rápida acota la latencia con longitudes primas,
+        # pero modifica ligeramente el perfil (y por tanto la clave) respecto a referencias previas
+        self.fft_fast_len = False
+        # Detección de voz: descarta silencios y pausas antes de extraer características.
+        # Desactivada por defecto porque cambia las características respecto a referencias previas
+        self.vad_enabled = False
+        self.vad_top_db = 40.0
+        
+        # Caché de características (por defecto, compartida por todo el proceso)
+        self.feature_cache = feature_cache if feature_cache is not None else get_default_cache()
+        
         self.references = self.load_references()
+        self._reference_set = None
+        self._reference_set_source = None
+        # Índice de todos los usuarios autorizados (se construye al usarlo)
+        self._speaker_index = None
 
     def load_references(self):
         """Carga las referencias de voz existentes"""
-        references = []
-        if self.auth_user_dir.exists():
-            for filename in sorted(self.auth_user_dir.glob("*.json")):
-                try:
-                    with open(filename, 'r') as f:
-                        ref_data = json.load(f)
-                        # Convertir las listas JSON de vuelta a arrays numpy
-                        for key in ref_data:
-                            if isinstance(ref_data[key], list):
-                                ref_data[key] = np.array(ref_data[key])
-                        references.append(ref_data)
-                except Exception as e:
-                    print(f"Error loading reference {filename}: {e}")
+        # Preferir el almacén binario; los archivos JSON se mantienen por compatibilidad
+        reference_set = ReferenceSet.load(self.auth_user_dir)
+        if reference_set is not None:
+            return reference_set.to_feature_list()
+        
+        references, _ = load_json_references(self.auth_user_dir)
         return references
 
+    def migrate_references(self):
+        """Convierte las referencias JSON existentes al almacén binario"""
+        references, names = load_json_references(self.auth_user_dir)
+        if not references:
+            return False
+        
+        ReferenceSet.from_features(references, names).save(self.auth_user_dir)
+        self.references = self.load_references()
+        self._speaker_index = None
+        return True
+
+    def extraction_params(self):
+        """Parámetros que determinan el resultado de extract_voice_features"""
+        return {
+            'sample_rate': self.sample_rate,
+            'n_mfcc': self.n_mfcc,
+            'n_bands': self.n_bands,
+            'fft_fast_len': self.fft_fast_len,
+            'vad_top_db': self.vad_top_db if self.vad_enabled else None
+        }
+
+    def apply_extraction_params(self, params):
+        """Configura la extracción a partir de un dict de extraction_params()"""
+        self.sample_rate = params['sample_rate']
+        self.n_mfcc = params['n_mfcc']
+        self.n_bands = params['n_bands']
+        self.fft_fast_len = params['fft_fast_len']
+        self.vad_enabled = params.get('vad_top_db') is not None
+        if self.vad_enabled:
+            self.vad_top_db = params['vad_top_db']
+
     def extract_voice_features(self, audio_file):
-        """Extrae características de la voz"""
+        """
+        Extrae características de la voz
+        
+        Args:
+            audio_file: Ruta del audio o AudioBuffer compartido con otras etapas
+        """
+        return self._extract(audio_file)[0]
+
+    def _extract(self, audio_file):
+        """
+        Implementación de extract_voice_features que devuelve también el informe de la
+        detección de voz. El informe se devuelve (y se guarda en la caché junto a las
+        características) en lugar de quedar en el objeto, que comparten los hilos del bot.
+        
+        Returns:
+            Tupla (características, informe de trim_silence o None si la detección está
+            desactivada); (None, None) si hubo un error
+        """
         try:
-            # Cargar y normalizar el audio
-            y, sr = librosa.load(str(audio_file), sr=22050)
-            y = librosa.util.normalize(y)
+            audio = as_audio_buffer(audio_file)
             
-            # 1. Extraer MFCCs
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+            # Reutilizar las características si este audio ya fue procesado
+            cache_key = self.feature_cache.key_from_hash(audio.content_hash, self.extraction_params())
+            entry = self.feature_cache.get(cache_key)
+            if entry is not None:
+                return _split_cache_entry(entry)
             
-            # 2. Obtener espectrograma mel
-            mel_spect = librosa.feature.melspectrogram(y=y, sr=sr)
+            # Audio normalizado a la frecuencia de análisis (decodificado una sola vez)
+            full_signal = audio.samples(self.sample_rate, normalize=True)
+            sr = self.sample_rate
             
-            # 3. Características espectrales básicas
-            spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-            zero_crossing_rate = librosa.feature.zero_crossing_rate(y)[0]
+            # 0. Descartar silencios: las etapas siguientes solo procesan las ventanas con voz
+            y = full_signal
+            vad_report = None
+            if self.vad_enabled:
+                y, vad_report = trim_silence(full_signal, sr, top_db=self.vad_top_db)
+                VAD_FRAMES.inc(vad_report['total_frames'])
+                VAD_DROPPED_FRAMES.inc(vad_report['dropped_frames'])
+            # El espectrograma compartido solo sirve si no se recortó la señal
+            magnitude = audio.spectrogram(sr, normalize=True) if len(y) == len(full_signal) else None
             
-            # 4. FFT
-            fft_result = np.abs(fft(y))[:len(y)//2]
+            # 1-3. MFCCs, espectrograma mel y características espectrales a partir de una única STFT
+            analysis = analyze_signal(y, sr, n_mfcc=self.n_mfcc, magnitude=magnitude)
             
+            # 4. Perfil FFT en bandas
             # Crear diccionario de características con arrays numpy
             features = {
-                'mfcc_features': np.mean(mfccs, axis=1),
-                'mel_features': np.mean(mel_spect, axis=1),
-                'spectral_centroid': np.mean(spectral_centroids),
-                'zero_crossing_rate': np.mean(zero_crossing_rate),
-                'fft_features': self.compute_fft_profile(fft_result)
+                'mfcc_features': np.mean(analysis['mfcc'], axis=1),
+                'mel_features': np.mean(analysis['mel'], axis=1),
+                'spectral_centroid': np.mean(analysis['spectral_centroid']),
+                'zero_crossing_rate': np.mean(analysis['zero_crossing_rate']),
+                'fft_features': self.compute_band_profile(y)
             }
             
-            return features
+            self.feature_cache.put(cache_key, _cache_entry(features, vad_report))
+            return features, vad_report
             
         except Exception as e:
             print(f"Error extracting voice features: {str(e)}")
-            return None
+            return None, None
 
     def find_formant_peaks(self, formant_magnitudes, freqs, n_formants=3):
         """Encuentra los primeros n_formants formantes en el espectro"""
@@ -84,10 +177,31 @@ class VoiceKeySystem:
         sorted_indices = np.argsort(peak_mags)[-n_formants:]
         return peak_freqs[sorted_indices].tolist()
 
+    def compute_band_profile(self, y):
+        """Computa el perfil FFT en bandas de la señal usando una FFT real"""
+        from scipy.fft import next_fast_len, rfft
+        
+        # La FFT real calcula solo las frecuencias positivas, que son las que se usan
+        n_fft = next_fast_len(len(y), real=True) if self.fft_fast_len else len(y)
+        spectrum = np.abs(rfft(y, n=n_fft))[:n_fft // 2]
+        return self.compute_fft_profile(spectrum, self.n_bands)
+
     def compute_fft_profile(self, fft_result, n_bands=24):
         """Computa el perfil FFT en bandas"""
-        bands = np.array_split(fft_result, n_bands)
-        return np.array([np.mean(band) for band in bands])
+        fft_result = np.asarray(fft_result)
+        if len(fft_result) < n_bands:
+            # Con menos valores que bandas algunas bandas quedan vacías
+            bands = np.array_split(fft_result, n_bands)
+            return np.array([np.mean(band) for band in bands])
+        
+        # Mismas bandas que np.array_split, promediadas con una única reducción
+        size, extra = divmod(len(fft_result), n_bands)
+        counts = np.full(n_bands, size)
+        counts[:extra] += 1
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        sums = np.add.reduceat(fft_result.astype(np.float64), starts)
+        dtype = fft_result.dtype if np.issubdtype(fft_result.dtype, np.floating) else np.float64
+        return (sums / counts).astype(dtype, copy=False)
 
     def compare_features(self, features1, features2):
         """Compara dos conjuntos de características de voz"""
@@ -102,13 +216,7 @@ class VoiceKeySystem:
             zcr_sim = 1 - abs(features1['zero_crossing_rate'] - features2['zero_crossing_rate']) / (features1['zero_crossing_rate'] + 1e-10)
             
             # Ponderación de similitudes
-            weights = {
-                'mfcc': 0.4,
-                'mel': 0.3,
-                'fft': 0.2,
-                'spectral': 0.05,
-                'zcr': 0.05
-            }
+            weights = SIMILARITY_WEIGHTS
             
             total_similarity = (
                 weights['mfcc'] * mfcc_sim +
@@ -123,8 +231,204 @@ class VoiceKeySystem:
         except Exception as e:
             print(f"Error comparing features: {e}")
             return 0
+
+    def get_reference_set(self):
+        """Devuelve las referencias actuales apiladas en matrices (se reconstruye si cambian)"""
+        if (self._reference_set is None or self._reference_set_source is not self.references
+                or len(self._reference_set) != len(self.references)):
+            self._reference_set = ReferenceSet.from_features(self.references)
+            self._reference_set_source = self.references
+        return self._reference_set
+
+    def score_features(self, features):
+        """Similitud de unas características con todas las referencias en una sola pasada"""
+        return score_references(self.get_reference_set(), features)
+
+    def get_speaker_index(self, reload=False):
+        """Devuelve el índice con las referencias de todos los subdirectorios de authorized_users"""
+        if self._speaker_index is None or reload:
+            self._speaker_index = SpeakerIndex.load(self.users_dir)
+        return self._speaker_index
+
+    def identify_speaker(self, input_audio_file, top_k=5, similarity_threshold=0.85):
+        """
+        Identificación 1:N: compara la voz con todos los usuarios autorizados.
+        
+        Args:
+            input_audio_file: Archivo de audio a identificar
+            top_k: Número máximo de candidatos a devolver
+            similarity_threshold: Umbral de similitud requerido
+            
+        Returns:
+            Lista de candidatos ordenados por similitud máxima (ver SpeakerIndex.identify)
+        """
+        test_features = self.extract_voice_features(input_audio_file)
+        if test_features is None:
+            raise ValueError("No se pudo procesar el audio de entrada")
+        return self.get_speaker_index().identify(test_features, top_k, similarity_threshold)
+
+    def verify_speaker(self, input_audio_file, user_id=None, similarity_threshold=0.85):
+        """
+        Verificación 1:1 contra un usuario, sin generar ni guardar claves.
+        
+        Args:
+            input_audio_file: Archivo de audio a verificar
+            user_id: Usuario a verificar (por defecto, self.user_id)
+            similarity_threshold: Umbral de similitud requerido
+            
+        Returns:
+            Dict con matches, max_similarity, avg_similarity y similarities
+        """
+        test_features = self.extract_voice_features(input_audio_file)
+        if test_features is None:
+            raise ValueError("No se pudo procesar el audio de entrada")
+        return self.get_speaker_index().verify(test_features, user_id or self.user_id, similarity_threshold)
     
-    def verify_voice(self, input_audio_file, operation='encrypt', similarity_threshold=0.85):
+    def iter_verify_many(self, audio_files, similarity_threshold=0.85, user_id=None,
+                         max_workers=None, use_processes=True):
+        """
+        Verifica muchos archivos sin efectos secundarios (no genera ni guarda claves),
+        devolviendo cada resultado en cuanto termina.
+        
+        La extracción de características se reparte en un pool de procesos (o de hilos con
+        use_processes=False); las puntuaciones contra las referencias se calculan en este
+        proceso con score_references, vectorizado sobre todas las referencias. Los archivos
+        cuyas características ya están en la caché se puntúan sin pasar por el pool.
+        
+        Args:
+            audio_files: Rutas de los audios a verificar
+            similarity_threshold: Umbral de similitud requerido
+            user_id: Usuario contra el que verificar (por defecto, las referencias cargadas)
+            max_workers: Número máximo de workers del pool
+            use_processes: Usar procesos (True) o hilos (False)
+            
+        Yields:
+            Dict con file, matches, max_similarity, avg_similarity y similarities, o con
+            file y error si el audio no pudo procesarse
+        """
+        if user_id is None:
+            if not self.references:
+                raise ValueError("No hay referencias almacenadas")
+            reference_set = self.get_reference_set()
+            score = lambda features: score_references(reference_set, features)
+        else:
+            index = self.get_speaker_index()
+            score = lambda features: np.asarray(index.verify(features, user_id, similarity_threshold)['similarities'])
+        
+        def build_result(audio_file, features):
+            if features is None:
+                return {'file': str(audio_file), 'error': "No se pudo procesar el audio"}
+            scores = score(features)
+            max_similarity = float(np.max(scores))
+            avg_similarity = float(np.mean(scores))
+            return {
+                'file': str(audio_file),
+                'matches': is_match(max_similarity, avg_similarity, similarity_threshold),
+                'max_similarity': max_similarity,
+                'avg_similarity': avg_similarity,
+                'similarities': scores.tolist()
+            }
+        
+        params = self.extraction_params()
+        pending = []
+        for audio_file in audio_files:
+            try:
+                cache_key = self.feature_cache.make_key(audio_file, params)
+            except OSError as e:
+                yield {'file': str(audio_file), 'error': str(e)}
+                continue
+            entry = self.feature_cache.get(cache_key)
+            if entry is not None:
+                yield build_result(audio_file, _split_cache_entry(entry)[0])
+            else:
+                pending.append((audio_file, cache_key))
+        if not pending:
+            return
+        
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with executor_class(max_workers=max_workers) as executor:
+            futures = {executor.submit(_extract_features_worker, str(audio_file), params): (audio_file, cache_key)
+                       for audio_file, cache_key in pending}
+            for future in as_completed(futures):
+                audio_file, cache_key = futures[future]
+                try:
+                    features, vad_report = future.result()
+                except Exception as e:
+                    yield {'file': str(audio_file), 'error': str(e)}
+                    continue
+                if features is not None:
+                    self.feature_cache.put(cache_key, _cache_entry(features, vad_report))
+                yield build_result(audio_file, features)
+
+    def verify_many(self, audio_files, similarity_threshold=0.85, user_id=None, max_workers=None,
+                    use_processes=True, on_result=None):
+        """
+        Verificación masiva sin efectos secundarios (ver iter_verify_many).
+        
+        Args:
+            on_result: Función opcional que recibe cada resultado en cuanto termina
+            
+        Returns:
+            Dict con:
+                - results: resultados en el orden en que terminaron
+                - throughput: clips, aceptados, rechazados, errores, tiempo y clips por segundo
+        """
+        start = time.perf_counter()
+        results = []
+        for result in self.iter_verify_many(audio_files, similarity_threshold, user_id, max_workers, use_processes):
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+        elapsed = time.perf_counter() - start
+        
+        failed = sum(1 for r in results if 'error' in r)
+        accepted = sum(1 for r in results if r.get('matches'))
+        VERIFICATIONS.inc(accepted, operation='bulk', result='accepted')
+        VERIFICATIONS.inc(len(results) - failed - accepted, operation='bulk', result='rejected')
+        VERIFICATIONS.inc(failed, operation='bulk', result='error')
+        return {
+            'results': results,
+            'throughput': {
+                'clips': len(results),
+                'accepted': accepted,
+                'rejected': len(results) - failed - accepted,
+                'failed': failed,
+                'elapsed_seconds': elapsed,
+                'clips_per_second': len(results) / elapsed if elapsed > 0 else 0.0
+            }
+        }
+
+    def verify_voice_streaming(self, input_audio_file, similarity_threshold=0.85, chunk_seconds=0.5, **options):
+        """
+        Verificación incremental contra las referencias actuales, deteniéndose en cuanto
+        la decisión es segura (ver StreamingVerifier). No genera ni guarda claves.
+        
+        Args:
+            input_audio_file: Archivo de audio a verificar
+            similarity_threshold: Umbral de similitud requerido
+            chunk_seconds: Duración de cada bloque leído del archivo
+            options: Parámetros adicionales de StreamingVerifier (min_duration, margin, ...)
+            
+        Returns:
+            Dict con matches, decision, early_stop, similitudes y segundos procesados
+        """
+        if not self.references:
+            raise ValueError("No hay referencias almacenadas")
+        
+        start = time.perf_counter()
+        verifier = StreamingVerifier(self.get_reference_set(), sample_rate=self.sample_rate, n_mfcc=self.n_mfcc,
+                                     n_bands=self.n_bands, similarity_threshold=similarity_threshold, **options)
+        try:
+            result = verifier.verify_file(input_audio_file, chunk_seconds)
+        except Exception:
+            VERIFICATIONS.inc(operation='stream', result='error')
+            raise
+        finally:
+            VERIFICATION_SECONDS.observe(time.perf_counter() - start, operation='stream')
+        VERIFICATIONS.inc(operation='stream', result='accepted' if result['matches'] else 'rejected')
+        return result
+
+    def verify_voice(self, input_audio_file, operation='encrypt', similarity_threshold=0.85, timer=None):
         """
         Verifica si la voz coincide con las referencias y guarda/verifica los datos de autorización
         
@@ -132,30 +436,43 @@ class VoiceKeySystem:
             input_audio_file: Archivo de audio a verificar
             operation: 'encrypt' o 'decrypt'
             similarity_threshold: Umbral de similitud requerido
+            timer: StageTimer opcional para medir cada etapa
             
         Returns:
             Dict con resultados de verificación
         """
+        start = time.perf_counter()
+        try:
+            result = self._verify_voice(input_audio_file, operation, similarity_threshold, timer)
+        except Exception:
+            VERIFICATIONS.inc(operation=operation, result='error')
+            raise
+        finally:
+            VERIFICATION_SECONDS.observe(time.perf_counter() - start, operation=operation)
+        VERIFICATIONS.inc(operation=operation, result='accepted' if result['matches'] else 'rejected')
+        return result
+
+    def _verify_voice(self, input_audio_file, operation, similarity_threshold, timer):
+        """Implementación de verify_voice"""
         if not self.references:
             raise ValueError("No hay referencias almacenadas")
         
         # Extraer características
-        test_features = self.extract_voice_features(input_audio_file)
+        with timed(timer, 'features'):
+            test_features, vad_report = self._extract(input_audio_file)
         if test_features is None:
             raise ValueError("No se pudo procesar el audio de entrada")
         
-        # Obtener similitudes con referencias
-        similarities = []
-        for ref in self.references:
-            similarity = self.compare_features(ref, test_features)
-            similarities.append(similarity)
-        
-        max_similarity = max(similarities)
-        avg_similarity = np.mean(similarities)
-        
-        # Verificación estricta
-        matches = (max_similarity > similarity_threshold and 
-                avg_similarity > similarity_threshold * 0.9)
+        # Obtener similitudes con todas las referencias a la vez
+        with timed(timer, 'scoring'):
+            scores = self.score_features(test_features)
+            similarities = scores.tolist()
+            
+            max_similarity = float(np.max(scores))
+            avg_similarity = float(np.mean(scores))
+            
+            # Verificación estricta
+            matches = is_match(max_similarity, avg_similarity, similarity_threshold)
 
         result = {
             'matches': matches,
@@ -163,19 +480,25 @@ class VoiceKeySystem:
             'avg_similarity': avg_similarity,
             'similarities': similarities
         }
+        if vad_report is not None:
+            result['vad'] = vad_report
 
         if matches:
             if operation == 'encrypt':
                 # Para encriptación, generar y guardar nueva clave
-                encryption_data = self.prepare_encryption_key(test_features)
+                with timed(timer, 'key_derivation'):
+                    encryption_data = self.prepare_encryption_key(test_features)
                 result['encryption_data'] = encryption_data
-                result['output_files'] = self.save_encryption_data(encryption_data, operation)
+                with timed(timer, 'key_storage'):
+                    result['output_files'] = self.save_encryption_data(encryption_data, operation)
             else:  # decrypt
                 # Para desencriptación, verificar contra la clave guardada
-                existing_key = self.load_existing_key()
+                with timed(timer, 'key_storage'):
+                    existing_key = self.load_existing_key()
                 if existing_key:
                     # Generar clave con características actuales
-                    current_key = self.prepare_encryption_key(test_features)
+                    with timed(timer, 'key_derivation'):
+                        current_key = self.prepare_encryption_key(test_features)
                     
                     # Verificar que las claves son compatibles
                     if self.are_keys_equal(existing_key, current_key):
@@ -223,20 +546,10 @@ class VoiceKeySystem:
         ])
         
         # Normalizar y cuantizar para mayor estabilidad
-        normalized = (feature_vector - np.min(feature_vector)) / (np.max(feature_vector) - np.min(feature_vector))
-        quantized = (normalized * 255).astype(np.uint8)
-        
-        # Generar clave de 32 bytes
-        key = np.zeros(32, dtype=np.uint8)
+        quantized = quantize_feature_vector(feature_vector)
         
-        # Hash personalizado con más variabilidad
-        for i in range(len(quantized)):
-            val = int((quantized[i] * 1000) % 256)
-            key[i % 32] ^= val
-            key = np.roll(key, 1 if i % 2 == 0 else -1)
-            if i > 0:
-                # Añadir dependencia entre bytes consecutivos
-                key[i % 32] = (key[i % 32] ^ key[(i-1) % 32]) % 256
+        # Generar clave de 32 bytes con el hash personalizado (ver key_derivation)
+        key = derive_key(quantized)
         
         return {
             'key_bytes': key.tobytes(),
@@ -297,6 +610,11 @@ class VoiceKeySystem:
         bin_filepath = self.output_dir / "voice_key.bin"
         json_filepath = self.output_dir / "voice_key_data.json"
         
+        # Las peticiones concurrentes comparan y reemplazan la clave de una en una
+        with _key_file_lock:
+            return self._save_encryption_data(encryption_data, operation, bin_filepath, json_filepath)
+
+    def _save_encryption_data(self, encryption_data, operation, bin_filepath, json_filepath):
         # Verificar si ya existe una clave
         existing_data = None
         if json_filepath.exists():
@@ -316,8 +634,14 @@ class VoiceKeySystem:
 
         # Si la clave es diferente o no existe, guardar la nueva
         try:
+            # Se escribe en archivos temporales (propios del proceso) y se reemplazan de forma
+            # atómica, para que load_existing_key nunca lea un archivo a medio escribir
+            tmp_suffix = f".{os.getpid()}.tmp"
+            tmp_bin = bin_filepath.with_name(bin_filepath.name + tmp_suffix)
+            tmp_json = json_filepath.with_name(json_filepath.name + tmp_suffix)
+
             # Guardar clave binaria
-            with open(bin_filepath, 'wb') as f:
+            with open(tmp_bin, 'wb') as f:
                 f.write(encryption_data['key_bytes'])
             
             # Guardar metadatos en JSON
@@ -327,9 +651,11 @@ class VoiceKeySystem:
                 'operation': operation
             }
             
-            with open(json_filepath, 'w') as f:
+            with open(tmp_json, 'w') as f:
                 json.dump(json_data, f, indent=2)
             
+            os.replace(tmp_bin, bin_filepath)
+            os.replace(tmp_json, json_filepath)
             print("New key generated and saved")
             return {
                 'binary_file': str(bin_filepath),
@@ -339,34 +665,147 @@ class VoiceKeySystem:
             print(f"Error saving encryption data: {str(e)}")
             return None
 
-    def process_reference_files(self):
-        """Procesa y guarda las referencias, manteniendo solo una versión por referencia"""
-        ref_files = sorted(list(self.audio_samples_dir.glob("usuario1_ref*.wav")))
+    def process_reference_files(self, max_workers=None, use_processes=True, force=False):
+        """
+        Inscribe las grabaciones {user_id}_ref*.wav de forma incremental.
         
-        # Limpiar referencias existentes
-        for file in self.auth_user_dir.glob("*.json"):
-            file.unlink()
+        El manifiesto del almacén guarda, por referencia, el hash SHA-256, la fecha de
+        modificación y el tamaño de su grabación, junto con los parámetros de extracción.
+        Solo se extraen (en paralelo) las grabaciones nuevas o modificadas; las demás
+        filas se conservan sin cambios, incluidas las de grabaciones que ya no están en
+        audio_samples. Si el almacén no tiene esa información, se creó con otros
+        parámetros de extracción o force es True, se inscriben todas las grabaciones de
+        nuevo y se reemplazan las referencias anteriores.
         
-        for i, ref_file in enumerate(ref_files, 1):
-            print(f"Processing reference {i}: {ref_file.name}")
-            features = self.extract_voice_features(ref_file)
+        Args:
+            max_workers: Número máximo de workers para la extracción
+            use_processes: Usar un pool de procesos (True) o de hilos (False)
+            force: Volver a extraer todas las grabaciones
             
-            if features is not None:
-                # Convertir arrays numpy a listas para JSON
-                features_json = {
-                    key: value.tolist() if isinstance(value, np.ndarray) else value
-                    for key, value in features.items()
-                }
-                
-                ref_filename = f"reference_{i}.json"
-                ref_filepath = self.auth_user_dir / ref_filename
-                
-                with open(ref_filepath, 'w') as f:
-                    json.dump(features_json, f, indent=2)
-                
-                print(f"Reference {i} saved successfully")
-            else:
-                print(f"Error processing reference {i}")
+        Returns:
+            Dict con los nombres de las referencias added, updated, unchanged y failed
+        """
+        params = self.extraction_params()
+        ref_files = sorted(self.audio_samples_dir.glob(f"{self.user_id}_ref*.wav"))
+        
+        existing = None if force else ReferenceSet.load(self.auth_user_dir)
+        if existing is not None and (existing.metadata.get('extraction_params') != params or
+                                     'sources' not in existing.metadata):
+            existing = None
+        rows = {}
+        sources = {}
+        if existing is not None:
+            rows = {name: existing.features(i) for i, name in enumerate(existing.names)}
+            sources = dict(existing.metadata['sources'])
+        
+        summary = {'added': [], 'updated': [], 'unchanged': [], 'failed': []}
+        manifest_changed = existing is None
+        pending = []
+        for ref_file in ref_files:
+            name = ref_file.stem
+            stat = ref_file.stat()
+            source = {'file': ref_file.name, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+            previous = sources.get(name) if name in rows else None
+            if previous and previous['mtime_ns'] == source['mtime_ns'] and previous['size'] == source['size']:
+                summary['unchanged'].append(name)
+                continue
+            
+            source['sha256'] = AudioBuffer(ref_file).content_hash
+            if previous and previous.get('sha256') == source['sha256']:
+                # Mismo contenido con otra fecha de modificación: solo cambia el manifiesto
+                sources[name] = source
+                summary['unchanged'].append(name)
+                manifest_changed = True
+                continue
+            pending.append((ref_file, source, 'updated' if previous else 'added'))
+        
+        for (ref_file, source, status), features in zip(pending, self._extract_many(
+                [ref_file for ref_file, _, _ in pending], params, max_workers, use_processes)):
+            name = ref_file.stem
+            if features is None:
+                print(f"Error processing reference {ref_file.name}")
+                summary['failed'].append(name)
+                continue
+            print(f"Reference {ref_file.name} processed successfully")
+            rows[name] = features
+            sources[name] = source
+            summary[status].append(name)
+            manifest_changed = True
+        
+        if not rows:
+            print("No references were processed")
+            return summary
+        if not manifest_changed:
+            print(f"References are up to date ({len(rows)} in {self.auth_user_dir / STORE_FILENAME})")
+            return summary
+        
+        names = sorted(rows)
+        reference_set = ReferenceSet.from_features([rows[name] for name in names], names)
+        reference_set.metadata = {'extraction_params': params, 'sources': sources}
+        reference_set.save(self.auth_user_dir)
+        
+        # Eliminar las referencias JSON del formato anterior
+        for file in self.auth_user_dir.glob("*.json"):
+            if file.name != MANIFEST_FILENAME:
+                file.unlink()
+        
+        self.references = self.load_references()
+        self._speaker_index = None
+        print(f"{len(names)} references saved to {self.auth_user_dir / STORE_FILENAME} "
+              f"({len(summary['added'])} added, {len(summary['updated'])} updated, "
+              f"{len(summary['unchanged'])} unchanged)")
+        return summary
+
+    def _extract_many(self, audio_files, params, max_workers=None, use_processes=True):
+        """Extrae las características de varios archivos en paralelo, en el mismo orden"""
+        if len(audio_files) <= 1:
+            return [self.extract_voice_features(audio_file) for audio_file in audio_files]
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with executor_class(max_workers=max_workers) as executor:
+            futures = [executor.submit(_extract_features_worker, str(audio_file), params) for audio_file in audio_files]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result()[0])
+                except Exception as e:
+                    print(f"Error extracting voice features: {str(e)}")
+                    results.append(None)
+            return results
+
+_worker_systems = {}
+_worker_lock = threading.Lock()
+_key_file_lock = threading.Lock()
+
+def _cache_entry(features, vad_report):
+    """Entrada de la caché de características: las características y el informe de la detección de voz"""
+    entry = dict(features)
+    if vad_report is not None:
+        entry.update({_VAD_CACHE_PREFIX + name: value for name, value in vad_report.items()})
+    return entry
+
+def _split_cache_entry(entry):
+    """Separa una entrada de la caché en (características, informe de la detección de voz o None)"""
+    features = {name: value for name, value in entry.items() if not name.startswith(_VAD_CACHE_PREFIX)}
+    # Desde la caché en disco los valores vuelven como escalares numpy
+    vad_report = {name[len(_VAD_CACHE_PREFIX):]: np.asarray(value).item()
+                  for name, value in entry.items() if name.startswith(_VAD_CACHE_PREFIX)}
+    return features, vad_report or None
+
+def _extract_features_worker(audio_file, params):
+    """
+    Extrae características en un worker de verify_many. Cada proceso reutiliza un
+    VoiceKeySystem por configuración de extracción.
+    
+    Returns:
+        Tupla (características, informe de la detección de voz), como VoiceKeySystem._extract
+    """
+    key = json.dumps(params, sort_keys=True)
+    with _worker_lock:
+        system = _worker_systems.get(key)
+        if system is None:
+            system = _worker_systems[key] = VoiceKeySystem()
+            system.apply_extraction_params(params)
+    return system._extract(audio_file)
 
 def main():
     """Función principal"""
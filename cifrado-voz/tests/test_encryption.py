@@ -4,8 +4,10 @@
 import unittest
 import numpy as np
 import os
+import tempfile
 from Crypto.Cipher import AES
-from src.encryption import Encrypter
+from src.encryption import (Encrypter, FLAG_ZLIB, HEADER_SIZE, TAG_SIZE, is_compressible, read_container_header,
+                            worker_cpu_time)
 
 class TestEncrypter(unittest.TestCase):
 
@@ -66,5 +68,189 @@ class TestEncrypter(unittest.TestCase):
             decrypted_content = f_dec.read()
             self.assertEqual(original_content, decrypted_content)
 
+    def test_streaming_matches_legacy_format(self):
+        # Un tamaño de bloque pequeño obliga a procesar el archivo en varios bloques
+        encrypter = Encrypter(chunk_size=7)
+        key = os.urandom(32)
+        data = os.urandom(1000)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'datos.bin')
+            with open(path, 'wb') as f:
+                f.write(data)
+
+            encrypted_file = encrypter.encrypt_file(path, key)
+            with open(encrypted_file, 'rb') as f_enc:
+                iv = f_enc.read(16)
+                ciphertext = f_enc.read()
+
+            # El resultado debe ser idéntico al cifrado de una sola pasada
+            expected = AES.new(key, AES.MODE_CFB, iv=iv).encrypt(data)
+            self.assertEqual(ciphertext, expected)
+
+            os.remove(path)
+            decrypted_file = encrypter.decrypt_file(encrypted_file, key)
+            with open(decrypted_file, 'rb') as f_dec:
+                self.assertEqual(f_dec.read(), data)
+
+    def test_mmap_decryption_matches_streaming(self):
+        encrypter = Encrypter(chunk_size=64)
+        key = os.urandom(32)
+        data = os.urandom(5000)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'datos.bin')
+            with open(path, 'wb') as f:
+                f.write(data)
+            encrypted_file = encrypter.encrypt_file(path, key)
+            os.remove(path)
+
+            decrypted_file = encrypter.decrypt_file(encrypted_file, key, use_mmap=True)
+            with open(decrypted_file, 'rb') as f_dec:
+                self.assertEqual(f_dec.read(), data)
+
+    def test_container_roundtrip(self):
+        encrypter = Encrypter(chunk_size=100, container=True, workers=2)
+        key = os.urandom(32)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in (0, 100, 1234):
+                data = os.urandom(size)
+                path = os.path.join(tmp, f'datos_{size}.bin')
+                with open(path, 'wb') as f:
+                    f.write(data)
+
+                encrypted_file = encrypter.encrypt_file(path, key)
+                header = read_container_header(encrypted_file)
+                self.assertEqual(header.payload_size, size)
+                self.assertEqual(os.path.getsize(encrypted_file), header.file_size)
+
+                os.remove(path)
+                decrypted_file = encrypter.decrypt_file(encrypted_file, key)
+                with open(decrypted_file, 'rb') as f_dec:
+                    self.assertEqual(f_dec.read(), data)
+
+    def test_parallel_and_serial_containers_are_interchangeable(self):
+        key = os.urandom(32)
+        data = os.urandom(5000)
+        parallel = Encrypter(chunk_size=64, container=True, workers=4)
+        serial = Encrypter(chunk_size=64, container=True, workers=1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'datos.bin')
+            for writer, reader in ((parallel, serial), (serial, parallel)):
+                with open(path, 'wb') as f:
+                    f.write(data)
+                encrypted_file = writer.encrypt_file(path, key)
+                os.remove(path)
+                decrypted_file = reader.decrypt_file(encrypted_file, key)
+                with open(decrypted_file, 'rb') as f_dec:
+                    self.assertEqual(f_dec.read(), data)
+
+    def test_worker_cpu_is_attributed_to_caller(self):
+        """La CPU de los workers se acumula en el hilo que cifra; sin workers no cambia"""
+        key = os.urandom(32)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'datos.bin')
+            with open(path, 'wb') as f:
+                f.write(os.urandom(4 * 1024 * 1024))
+
+            before = worker_cpu_time()
+            Encrypter(chunk_size=64 * 1024, container=True, workers=1).encrypt_file(path, key)
+            self.assertEqual(worker_cpu_time(), before)
+
+            Encrypter(chunk_size=64 * 1024, container=True, workers=4).encrypt_file(path, key)
+            self.assertGreater(worker_cpu_time(), before)
+
+    def test_container_reads_legacy_format(self):
+        key = os.urandom(32)
+        data = os.urandom(500)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'datos.bin')
+            with open(path, 'wb') as f:
+                f.write(data)
+            encrypted_file = Encrypter().encrypt_file(path, key)
+            self.assertIsNone(read_container_header(encrypted_file))
+
+            os.remove(path)
+            decrypted_file = Encrypter(container=True).decrypt_file(encrypted_file, key)
+            with open(decrypted_file, 'rb') as f_dec:
+                self.assertEqual(f_dec.read(), data)
+
+    def test_container_rejects_tampering(self):
+        encrypter = Encrypter(chunk_size=64, container=True)
+        key = os.urandom(32)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'datos.bin')
+            with open(path, 'wb') as f:
+                f.write(os.urandom(640))
+            encrypted_file = encrypter.encrypt_file(path, key)
+            os.remove(path)
+            with open(encrypted_file, 'rb') as f_enc:
+                original = f_enc.read()
+
+            # Clave incorrecta, un byte modificado y un archivo truncado en un límite de bloque
+            self.assertIsNone(encrypter.decrypt_file(encrypted_file, os.urandom(32)))
+            modified = bytearray(original)
+            modified[HEADER_SIZE + 300] ^= 1
+            truncated = bytearray(original[:HEADER_SIZE + 5 * (64 + TAG_SIZE)])
+            truncated[HEADER_SIZE - 8:HEADER_SIZE] = (320).to_bytes(8, 'big')
+            for content in (modified, truncated):
+                with open(encrypted_file, 'wb') as f_enc:
+                    f_enc.write(content)
+                self.assertIsNone(encrypter.decrypt_file(encrypted_file, key))
+                self.assertFalse(os.path.exists(path))
+
+    def test_decrypt_range(self):
+        key = os.urandom(32)
+        data = os.urandom(1000)
+        ranges = [(0, 10), (95, 10), (100, 100), (250, 600), (990, 50), (1000, 5), (0, 1000)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'datos.bin')
+            for encrypter in (Encrypter(chunk_size=100), Encrypter(chunk_size=100, container=True)):
+                with open(path, 'wb') as f:
+                    f.write(data)
+                encrypted_file = encrypter.encrypt_file(path, key)
+                for offset, length in ranges:
+                    self.assertEqual(encrypter.decrypt_range(encrypted_file, key, offset, length),
+                                     data[offset:offset + length])
+                self.assertIsNone(encrypter.decrypt_range(encrypted_file, key, -1, 10))
+
+    def test_compression(self):
+        encrypter = Encrypter(chunk_size=256, container=True, compress=True, workers=2)
+        key = os.urandom(32)
+        text = ''.join(f'linea {i}: informe de prueba sin comprimir\n' for i in range(500)).encode()
+        samples = {'informe.txt': text, 'datos.bin': os.urandom(4000), 'imagen.png': b'\x89PNG' + text}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, data in samples.items():
+                path = os.path.join(tmp, name)
+                with open(path, 'wb') as f:
+                    f.write(data)
+                compressible = is_compressible(path)
+                self.assertEqual(compressible, name == 'informe.txt')
+
+                encrypted_file = encrypter.encrypt_file(path, key)
+                header = read_container_header(encrypted_file)
+                self.assertEqual(bool(header.flags & FLAG_ZLIB), compressible)
+                self.assertEqual(os.path.getsize(encrypted_file), header.file_size)
+                if compressible:
+                    self.assertLess(os.path.getsize(encrypted_file), len(data) // 4)
+                    self.assertEqual(encrypter.decrypt_range(encrypted_file, key, 5000, 300), data[5000:5300])
+
+                os.remove(path)
+                decrypted_file = encrypter.decrypt_file(encrypted_file, key)
+                with open(decrypted_file, 'rb') as f_dec:
+                    self.assertEqual(f_dec.read(), data)
+
+        with self.assertRaises(ValueError):
+            Encrypter(compress=True)
+
+    def test_invalid_chunk_size(self):
+        with self.assertRaises(ValueError):
+            Encrypter(chunk_size=0)
+
 if __name__ == '__main__':
     unittest.main()
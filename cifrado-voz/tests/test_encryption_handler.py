@@ -0,0 +1,106 @@
+import unittest
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# Añadir el directorio src al path de Python
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root / 'src'))
+
+from encryption import Encrypter
+from encryption_handler import EncryptionHandler, FILE_REQUESTS
+from feature_cache import FeatureCache
+from voice_processing import VoiceKeySystem
+
+def synthetic_voice(duration=1.5, sr=22050, seed=0):
+    """Señal armónica con ruido que imita una voz"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+    f0 = 140 + 20 * np.sin(2 * np.pi * 3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    y = sum(np.sin(k * phase) / k for k in range(1, 8))
+    return (y + 0.05 * rng.normal(size=len(t))).astype(np.float32)
+
+class TestBatchEncryption(unittest.TestCase):
+    """Lote completo en un proyecto temporal: voz inscrita, varios archivos y ambos pools"""
+
+    def setUp(self):
+        import soundfile as sf
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.handler = EncryptionHandler(project_root=root)
+
+        # Sistema de voz con todos sus directorios dentro del proyecto temporal
+        system = VoiceKeySystem(feature_cache=FeatureCache())
+        system.audio_samples_dir = self.handler.audio_samples_dir
+        system.auth_user_dir = root / 'data' / 'authorized_users' / 'usuario1'
+        system.output_dir = self.handler.output_dir
+        system.auth_user_dir.mkdir(parents=True)
+        for seed in range(2):
+            sf.write(system.audio_samples_dir / f'usuario1_ref{seed}.wav', synthetic_voice(seed=seed), 22050)
+        system.process_reference_files(use_processes=False)
+        system.references = system.load_references()
+        self.handler.voice_system = system
+
+        # La voz de la petición es una de las grabaciones inscritas
+        self.input_file = self.handler.audio_samples_dir / 'user_input_42.wav'
+        shutil.copyfile(system.audio_samples_dir / 'usuario1_ref0.wav', self.input_file)
+
+        rng = np.random.default_rng(0)
+        self.contents = {
+            'notas.txt': b'texto repetido ' * 4000,
+            'datos.bin': rng.bytes(300_000),
+            'vacio.txt': b'',
+        }
+        for name, data in self.contents.items():
+            (self.handler.to_encrypt_dir / name).write_bytes(data)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def check_batch(self, use_processes):
+        requests = FILE_REQUESTS.value(operation='batch_encrypt', result='success')
+        result = self.handler.process_batch_encryption(max_workers=2, use_processes=use_processes,
+                                                       input_file=str(self.input_file))
+
+        self.assertTrue(result['success'], result['message'])
+        self.assertEqual(sorted(r['file'] for r in result['results']), sorted(self.contents))
+        self.assertEqual(result['throughput']['files'], len(self.contents))
+        self.assertEqual(result['throughput']['bytes'], sum(len(d) for d in self.contents.values()))
+        self.assertEqual(Path(result['visualization']).name, 'analisis_voz_user_input_42.png')
+        self.assertIn('encryption', result['timings']['stages'])
+        self.assertIn('features', result['timings']['stages'])
+        self.assertEqual(FILE_REQUESTS.value(operation='batch_encrypt', result='success'), requests + 1)
+
+        # Cada archivo se descifra con la clave de la voz y el original pasa a processed
+        key = self.handler.voice_system.load_existing_key()
+        self.assertIsNotNone(key)
+        key_bytes = (self.handler.output_dir / 'voice_key.bin').read_bytes()
+        decrypter = Encrypter()
+        for entry in result['results']:
+            encrypted_file = Path(entry['encrypted_file'])
+            self.assertEqual(encrypted_file.parent, self.handler.output_dir)
+            decrypted = decrypter.decrypt_file(str(encrypted_file), key_bytes,
+                                               output_file=Path(self.tmp.name) / entry['file'])
+            self.assertEqual(Path(decrypted).read_bytes(), self.contents[entry['file']])
+            self.assertTrue((self.handler.to_encrypt_dir / 'processed' / entry['file']).exists())
+        self.assertEqual(self.handler.get_available_files(), [])
+        self.assertEqual(list((self.handler.to_encrypt_dir / '.working').iterdir()), [])
+
+    def test_thread_pool(self):
+        self.check_batch(use_processes=False)
+
+    def test_process_pool(self):
+        self.check_batch(use_processes=True)
+
+    def test_missing_input_audio(self):
+        result = self.handler.process_batch_encryption(input_file=str(Path(self.tmp.name) / 'no_existe.wav'))
+        self.assertFalse(result['success'])
+        self.assertIn('timings', result)
+        self.assertEqual(len(self.handler.get_available_files()), len(self.contents))
+
+if __name__ == '__main__':
+    unittest.main()
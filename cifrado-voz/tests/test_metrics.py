@@ -0,0 +1,63 @@
+import unittest
+import sys
+import tempfile
+import urllib.request
+from pathlib import Path
+
+# Añadir el directorio src al path de Python
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root / 'src'))
+
+from metrics import MetricsRegistry
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry(prefix='test_')
+
+    def test_prometheus_text_format(self):
+        counter = self.registry.counter('verifications_total', "Verificaciones", labels=('result',))
+        counter.inc(result='accepted')
+        counter.inc(2, result='rejected')
+        histogram = self.registry.histogram('latency_seconds', "Latencia", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(3)
+        self.registry.gauge('pending', "Pendientes", callback=lambda: 4)
+
+        text = self.registry.render()
+        self.assertIn('# TYPE test_verifications_total counter', text)
+        self.assertIn('test_verifications_total{result="accepted"} 1', text)
+        self.assertIn('test_verifications_total{result="rejected"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{le="1"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn('test_latency_seconds_sum 3.55', text)
+        self.assertIn('test_latency_seconds_count 3', text)
+        self.assertIn('test_pending 4', text)
+
+    def test_same_name_returns_same_metric(self):
+        first = self.registry.counter('requests_total', "Peticiones")
+        self.assertIs(first, self.registry.counter('requests_total', "Peticiones"))
+        with self.assertRaises(ValueError):
+            self.registry.histogram('requests_total', "Peticiones")
+        with self.assertRaises(ValueError):
+            first.inc(operation='encrypt')
+
+    def test_file_and_http_exporters(self):
+        self.registry.counter('bytes_total', "Bytes").inc(1024)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = self.registry.write_to_file(Path(tmp) / 'metrics.prom')
+            self.assertIn('test_bytes_total 1024', path.read_text())
+
+        server = self.registry.start_http_server(0)
+        try:
+            port = server.server_address[1]
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics') as response:
+                self.assertIn('test_bytes_total 1024', response.read().decode())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import asyncio
+import sys
+import threading
+from pathlib import Path
+from unittest import mock
+
+# Añadir el directorio src al path de Python
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root / 'src'))
+
+from task_executor import TaskExecutor
+
+class TestTaskExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = TaskExecutor('thread', max_workers=2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_run_returns_result(self):
+        result = asyncio.run(self.executor.run(divmod, 17, 5))
+        self.assertEqual(result, (3, 2))
+        self.assertEqual(self.executor.pending, 0)
+
+    def test_run_passes_keyword_arguments(self):
+        result = asyncio.run(self.executor.run(int, 'ff', base=16))
+        self.assertEqual(result, 255)
+
+    def test_run_does_not_block_the_loop(self):
+        """Mientras la tarea bloqueante espera, otras corrutinas del bucle siguen avanzando"""
+        release = threading.Event()
+        ticks = []
+
+        def blocking_task():
+            # Solo termina cuando la otra corrutina la libera
+            if not release.wait(timeout=5):
+                raise TimeoutError("el bucle de eventos quedó bloqueado")
+            return 'hecho'
+
+        async def ticker():
+            for i in range(3):
+                ticks.append(i)
+                await asyncio.sleep(0.01)
+            self.assertEqual(self.executor.pending, 1)
+            release.set()
+
+        async def main():
+            return await asyncio.gather(self.executor.run(blocking_task), ticker())
+
+        result, _ = asyncio.run(main())
+        self.assertEqual(result, 'hecho')
+        self.assertEqual(ticks, [0, 1, 2])
+        self.assertEqual(self.executor.pending, 0)
+
+    def test_pending_is_released_when_task_fails(self):
+        with self.assertRaises(ZeroDivisionError):
+            asyncio.run(self.executor.run(divmod, 1, 0))
+        self.assertEqual(self.executor.pending, 0)
+
+    def test_process_mode_runs_module_functions(self):
+        executor = TaskExecutor('process', max_workers=1)
+        try:
+            self.assertEqual(asyncio.run(executor.run(pow, 2, 10)), 1024)
+            self.assertEqual(executor.mode, 'process')
+        finally:
+            executor.shutdown()
+
+    def test_invalid_mode_raises(self):
+        with self.assertRaises(ValueError):
+            TaskExecutor('fibers')
+
+    def test_from_env(self):
+        with mock.patch.dict('os.environ', {'BOT_EXECUTOR': ' Thread ', 'BOT_MAX_WORKERS': '3'}):
+            executor = TaskExecutor.from_env()
+        try:
+            self.assertEqual(executor.mode, 'thread')
+            self.assertEqual(executor.max_workers, 3)
+        finally:
+            executor.shutdown()
+
+        with mock.patch.dict('os.environ', {'BOT_EXECUTOR': 'gevent'}):
+            with self.assertRaises(ValueError):
+                TaskExecutor.from_env()
+
+if __name__ == '__main__':
+    unittest.main()
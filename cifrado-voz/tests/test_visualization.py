@@ -0,0 +1,112 @@
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# Añadir el directorio src al path de Python
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root / 'src'))
+
+from visualization import RENDER_CACHE_LOOKUPS, VoiceVisualizer, minmax_envelope, pool_max
+
+def write_clip(path, seed=0, sr=22050):
+    """Clip corto sintético (tono con ruido) para dibujar"""
+    import soundfile as sf
+    rng = np.random.default_rng(seed)
+    t = np.arange(sr) / sr
+    y = 0.5 * np.sin(2 * np.pi * (150 + 50 * seed) * t) + 0.05 * rng.normal(size=sr)
+    sf.write(path, y.astype(np.float32), sr)
+    return path
+
+class TestDecimation(unittest.TestCase):
+    def test_envelope_keeps_extremes(self):
+        """La envolvente conserva los picos de la señal con un número acotado de puntos"""
+        rng = np.random.default_rng(0)
+        y = rng.normal(size=100_003)
+        y[12_345] = 10.0
+        y[67_890] = -10.0
+        times, lower, upper = minmax_envelope(y, 44100, 500)
+        self.assertLessEqual(len(times), 500)
+        self.assertEqual(len(lower), len(upper))
+        self.assertEqual(upper.max(), 10.0)
+        self.assertEqual(lower.min(), -10.0)
+        self.assertTrue(np.all(lower <= upper))
+
+    def test_envelope_short_signal(self):
+        times, lower, upper = minmax_envelope(np.array([0.5, -0.5, 0.25]), 44100, 1000)
+        np.testing.assert_array_equal(lower, [0.5, -0.5, 0.25])
+        np.testing.assert_array_equal(upper, [0.5, -0.5, 0.25])
+
+    def test_pool_max_last_axis(self):
+        values = np.arange(14, dtype=float).reshape(2, 7)
+        np.testing.assert_array_equal(pool_max(values, 3), [[2, 5, 6], [9, 12, 13]])
+
+class TestRenderCache(unittest.TestCase):
+    def test_render_key_depends_on_content_and_settings(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            audio_a = Path(tmp) / 'a.wav'
+            audio_b = Path(tmp) / 'b.wav'
+            audio_a.write_bytes(b'audio a')
+            audio_b.write_bytes(b'audio b')
+
+            fast = VoiceVisualizer(Path(tmp) / 'out', fast_mode=True, dpi=120)
+            full = VoiceVisualizer(Path(tmp) / 'out', dpi=120)
+            self.assertEqual(fast.render_key(audio_a), fast.render_key(audio_a))
+            self.assertNotEqual(fast.render_key(audio_a), fast.render_key(audio_b))
+            self.assertNotEqual(fast.render_key(audio_a), full.render_key(audio_a))
+
+    def test_fast_render_and_cache_hit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            audio = write_clip(Path(tmp) / 'clip.wav')
+            visualizer = VoiceVisualizer(Path(tmp) / 'out', fast_mode=True, dpi=60)
+
+            output_path = Path(visualizer.create_visualizations(audio))
+            self.assertTrue(output_path.exists())
+            cached = list(visualizer.cache_dir.glob('*.png'))
+            self.assertEqual(len(cached), 1)
+
+            # El acierto copia la imagen de la caché y actualiza su fecha (orden de expulsión)
+            os.utime(cached[0], (0, 0))
+            hits = RENDER_CACHE_LOOKUPS.value(result='hit')
+            self.assertEqual(Path(visualizer.create_visualizations(audio)), output_path)
+            self.assertEqual(RENDER_CACHE_LOOKUPS.value(result='hit'), hits + 1)
+            self.assertTrue(output_path.exists())
+            self.assertGreater(cached[0].stat().st_mtime, 0)
+
+    def test_eviction_keeps_newest_render(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first = write_clip(Path(tmp) / 'a.wav', seed=0)
+            second = write_clip(Path(tmp) / 'b.wav', seed=1)
+            visualizer = VoiceVisualizer(Path(tmp) / 'out', fast_mode=True, dpi=60, max_cached_renders=1)
+
+            visualizer.create_visualizations(first)
+            visualizer.create_visualizations(second)
+            cached = [f.name for f in visualizer.cache_dir.glob('*.png')]
+            self.assertEqual(cached, [f"{visualizer.render_key(second)}.png"])
+
+    def test_concurrent_requests_get_their_own_image(self):
+        """Dos peticiones simultáneas con audios distintos no comparten ni borran la imagen"""
+        from concurrent.futures import ThreadPoolExecutor
+        with tempfile.TemporaryDirectory() as tmp:
+            clips = {
+                'user_input_1': write_clip(Path(tmp) / 'a.wav', seed=0),
+                'user_input_2': write_clip(Path(tmp) / 'b.wav', seed=1),
+            }
+            visualizer = VoiceVisualizer(Path(tmp) / 'out', fast_mode=True, dpi=60)
+
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                futures = {name: pool.submit(visualizer.create_visualizations, clip, name=name)
+                           for name, clip in clips.items()}
+                paths = {name: Path(future.result()) for name, future in futures.items()}
+
+            self.assertNotEqual(paths['user_input_1'], paths['user_input_2'])
+            for name, clip in clips.items():
+                self.assertEqual(paths[name].name, f'analisis_voz_{name}.png')
+                cached = visualizer.cache_dir / f"{visualizer.render_key(clip)}.png"
+                self.assertEqual(paths[name].read_bytes(), cached.read_bytes())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,585 @@
+import unittest
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# Añadir el directorio src al path de Python
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root / 'src'))
+
+from audio_analysis import analyze_signal
+from audio_ingest import AudioBuffer
+from feature_cache import FeatureCache
+from instrumentation import StageTimer
+from key_derivation import derive_key, derive_key_reference, derive_keys, quantize_feature_matrix, quantize_feature_vector
+from reference_store import ReferenceSet
+from scoring import row_correlation, score_references
+from speaker_index import SpeakerIndex
+from streaming_verifier import StreamingVerifier
+from voice_activity import trim_silence
+from voice_processing import VoiceKeySystem
+
+def sample_features(seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'mfcc_features': rng.normal(size=13),
+        'mel_features': rng.random(128),
+        'spectral_centroid': np.float64(rng.random() * 3000),
+        'zero_crossing_rate': np.float64(rng.random()),
+        'fft_features': rng.random(24)
+    }
+
+def synthetic_voice(duration=1.5, sr=22050, seed=0):
+    """Señal armónica con ruido que imita una voz"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+    f0 = 140 + 20 * np.sin(2 * np.pi * 3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    y = sum(np.sin(k * phase) / k for k in range(1, 8))
+    return (y + 0.05 * rng.normal(size=len(t))).astype(np.float32)
+
+class TestFeatureCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.audio_file = os.path.join(self.tmp.name, 'audio.wav')
+        with open(self.audio_file, 'wb') as f:
+            f.write(b'audio de prueba')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_content_and_params(self):
+        cache = FeatureCache()
+        key = cache.make_key(self.audio_file, {'sample_rate': 22050})
+
+        self.assertEqual(key, cache.make_key(self.audio_file, {'sample_rate': 22050}))
+        self.assertNotEqual(key, cache.make_key(self.audio_file, {'sample_rate': 16000}))
+
+        with open(self.audio_file, 'wb') as f:
+            f.write(b'otro audio')
+        self.assertNotEqual(key, cache.make_key(self.audio_file, {'sample_rate': 22050}))
+
+    def test_hits_misses_and_lru_eviction(self):
+        cache = FeatureCache(max_entries=2)
+        self.assertIsNone(cache.get('a'))
+
+        cache.put('a', sample_features(1))
+        cache.put('b', sample_features(2))
+        cache.get('a')
+        cache.put('c', sample_features(3))
+
+        # 'b' era la entrada menos usada recientemente
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        stats = cache.stats
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['evictions'], 1)
+
+    def test_returned_features_are_copies(self):
+        cache = FeatureCache()
+        cache.put('a', sample_features())
+        cache.get('a')['mfcc_features'][:] = 0
+        self.assertTrue(np.any(cache.get('a')['mfcc_features'] != 0))
+
+    def test_disk_tier(self):
+        cache_dir = os.path.join(self.tmp.name, 'cache')
+        features = sample_features()
+        FeatureCache(cache_dir=cache_dir).put('a', features)
+
+        # Una caché nueva con el mismo directorio recupera las características del disco
+        cache = FeatureCache(cache_dir=cache_dir)
+        loaded = cache.get('a')
+        self.assertEqual(cache.stats['disk_hits'], 1)
+        for name, value in features.items():
+            np.testing.assert_array_equal(loaded[name], value)
+        self.assertEqual(np.ndim(loaded['spectral_centroid']), 0)
+
+class TestSharedAnalysis(unittest.TestCase):
+
+    def test_matches_separate_librosa_calls(self):
+        import librosa
+        sr = 22050
+        y = librosa.util.normalize(synthetic_voice(sr=sr))
+        analysis = analyze_signal(y, sr, n_mfcc=13)
+
+        np.testing.assert_allclose(analysis['mfcc'], librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13), rtol=1e-5, atol=1e-4)
+        np.testing.assert_allclose(analysis['mel'], librosa.feature.melspectrogram(y=y, sr=sr), rtol=1e-5, atol=1e-8)
+        np.testing.assert_allclose(analysis['spectral_centroid'], librosa.feature.spectral_centroid(y=y, sr=sr)[0], rtol=1e-5)
+        np.testing.assert_array_equal(analysis['zero_crossing_rate'], librosa.feature.zero_crossing_rate(y)[0])
+
+class TestAudioBuffer(unittest.TestCase):
+
+    def setUp(self):
+        import soundfile as sf
+        self.tmp = tempfile.TemporaryDirectory()
+        self.audio_file = Path(self.tmp.name) / 'voz.wav'
+        sf.write(self.audio_file, synthetic_voice(sr=16000), 16000)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_resampled_signals_match_librosa_load(self):
+        import librosa
+        audio = AudioBuffer(self.audio_file)
+        for sr in (22050, 44100):
+            expected, _ = librosa.load(str(self.audio_file), sr=sr)
+            np.testing.assert_array_equal(audio.samples(sr), expected)
+        self.assertIs(audio.samples(22050), audio.samples(22050))
+        self.assertEqual(audio.native_sr, 16000)
+
+    def test_features_reuse_shared_spectrogram(self):
+        audio = AudioBuffer(self.audio_file)
+        system = VoiceKeySystem(feature_cache=FeatureCache())
+        features = system.extract_voice_features(audio)
+        self.assertIn((system.sample_rate, 2048, 512, True), audio.spectrograms)
+
+        from_path = VoiceKeySystem(feature_cache=FeatureCache()).extract_voice_features(self.audio_file)
+        for name in features:
+            np.testing.assert_array_equal(features[name], from_path[name])
+
+class TestStageTimer(unittest.TestCase):
+
+    def test_nested_stages_are_exclusive(self):
+        import time
+        timer = StageTimer()
+        with timer.stage('outer'):
+            time.sleep(0.02)
+            with timer.stage('inner'):
+                time.sleep(0.05)
+        with timer.stage('inner'):
+            pass
+        timings = timer.as_dict()
+        self.assertEqual(timings['stages']['inner']['calls'], 2)
+        self.assertGreaterEqual(timings['stages']['inner']['wall_ms'], 50)
+        self.assertLess(timings['stages']['outer']['wall_ms'], 50)
+        stage_total = sum(stage['wall_ms'] for stage in timings['stages'].values())
+        self.assertLessEqual(stage_total, timings['total_wall_ms'])
+
+    def test_cpu_from_other_threads_goes_to_current_stage(self):
+        timer = StageTimer()
+        with timer.stage('outer'):
+            with timer.stage('inner'):
+                timer.add_cpu(0.5)
+        timings = timer.as_dict()
+        self.assertGreaterEqual(timings['stages']['inner']['cpu_ms'], 500)
+        self.assertLess(timings['stages']['outer']['cpu_ms'], 500)
+        self.assertGreaterEqual(timings['total_cpu_ms'], 500)
+
+    def test_audio_buffer_reports_decode_inside_features(self):
+        import soundfile as sf
+        with tempfile.TemporaryDirectory() as tmp:
+            audio_file = Path(tmp) / 'voz.wav'
+            sf.write(audio_file, synthetic_voice(sr=16000), 16000)
+            timer = StageTimer()
+            audio = AudioBuffer(audio_file, timer=timer)
+            with timer.stage('features'):
+                VoiceKeySystem(feature_cache=FeatureCache()).extract_voice_features(audio)
+        self.assertEqual(list(timer.as_dict()['stages']), ['decode', 'resample', 'stft', 'features'])
+
+class TestStreamingVerifier(unittest.TestCase):
+
+    def setUp(self):
+        import soundfile as sf
+        self.tmp = tempfile.TemporaryDirectory()
+        self.system = VoiceKeySystem(feature_cache=FeatureCache())
+        references = []
+        for seed in range(3):
+            ref_file = Path(self.tmp.name) / f'ref_{seed}.wav'
+            sf.write(ref_file, synthetic_voice(duration=2, seed=seed), 22050)
+            references.append(self.system.extract_voice_features(ref_file))
+        self.system.references = references
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_full_stream_matches_batch_features(self):
+        import soundfile as sf
+        audio_file = Path(self.tmp.name) / 'voz.wav'
+        sf.write(audio_file, 0.3 * synthetic_voice(duration=2.3, sr=16000, seed=7), 16000)
+        verifier = StreamingVerifier(self.system.get_reference_set(), min_duration=float('inf'))
+        result = verifier.verify_file(audio_file, chunk_seconds=0.3)
+        self.assertFalse(result['early_stop'])
+
+        expected = self.system.extract_voice_features(audio_file)
+        streamed = verifier.features()
+        for name in ('mfcc_features', 'mel_features', 'spectral_centroid', 'zero_crossing_rate'):
+            np.testing.assert_allclose(streamed[name], expected[name], rtol=1e-4, atol=1e-6)
+        # El perfil FFT es una aproximación con la misma forma
+        self.assertGreater(np.corrcoef(streamed['fft_features'], expected['fft_features'])[0, 1], 0.99)
+        np.testing.assert_allclose(result['similarities'], self.system.score_features(expected), atol=0.01)
+
+    def test_early_decisions(self):
+        import soundfile as sf
+        same_voice = Path(self.tmp.name) / 'misma.wav'
+        sf.write(same_voice, synthetic_voice(duration=20, seed=1), 22050)
+        noise = Path(self.tmp.name) / 'ruido.wav'
+        sf.write(noise, np.random.default_rng(0).normal(0, 0.3, 20 * 22050).astype(np.float32), 22050)
+
+        accepted = self.system.verify_voice_streaming(same_voice)
+        self.assertEqual(accepted['decision'], 'accept')
+        self.assertTrue(accepted['early_stop'])
+        self.assertLess(accepted['processed_seconds'], 5)
+
+        rejected = self.system.verify_voice_streaming(noise)
+        self.assertFalse(rejected['matches'])
+        self.assertTrue(rejected['early_stop'])
+        self.assertLess(rejected['processed_seconds'], 5)
+
+class TestVoiceActivity(unittest.TestCase):
+
+    def test_trims_leading_trailing_and_pauses(self):
+        sr = 22050
+        rng = np.random.default_rng(0)
+        silence = lambda seconds: 1e-4 * rng.normal(size=int(seconds * sr)).astype(np.float32)
+        voice = synthetic_voice(duration=1, sr=sr)
+        y = np.concatenate([silence(2), voice, silence(1), voice, silence(3)])
+
+        trimmed, report = trim_silence(y, sr, padding=0)
+        self.assertEqual(report['segments'], 2)
+        self.assertAlmostEqual(len(trimmed) / sr, 2, delta=0.2)
+        self.assertAlmostEqual(report['dropped_seconds'], 6, delta=0.2)
+        self.assertEqual(report['total_frames'], 1 + len(y) // 512)
+        self.assertEqual(report['dropped_frames'], report['total_frames'] - (1 + len(trimmed) // 512))
+
+    def test_silent_signal_is_kept(self):
+        y = np.zeros(22050, dtype=np.float32)
+        trimmed, report = trim_silence(y, 22050)
+        np.testing.assert_array_equal(trimmed, y)
+        self.assertEqual(report['dropped_frames'], 0)
+
+    def test_vad_is_part_of_cache_key(self):
+        system = VoiceKeySystem(feature_cache=FeatureCache())
+        without_vad = system.extraction_params()
+        system.vad_enabled = True
+        self.assertNotEqual(without_vad, system.extraction_params())
+
+    def test_report_is_returned_from_cache(self):
+        import soundfile as sf
+        sr = 22050
+        silence = np.zeros(sr, dtype=np.float32)
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            sf.write(tmp / 'clip.wav', np.concatenate([silence, synthetic_voice(sr=sr), silence]), sr)
+            # Caché solo en memoria y caché solo en disco (los valores vuelven del .npz)
+            for cache in (FeatureCache(), FeatureCache(max_entries=0, cache_dir=tmp / 'cache')):
+                system = VoiceKeySystem(feature_cache=cache)
+                system.vad_enabled = True
+                system.references = [sample_features(seed) for seed in range(2)]
+                # Umbral inalcanzable: no se generan ni guardan claves
+                first = system.verify_voice(tmp / 'clip.wav', similarity_threshold=1.01)
+                second = system.verify_voice(tmp / 'clip.wav', similarity_threshold=1.01)
+                self.assertGreater(first['vad']['dropped_frames'], 0)
+                self.assertEqual(second['vad'], first['vad'])
+                self.assertNotIn('vad_report.dropped_frames', system.extract_voice_features(tmp / 'clip.wav'))
+
+class TestBulkVerification(unittest.TestCase):
+
+    def setUp(self):
+        import soundfile as sf
+        self.tmp = tempfile.TemporaryDirectory()
+        tmp = Path(self.tmp.name)
+        self.system = VoiceKeySystem(feature_cache=FeatureCache())
+        self.system.output_dir = tmp / 'output'
+        self.system.output_dir.mkdir()
+        references = []
+        for seed in range(2):
+            sf.write(tmp / f'ref_{seed}.wav', synthetic_voice(duration=2, seed=seed), 22050)
+            references.append(self.system.extract_voice_features(tmp / f'ref_{seed}.wav'))
+        self.system.references = references
+
+        self.files = []
+        for i in range(4):
+            audio_file = tmp / f'clip_{i}.wav'
+            signal = synthetic_voice(seed=i) if i % 2 == 0 else np.random.default_rng(i).normal(0, 0.3, 22050)
+            sf.write(audio_file, signal.astype(np.float32), 22050)
+            self.files.append(audio_file)
+        self.files.append(tmp / 'no_existe.wav')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_matches_single_verification_without_side_effects(self):
+        streamed = []
+        report = self.system.verify_many(self.files, use_processes=False, max_workers=2, on_result=streamed.append)
+        self.assertEqual(len(streamed), len(self.files))
+        self.assertEqual(report['throughput']['clips'], len(self.files))
+        self.assertEqual(report['throughput']['failed'], 1)
+        self.assertGreater(report['throughput']['clips_per_second'], 0)
+        self.assertEqual(list(self.system.output_dir.iterdir()), [])
+
+        results = {Path(r['file']).name: r for r in report['results']}
+        self.assertIn('error', results['no_existe.wav'])
+        for audio_file in self.files[:-1]:
+            expected = self.system.score_features(self.system.extract_voice_features(audio_file))
+            np.testing.assert_allclose(results[audio_file.name]['similarities'], expected)
+
+    def test_process_pool(self):
+        report = self.system.verify_many(self.files[:2], max_workers=2)
+        self.assertEqual(report['throughput']['failed'], 0)
+        self.assertTrue(all('matches' in r for r in report['results']))
+
+class TestIncrementalEnrollment(unittest.TestCase):
+
+    def setUp(self):
+        import soundfile as sf
+        self.tmp = tempfile.TemporaryDirectory()
+        tmp = Path(self.tmp.name)
+        self.system = VoiceKeySystem(feature_cache=FeatureCache())
+        self.system.audio_samples_dir = tmp / 'audio_samples'
+        self.system.auth_user_dir = tmp / 'usuario1'
+        for directory in (self.system.audio_samples_dir, self.system.auth_user_dir):
+            directory.mkdir()
+        for seed in range(3):
+            sf.write(self.system.audio_samples_dir / f'usuario1_ref{seed}.wav', synthetic_voice(seed=seed), 22050)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_only_new_and_changed_recordings_are_extracted(self):
+        import soundfile as sf
+        first = self.system.process_reference_files(use_processes=False)
+        self.assertEqual(len(first['added']), 3)
+        stored = ReferenceSet.load(self.system.auth_user_dir)
+        self.assertEqual(set(stored.metadata['sources']), {'usuario1_ref0', 'usuario1_ref1', 'usuario1_ref2'})
+
+        second = self.system.process_reference_files(use_processes=False)
+        self.assertEqual(second['added'] + second['updated'], [])
+        self.assertEqual(len(second['unchanged']), 3)
+
+        sf.write(self.system.audio_samples_dir / 'usuario1_ref1.wav', synthetic_voice(seed=7), 22050)
+        sf.write(self.system.audio_samples_dir / 'usuario1_ref3.wav', synthetic_voice(seed=8), 22050)
+        third = self.system.process_reference_files(use_processes=False)
+        self.assertEqual(third['updated'], ['usuario1_ref1'])
+        self.assertEqual(third['added'], ['usuario1_ref3'])
+
+        updated = ReferenceSet.load(self.system.auth_user_dir)
+        self.assertEqual(len(updated), 4)
+        np.testing.assert_array_equal(updated.matrix[updated.names.index('usuario1_ref0')],
+                                      stored.matrix[stored.names.index('usuario1_ref0')])
+        expected = self.system.extract_voice_features(self.system.audio_samples_dir / 'usuario1_ref1.wav')
+        np.testing.assert_allclose(updated.features(updated.names.index('usuario1_ref1'))['mfcc_features'],
+                                   expected['mfcc_features'])
+
+class TestBandProfile(unittest.TestCase):
+
+    def setUp(self):
+        self.system = VoiceKeySystem()
+
+    def test_matches_array_split_means(self):
+        rng = np.random.default_rng(0)
+        for length in (24, 1000, 4801):
+            for dtype in (np.float32, np.float64):
+                values = rng.random(length).astype(dtype)
+                expected = np.array([np.mean(band) for band in np.array_split(values, 24)])
+                np.testing.assert_allclose(self.system.compute_fft_profile(values, 24), expected, rtol=1e-6)
+
+    def test_real_fft_matches_full_fft(self):
+        from scipy.fft import fft
+        y = synthetic_voice(duration=0.5)
+        # Longitud prima: la FFT completa de referencia es la de la versión anterior
+        y = y[:10007]
+        expected = self.system.compute_fft_profile(np.abs(fft(y))[:len(y)//2], 24)
+        np.testing.assert_allclose(self.system.compute_band_profile(y), expected, rtol=1e-5)
+
+    def test_fast_length_profile(self):
+        y = synthetic_voice(duration=0.5)[:10007]
+        exact = self.system.compute_band_profile(y)
+        self.system.fft_fast_len = True
+        fast = self.system.compute_band_profile(y)
+        self.assertEqual(fast.shape, exact.shape)
+        self.assertGreater(np.corrcoef(fast, exact)[0, 1], 0.999)
+
+class TestKeyDerivation(unittest.TestCase):
+
+    # Vectores de prueba generados con el algoritmo original (derive_key_reference)
+    GOLDEN_VECTORS = [
+        (np.arange(167) % 256, '0000000000000058006800e80028002800e8006800280028006800e800280028'),
+        (np.full(33, 255), '0018000000000000000000000000000000000000000000000000000000000000'),
+    ]
+    # Clave de la referencia de ejemplo data/authorized_users/usuario1/reference_1.json
+    REFERENCE_1_KEY = '00980000000800100000000000a000d800e80000000000e80000000000e80000'
+
+    def test_golden_vectors(self):
+        for quantized, expected in self.GOLDEN_VECTORS:
+            quantized = quantized.astype(np.uint8)
+            self.assertEqual(derive_key(quantized).tobytes().hex(), expected)
+            self.assertEqual(derive_key_reference(quantized).tobytes().hex(), expected)
+
+    def test_reference_file_key(self):
+        import json
+        reference_file = project_root / 'data' / 'authorized_users' / 'usuario1' / 'reference_1.json'
+        if not reference_file.exists():
+            self.skipTest("No hay referencias JSON de ejemplo")
+        with open(reference_file) as f:
+            features = json.load(f)
+        for key in features:
+            if isinstance(features[key], list):
+                features[key] = np.array(features[key])
+
+        key_data = VoiceKeySystem().prepare_encryption_key(features)
+        self.assertEqual(key_data['key_bytes'].hex(), self.REFERENCE_1_KEY)
+        self.assertEqual(len(key_data['key_array']), 32)
+
+    def test_matches_reference_algorithm(self):
+        rng = np.random.default_rng(0)
+        for length in (1, 2, 31, 32, 33, 167, 500):
+            for _ in range(10):
+                quantized = rng.integers(0, 256, length, dtype=np.uint8)
+                np.testing.assert_array_equal(derive_key(quantized), derive_key_reference(quantized))
+
+    def test_batch_derivation(self):
+        rng = np.random.default_rng(1)
+        vectors = rng.normal(size=(8, 167))
+        quantized = quantize_feature_matrix(vectors)
+        for row, vector in zip(quantized, vectors):
+            np.testing.assert_array_equal(row, quantize_feature_vector(vector))
+
+        expected = np.stack([derive_key_reference(row) for row in quantized])
+        np.testing.assert_array_equal(derive_keys(quantized), expected)
+
+class TestSpeakerIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.users_dir = Path(self.tmp.name)
+        # Cada usuario tiene referencias parecidas a su propio "perfil" de voz
+        rng = np.random.default_rng(0)
+        self.profiles = {}
+        for u in range(30):
+            user_id = f"usuario{u}"
+            profile = sample_features(u)
+            self.profiles[user_id] = profile
+            references = []
+            for _ in range(1 + u % 4):
+                references.append({
+                    name: value + 0.01 * np.abs(value) * rng.normal(size=np.shape(value))
+                    for name, value in profile.items()
+                })
+            ReferenceSet.from_features(references).save(self.users_dir / user_id)
+        # Los directorios sin referencias se ignoran
+        (self.users_dir / 'vacio').mkdir()
+        self.index = SpeakerIndex.load(self.users_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_loads_every_user(self):
+        self.assertEqual(len(self.index), 30)
+        self.assertNotIn('vacio', self.index)
+        self.assertEqual(len(self.index.references), sum(1 + u % 4 for u in range(30)))
+
+    def test_identify_top_k(self):
+        candidates = self.index.identify(self.profiles['usuario7'], top_k=3)
+        self.assertEqual(len(candidates), 3)
+        self.assertEqual(candidates[0]['user_id'], 'usuario7')
+        self.assertTrue(candidates[0]['matches'])
+        similarities = [c['max_similarity'] for c in candidates]
+        self.assertEqual(similarities, sorted(similarities, reverse=True))
+
+    def test_verify_matches_per_user_scoring(self):
+        probe = self.profiles['usuario3']
+        result = self.index.verify(probe, 'usuario3')
+        expected = score_references(ReferenceSet.load(self.users_dir / 'usuario3'), probe)
+        np.testing.assert_allclose(result['similarities'], expected)
+        self.assertTrue(result['matches'])
+        self.assertFalse(self.index.verify(probe, 'usuario4')['matches'])
+        with self.assertRaises(ValueError):
+            self.index.verify(probe, 'desconocido')
+
+class TestReferenceStore(unittest.TestCase):
+
+    def test_save_and_load_roundtrip(self):
+        features_list = [sample_features(seed) for seed in range(5)]
+        reference_set = ReferenceSet.from_features(features_list, [f"ref_{i}" for i in range(5)])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            reference_set.save(tmp)
+            for mmap_mode in (None, 'r'):
+                loaded = ReferenceSet.load(tmp, mmap_mode=mmap_mode)
+                self.assertEqual(loaded.names, reference_set.names)
+                for original, restored in zip(features_list, loaded.to_feature_list()):
+                    for name, value in original.items():
+                        np.testing.assert_array_equal(restored[name], value)
+
+    def test_load_missing_store(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertIsNone(ReferenceSet.load(tmp))
+
+    def test_json_references_convert_losslessly(self):
+        import json
+        json_dir = project_root / 'data' / 'authorized_users' / 'usuario1'
+        json_refs = []
+        for filename in sorted(json_dir.glob('reference_*.json')):
+            with open(filename) as f:
+                json_refs.append(json.load(f))
+        if not json_refs:
+            self.skipTest("No hay referencias JSON de ejemplo")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            ReferenceSet.from_features(json_refs).save(tmp)
+            loaded = ReferenceSet.load(tmp).to_feature_list()
+        for original, restored in zip(json_refs, loaded):
+            for name, value in original.items():
+                np.testing.assert_array_equal(restored[name], np.array(value))
+
+class TestVectorizedScoring(unittest.TestCase):
+
+    def setUp(self):
+        self.system = VoiceKeySystem()
+
+    def test_row_correlation_matches_corrcoef(self):
+        rng = np.random.default_rng(0)
+        matrix = rng.normal(size=(10, 24))
+        vector = rng.normal(size=24)
+        expected = [np.corrcoef(row, vector)[0, 1] for row in matrix]
+        np.testing.assert_allclose(row_correlation(matrix, vector), expected, rtol=1e-12)
+
+    def test_matches_compare_features(self):
+        references = [sample_features(seed) for seed in range(200)]
+        probe = sample_features(1000)
+        expected = [self.system.compare_features(ref, probe) for ref in references]
+
+        scores = score_references(ReferenceSet.from_features(references), probe)
+        np.testing.assert_allclose(scores, expected, rtol=1e-10, atol=1e-12)
+
+    def test_reference_set_follows_references(self):
+        self.system.references = [sample_features(seed) for seed in range(3)]
+        self.assertEqual(len(self.system.score_features(sample_features(5))), 3)
+        self.system.references = [sample_features(seed) for seed in range(4)]
+        self.assertEqual(len(self.system.score_features(sample_features(5))), 4)
+
+class TestKeyStorage(unittest.TestCase):
+    def test_concurrent_saves_never_expose_partial_key_file(self):
+        """Las lecturas durante escrituras concurrentes ven siempre un JSON completo"""
+        from concurrent.futures import ThreadPoolExecutor
+        with tempfile.TemporaryDirectory() as tmp:
+            system = VoiceKeySystem(feature_cache=FeatureCache())
+            system.output_dir = Path(tmp)
+
+            def save(i):
+                key_array = [i] * 256
+                system.save_encryption_data({'key_array': key_array, 'key_bytes': bytes(32),
+                                             'timestamp': f'2024-01-01T00:00:{i % 60:02d}'})
+
+            def load(_):
+                # Ni ausente (tras la primera escritura) ni a medio escribir
+                data = system.load_existing_key()
+                return data is not None and len(data['key_array']) == 256
+
+            save(0)
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                saves = pool.map(save, range(1, 40))
+                loads = list(pool.map(load, range(200)))
+                list(saves)
+
+            self.assertTrue(all(loads))
+            self.assertEqual(sorted(f.name for f in Path(tmp).iterdir()),
+                             ['voice_key.bin', 'voice_key_data.json'])
+
+if __name__ == '__main__':
+    unittest.main()